@@ -0,0 +1,14 @@
+from fastapi import Request
+
+from app.notifications import ResultNotifier
+from app.publisher import AsyncPublisher
+
+
+def rabbitmq_publisher(request: Request) -> AsyncPublisher:
+    """Provide the RabbitMQ publisher shared by the requests to the API."""
+    return request.app.state.publisher
+
+
+def result_notifier(request: Request) -> ResultNotifier:
+    """Provide the notifier of stored matches shared by the requests to the API."""
+    return request.app.state.notifier
@@ -2,21 +2,36 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from app.api.routers.dictionaries import dictionaries_router
+from app.api.routers.metrics import metrics_router
 from app.api.routers.pii import pii_router
-from app.config import APISettings
-from app.factories import rabbitmq_channel_ctx
+from app.config import APISettings, RabbitMQConfig
+from app.db.factories import dispose_async_engine
+from app.factories import async_redis_connection
 from app.models.validation import Exchange
+from app.notifications import ResultNotifier
+from app.publisher import AsyncPublisher
 
 config = APISettings()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    with rabbitmq_channel_ctx() as channel:
-        channel.exchange_declare(
-            exchange=Exchange.FORWARD.value, exchange_type="topic", durable=True
-        )
-    yield
+    # One connection and channel for all the requests, instead of one per request
+    publisher = AsyncPublisher(RabbitMQConfig())
+    await publisher.connect()
+    await publisher.declare_exchange(Exchange.FORWARD.value, exchange_type="topic")
+    app.state.publisher = publisher
+    # One subscription to the announcements of stored matches for all the requests
+    notifier = ResultNotifier(async_redis_connection())
+    await notifier.start()
+    app.state.notifier = notifier
+    try:
+        yield
+    finally:
+        await notifier.close()
+        await publisher.close()
+        await dispose_async_engine()
 
 
 app = FastAPI(
@@ -26,3 +41,5 @@ app = FastAPI(
     version=config.VERSION,
 )
 app.include_router(pii_router)
+app.include_router(dictionaries_router)
+app.include_router(metrics_router)
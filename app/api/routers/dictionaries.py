@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.db.controllers import dictionaries
+from app.db.factories import get_db_session
+from app.models.validation import DictionaryRequest, DictionaryResponse
+
+# Names are used in messages and URLs
+DICTIONARY_NAME = Path(pattern=r"^[A-Za-z0-9_.-]{1,64}$")
+
+dictionaries_router = APIRouter(
+    prefix="/dictionaries",
+    tags=["Dictionaries"],
+)
+
+
+@dictionaries_router.post("/{name}", status_code=status.HTTP_201_CREATED)
+def register_dictionary(
+    request: DictionaryRequest,
+    name: str = DICTIONARY_NAME,
+    session: Session = Depends(get_db_session),
+) -> DictionaryResponse:
+    """
+    Register a new version of a term dictionary, to be referenced by submissions
+    instead of sending the terms every time.
+    """
+    try:
+        dictionary = dictionaries.write_dictionary(
+            session=session, name=name, terms=request.terms
+        )
+    except IntegrityError:
+        raise HTTPException(
+            status.HTTP_409_CONFLICT,
+            f"Dictionary '{name}' was registered at the same time, try again.",
+        )
+
+    return DictionaryResponse(
+        name=dictionary.name, version=dictionary.version, terms=dictionary.terms
+    )
+
+
+@dictionaries_router.get("/{name}")
+def read_dictionary(
+    name: str = DICTIONARY_NAME,
+    version: int | None = None,
+    session: Session = Depends(get_db_session),
+) -> DictionaryResponse:
+    """Read a version of a term dictionary, or its latest version."""
+    dictionary = dictionaries.read_dictionary(
+        session=session, name=name, version=version
+    )
+
+    if not dictionary:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+
+    return DictionaryResponse(
+        name=dictionary.name, version=dictionary.version, terms=dictionary.terms
+    )
@@ -0,0 +1,17 @@
+import redis
+from fastapi import APIRouter, Depends
+
+from app.factories import redis_connection
+from app.metrics import read_metrics
+
+metrics_router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+)
+
+
+@metrics_router.get("")
+def read_counters(
+    redis_client: redis.Redis = Depends(redis_connection),
+) -> dict[str, int]:
+    return read_metrics(redis_client)
@@ -1,20 +1,48 @@
+import asyncio
 import json
 import uuid
-from io import BytesIO
+from collections.abc import AsyncIterator
 
+import redis.asyncio
 from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from minio import Minio
-from pika.adapters.blocking_connection import BlockingChannel
-from sqlmodel import Session
+from PIL.Image import DecompressionBombError
 
-from app.config import MinioConfig
-from app.db.controllers import matches
-from app.db.factories import get_db_session
-from app.factories import minio_connection, rabbitmq_channel
-from app.models.validation import Exchange, MatchResponse, SubmitResponse
-from app.utils import publish_to_exchange, upload_object_to_minio
+from app.api.dependencies import rabbitmq_publisher, result_notifier
+from app.cache import ResultCache
+from app.codec import decode_results
+from app.config import APISettings, MinioConfig, TilingConfig
+from app.db.controllers import dictionaries, matches, ocr_results, ocr_tokens
+from app.db.factories import get_async_session_ctx, get_session_ctx
+from app.dictionaries import DictionaryMatchers
+from app.factories import async_redis_connection, minio_connection, result_cache
+from app.ids import uuid7
+from app.matching import MAX_EDIT_DISTANCE
+from app.models.validation import (
+    BatchSubmitResponse,
+    Exchange,
+    MatchMode,
+    MatchResponse,
+    ResultsRequest,
+    ResultsResponse,
+    SearchResponse,
+    SubmitResponse,
+)
+from app.notifications import ResultNotifier
+from app.publisher import AsyncPublisher
+from app.search import tokenize
+from app.staging import timed_out
+from app.tiling import exceeds_pixel_limit, limit_image_pixels, needs_tiling
+from app.utils import pack_message, read_image_size, upload_object_to_minio
 
+api_config = APISettings()
 minio_config = MinioConfig()  # type:ignore
+tiling_config = TilingConfig()
+limit_image_pixels(tiling_config)
+# Term dictionaries compiled for filtering stored OCR results again
+dictionary_matchers = DictionaryMatchers(dictionaries.load_dictionary_terms)
 
 
 pii_router = APIRouter(
@@ -23,47 +51,441 @@ pii_router = APIRouter(
 )
 
 
+async def prepare_image(image: UploadFile, options: dict, minio_client: Minio) -> dict:
+    """
+    Upload an image if needed, and build the message that submits it with the PII terms
+    and the options for matching them.
+
+    Returns:
+        The arguments to `AsyncPublisher.publish`, including the correlation ID of the
+        job.
+    """
+    correlation_id = str(uuid7())
+    # Large images are split into tiles by the forward worker
+    try:
+        image_size = await run_in_threadpool(read_image_size, image.file)
+        too_large = exceeds_pixel_limit(image_size, tiling_config)
+    except DecompressionBombError:
+        # Pillow refuses to open images over twice the limit
+        too_large = True
+    if too_large:
+        raise HTTPException(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"Images may have at most {tiling_config.MAX_IMAGE_PIXELS} pixels.",
+        )
+    data = {**options, "image_size": image_size}
+
+    inline = image.size is not None and image.size <= api_config.INLINE_IMAGE_MAX_BYTES
+    if inline:
+        # Small images travel inside the message, saving the upload to MinIO and the
+        # download by the OCR worker
+        body = pack_message(data, await image.read())
+        headers = {"inline": True}
+    else:
+        # The upload is spooled to disk when it is large, and streamed from there to
+        # MinIO in parts, in the thread pool so that the event loop is not blocked
+        data["image_url"] = await run_in_threadpool(
+            upload_object_to_minio,
+            client=minio_client,
+            bucket=minio_config.BUCKET,
+            path=minio_config.PATH,
+            filename=f"{correlation_id}_{image.filename}",
+            obj=image.file,
+            content_type=image.content_type,
+            part_size=minio_config.PART_SIZE,
+        )
+        body = json.dumps(data)
+        headers = None
+
+    if (
+        api_config.DIRECT_ROUTING
+        and not inline
+        and not needs_tiling(image_size, tiling_config)
+    ):
+        # The broker delivers the submission to both the OCR and filter queues, which
+        # saves the hop through the forward worker. Inline images still take the hop,
+        # as the filter would otherwise receive the image only to discard it
+        routing_key = "direct"
+    else:
+        routing_key = "input"
+
+    return {
+        "correlation_id": correlation_id,
+        "body": body,
+        "routing_key": routing_key,
+        "exchange": Exchange.FORWARD.value,
+        "headers": headers,
+    }
+
+
+def resolve_dictionary(name: str, version: int | None) -> dict:
+    """Pin a submission to a version of a term dictionary, by default the latest."""
+    with get_session_ctx() as session:
+        version = dictionaries.read_dictionary_version(
+            session=session, name=name, version=version
+        )
+
+    if version is None:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND, f"Dictionary '{name}' does not exist."
+        )
+    return {"name": name, "version": version}
+
+
+async def matching_options(
+    pii_terms: list[str] = Query([]),
+    dictionary: str | None = Query(None),
+    dictionary_version: int | None = Query(None),
+    match_mode: MatchMode = Query(MatchMode.EXACT),
+    max_distance: int = Query(1, ge=0, le=MAX_EDIT_DISTANCE),
+) -> dict:
+    """
+    The PII terms of a submission and the options for matching them, passed on to the
+    filter with the image.
+
+    A registered term dictionary is passed on by name and version instead of its terms,
+    and is compiled once by each filter worker.
+    """
+    if not pii_terms and dictionary is None:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            "Either PII terms or a dictionary are required.",
+        )
+
+    options = {
+        "pii_terms": pii_terms,
+        "match_mode": match_mode.value,
+        "max_distance": max_distance,
+    }
+    if dictionary is not None:
+        options["dictionary"] = await run_in_threadpool(
+            resolve_dictionary, dictionary, dictionary_version
+        )
+    return options
+
+
 @pii_router.post("")
 async def submit(
     image: UploadFile = File(),
-    pii_terms: list[str] = Query(),
+    options: dict = Depends(matching_options),
     minio_client: Minio = Depends(minio_connection),
-    rabbitmq_channel: BlockingChannel = Depends(rabbitmq_channel),
+    publisher: AsyncPublisher = Depends(rabbitmq_publisher),
 ) -> SubmitResponse:
-    correlation_id = str(uuid.uuid4())
-    image_file = BytesIO(image.file.read())
-
-    image_url = upload_object_to_minio(
-        client=minio_client,
-        bucket=minio_config.BUCKET,
-        path=minio_config.PATH,
-        filename=f"{correlation_id}_{image.filename}",
-        obj=image_file,
-        content_type=image.content_type,
-    )
+    message = await prepare_image(image, options, minio_client)
+    await publisher.publish(**message)
+    return SubmitResponse(correlation_id=message["correlation_id"])
+
+
+@pii_router.post("/batch")
+async def submit_batch(
+    images: list[UploadFile] = File(),
+    options: dict = Depends(matching_options),
+    minio_client: Minio = Depends(minio_connection),
+    publisher: AsyncPublisher = Depends(rabbitmq_publisher),
+) -> BatchSubmitResponse:
+    """
+    Submit several images to be searched for the same PII terms.
 
-    publish_to_exchange(
-        channel=rabbitmq_channel,
-        correlation_id=correlation_id,
-        body=json.dumps(
+    The uploads to MinIO run side by side in the thread pool, and the messages are
+    published without waiting for the broker to confirm the previous ones. The
+    correlation IDs are returned in the order of the images.
+
+    Nothing is published unless every image is accepted and uploaded, so that a failed
+    batch leaves no jobs behind. If the broker then fails to take some of the messages,
+    the correlation IDs of the jobs that were submitted are returned with the error,
+    and `null` in place of the others.
+    """
+    if len(images) > api_config.BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"At most {api_config.BATCH_MAX_IMAGES} images can be submitted at once.",
+        )
+
+    messages = await asyncio.gather(
+        *(prepare_image(image, options, minio_client) for image in images)
+    )
+    published = await asyncio.gather(
+        *(publisher.publish(**message) for message in messages),
+        return_exceptions=True,
+    )
+    correlation_ids = [
+        None if isinstance(result, Exception) else message["correlation_id"]
+        for message, result in zip(messages, published)
+    ]
+    if None in correlation_ids:
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
             {
-                "image_url": image_url,
-                "pii_terms": pii_terms,
-            }
-        ),
-        routing_key="input",
-        exchange=Exchange.FORWARD.value,
+                "message": "Some of the images could not be submitted.",
+                "correlation_ids": correlation_ids,
+            },
+        )
+    return BatchSubmitResponse(correlation_ids=correlation_ids)
+
+
+async def read_response(correlation_id: uuid.UUID) -> bytes | None:
+    """
+    Look the matches of a job up, with a session that is released right away, and
+    serialize them as a `MatchResponse`.
+    """
+    async with get_async_session_ctx() as session:
+        data = await matches.read_match_async(
+            session=session, correlation_id=correlation_id
+        )
+    if not data:
+        return None
+    return MatchResponse(matches=data.terms).model_dump_json().encode()
+
+
+async def read_cached_response(
+    correlation_id: uuid.UUID, cache: ResultCache | None
+) -> bytes | None:
+    """Read the response with the matches of a job from the cache, or the database."""
+    if cache is not None:
+        body = await cache.get(str(correlation_id))
+        if body is not None:
+            return body
+
+    body = await read_response(correlation_id)
+    if body is not None and cache is not None:
+        await cache.set_many({str(correlation_id): body})
+    return body
+
+
+async def read_many_responses(correlation_ids: list[uuid.UUID]) -> dict[str, bytes]:
+    """
+    Look the matches of several jobs up with a single query, and serialize each of
+    them as a `MatchResponse`.
+    """
+    async with get_async_session_ctx() as session:
+        found = await matches.read_many_matches_async(
+            session=session, correlation_ids=correlation_ids
+        )
+    return {
+        str(data.correlation_id): MatchResponse(matches=data.terms)
+        .model_dump_json()
+        .encode()
+        for data in found
+    }
+
+
+async def wait_for_response(
+    correlation_id: uuid.UUID,
+    timeout: float,
+    notifier: ResultNotifier,
+    cache: ResultCache | None,
+) -> bytes | None:
+    """
+    Read the response with the matches of a job, and wait up to `timeout` seconds for
+    the filter to announce them if they are not stored yet.
+
+    Returns:
+        The serialized response, or `None` if the matches are still not stored.
+    """
+    if not timeout:
+        return await read_cached_response(correlation_id, cache)
+
+    # Wait before looking the matches up, so that an announcement made in between is
+    # not missed
+    waiter = notifier.subscribe(str(correlation_id))
+    try:
+        body = await read_cached_response(correlation_id, cache)
+        if body is not None:
+            return body
+
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        return await read_cached_response(correlation_id, cache)
+    finally:
+        notifier.unsubscribe(str(correlation_id), waiter)
+
+
+# Declared before the routes with a correlation ID, which would match it otherwise
+@pii_router.get("/search")
+async def search(
+    term: str = Query(min_length=1),
+    after: uuid.UUID | None = None,
+    limit: int = Query(100, ge=1, le=api_config.SEARCH_MAX_RESULTS),
+) -> SearchResponse:
+    """
+    Find the processed images that contain a word, or all the words of `term`, in
+    pages of `limit` correlation IDs.
+
+    Words are compared without their case and surrounding punctuation. The next page
+    starts `after` the last ID of the previous page, which is returned as `next`.
+    """
+    tokens = tokenize([term])
+    if not tokens:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_ENTITY, "The term contains no words."
+        )
+
+    # One more ID than needed tells whether there is a next page
+    async with get_async_session_ctx() as session:
+        found = await ocr_tokens.search_ocr_tokens_async(
+            session=session, tokens=tokens, after=after, limit=limit + 1
+        )
+
+    correlation_ids = [str(correlation_id) for correlation_id in found[:limit]]
+    return SearchResponse(
+        correlation_ids=correlation_ids,
+        next=correlation_ids[-1] if len(found) > limit else None,
     )
-    return SubmitResponse(correlation_id=correlation_id)
 
 
-@pii_router.get("/{correlation_id}")
+@pii_router.get("/{correlation_id}", response_model=MatchResponse)
 async def read_result(
-    correlation_id: uuid.UUID, session: Session = Depends(get_db_session)
-) -> MatchResponse:
-    data = matches.read_match(session=session, correlation_id=correlation_id)
+    correlation_id: uuid.UUID,
+    wait: float = Query(0, ge=0, le=api_config.RESULT_WAIT_MAX),
+    notifier: ResultNotifier = Depends(result_notifier),
+    cache: ResultCache | None = Depends(result_cache),
+    redis_client: redis.asyncio.Redis = Depends(async_redis_connection),
+) -> Response:
+    """
+    Read the matches of a job. With `wait`, the request waits up to that many seconds
+    for the matches, and returns as soon as they are stored instead of being polled.
 
-    if not data:
+    The response is served from the cache as it was serialized, without validating it
+    again. A job that was not complete in time, e.g. because its image could not be
+    processed, is gone.
+    """
+    body = await wait_for_response(correlation_id, wait, notifier, cache)
+
+    if body is None:
+        if await timed_out(redis_client, str(correlation_id)):
+            raise HTTPException(status.HTTP_410_GONE, "The job timed out.")
         raise HTTPException(status.HTTP_404_NOT_FOUND)
 
-    return MatchResponse(matches=data.terms)
+    return Response(content=body, media_type="application/json")
+
+
+@pii_router.get("/{correlation_id}/events")
+async def stream_result(
+    correlation_id: uuid.UUID,
+    notifier: ResultNotifier = Depends(result_notifier),
+    cache: ResultCache | None = Depends(result_cache),
+) -> StreamingResponse:
+    """
+    Stream the matches of a job as Server-Sent Events.
+
+    A single `result` event is sent as soon as the matches are stored, after which the
+    stream ends. Until then, comments are sent every `API_RESULT_KEEPALIVE` seconds to
+    keep the connection open.
+    """
+
+    async def events() -> AsyncIterator[bytes]:
+        while True:
+            body = await wait_for_response(
+                correlation_id, api_config.RESULT_KEEPALIVE, notifier, cache
+            )
+            if body is not None:
+                yield b"event: result\ndata: " + body + b"\n\n"
+                return
+            yield b": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def check_results_request(request: ResultsRequest) -> None:
+    if len(request.correlation_ids) > api_config.BATCH_MAX_RESULTS:
+        raise HTTPException(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"At most {api_config.BATCH_MAX_RESULTS} results can be read at once.",
+        )
+
+
+def results_response(bodies: dict[str, bytes | None]) -> Response:
+    """Assemble a `ResultsResponse` from serialized `MatchResponse`s, by ID."""
+    results = b",".join(
+        json.dumps(id_).encode() + b":" + (body or b"null")
+        for id_, body in bodies.items()
+    )
+    return Response(
+        content=b'{"results":{' + results + b"}}", media_type="application/json"
+    )
+
+
+@pii_router.post("/results", response_model=ResultsResponse)
+async def read_results(
+    request: ResultsRequest,
+    cache: ResultCache | None = Depends(result_cache),
+) -> Response:
+    """
+    Read the matches of several jobs, with `null` for the jobs that are not finished.
+
+    Cached responses are read in a single round trip to Redis, and the others in a
+    single query. The response is assembled from the serialized responses without
+    validating them again.
+    """
+    check_results_request(request)
+
+    correlation_ids = [
+        str(correlation_id) for correlation_id in request.correlation_ids
+    ]
+    bodies: dict[str, bytes | None] = dict.fromkeys(correlation_ids)
+    if cache is not None:
+        bodies.update(zip(correlation_ids, await cache.get_many(correlation_ids)))
+
+    missing = [uuid.UUID(id_) for id_, body in bodies.items() if body is None]
+    if missing:
+        found = await read_many_responses(missing)
+        bodies.update(found)
+        if found and cache is not None:
+            await cache.set_many(found)
+
+    return results_response(bodies)
+
+
+def refilter_results(stored: dict[str, bytes], options: dict) -> dict[str, bytes]:
+    """
+    Match stored OCR results against PII terms, and serialize the matches of each image
+    as a `MatchResponse`.
+    """
+    matcher = dictionary_matchers.matcher(options)
+    match_mode = MatchMode(options["match_mode"])
+
+    return {
+        correlation_id: ResultCache.encode(
+            matcher.filter(
+                decode_results(results),
+                match_mode=match_mode,
+                max_distance=options["max_distance"],
+            ).to_dicts()
+        )
+        for correlation_id, results in stored.items()
+    }
+
+
+@pii_router.post("/refilter", response_model=ResultsResponse)
+async def refilter(
+    request: ResultsRequest,
+    options: dict = Depends(matching_options),
+) -> Response:
+    """
+    Match the stored OCR results of several images against other PII terms, without
+    submitting the images or running OCR again.
+
+    The terms and options are the same as for a submission. The matches are returned
+    right away and not stored, with `null` for the images whose OCR results are not
+    stored.
+    """
+    check_results_request(request)
+
+    async with get_async_session_ctx() as session:
+        rows = await ocr_results.read_many_ocr_results_async(
+            session=session, correlation_ids=request.correlation_ids
+        )
+    stored = {str(row.correlation_id): row.results for row in rows}
+
+    # Matching is CPU bound, so it runs in the thread pool
+    bodies: dict[str, bytes | None] = dict.fromkeys(
+        str(correlation_id) for correlation_id in request.correlation_ids
+    )
+    bodies.update(await run_in_threadpool(refilter_results, stored, options))
+    return results_response(bodies)
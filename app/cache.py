@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Callable
+
+import redis
+import redis.asyncio
+
+from app.metrics import increment
+
+logger = logging.getLogger(__name__)
+
+
+class OCRCache:
+    """
+    Content-addressed cache of serialized OCR results in Redis.
+
+    Results are keyed by the SHA-256 of the image contents and expire after a TTL. A
+    sorted set tracks when each entry was last used, and the least recently used entries
+    are evicted when the cache grows beyond its maximum size.
+
+    Concurrent requests for the same image are coalesced: the first worker takes a lock
+    and runs OCR, while the others wait for its results to be published.
+    """
+
+    prefix = "ocr_cache"
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        ttl: int,
+        max_entries: int,
+        lock_timeout: int,
+        wait_timeout: int,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.index_key = f"{self.prefix}:index"
+
+    @staticmethod
+    def digest(image: bytes) -> str:
+        return hashlib.sha256(image).hexdigest()
+
+    def _result_key(self, digest: str) -> str:
+        return f"{self.prefix}:result:{digest}"
+
+    def _lock_key(self, digest: str) -> str:
+        return f"{self.prefix}:lock:{digest}"
+
+    def _channel(self, digest: str) -> str:
+        return f"{self.prefix}:done:{digest}"
+
+    def get(self, digest: str) -> bytes | None:
+        """Get cached results and mark them as recently used."""
+        result_key = self._result_key(digest)
+        result = self.client.get(result_key)
+        if result is not None:
+            with self.client.pipeline(transaction=False) as pipeline:
+                pipeline.expire(result_key, self.ttl)
+                pipeline.zadd(self.index_key, {digest: time.time()})
+                pipeline.execute()
+        return result
+
+    def set(self, digest: str, results: bytes) -> None:
+        """Cache results, evict the least recently used entries and notify waiters."""
+        with self.client.pipeline(transaction=False) as pipeline:
+            pipeline.set(self._result_key(digest), results, ex=self.ttl)
+            pipeline.zadd(self.index_key, {digest: time.time()})
+            pipeline.zcard(self.index_key)
+            *_, size = pipeline.execute()
+
+        if size > self.max_entries:
+            evicted = self.client.zpopmin(self.index_key, size - self.max_entries)
+            if evicted:
+                self.client.delete(
+                    *(self._result_key(digest.decode()) for digest, _ in evicted)
+                )
+
+        self.client.publish(self._channel(digest), 1)
+
+    def _wait(self, digest: str) -> bytes | None:
+        # Subscribe before checking for the results, so that a notification sent in
+        # between is not missed. Results are also checked periodically in case the
+        # notification is lost.
+        deadline = time.monotonic() + self.wait_timeout
+        with self.client.pubsub(ignore_subscribe_messages=True) as pubsub:
+            pubsub.subscribe(self._channel(digest))
+            while (remaining := deadline - time.monotonic()) > 0:
+                result = self.get(digest)
+                if result is not None:
+                    return result
+                if not self.client.exists(self._lock_key(digest)):
+                    # The worker running OCR gave up without producing results
+                    return None
+                pubsub.get_message(timeout=min(remaining, 1.0))
+        return None
+
+    def get_or_compute(self, image: bytes, compute: Callable[[], bytes]) -> bytes:
+        """
+        Get the cached OCR results of an image, or compute and cache them.
+
+        Args:
+            image: The contents of the image.
+            compute: Runs OCR on the image and returns the serialized results.
+
+        Returns:
+            The serialized OCR results.
+        """
+        digest = self.digest(image)
+
+        result = self.get(digest)
+        if result is not None:
+            increment(self.client, "ocr_cache_hits")
+            return result
+
+        lock_key = self._lock_key(digest)
+        owns_lock = self.client.set(lock_key, 1, nx=True, ex=self.lock_timeout)
+        if not owns_lock:
+            increment(self.client, "ocr_cache_coalesced")
+            logger.info(f"Waiting for OCR results of image '{digest}'.")
+            result = self._wait(digest)
+            if result is not None:
+                return result
+
+        increment(self.client, "ocr_cache_misses")
+        try:
+            result = compute()
+            self.set(digest, result)
+        finally:
+            if owns_lock:
+                self.client.delete(lock_key)
+        return result
+
+
+class ResultCache:
+    """
+    Read-through cache of the serialized responses of `GET /pii/{correlation_id}`.
+
+    Stored matches never change, so the response body is cached as is, and served
+    without a database session or validating every bounding box again. The filter
+    fills the cache when it stores the matches, and the API when it reads matches that
+    are not cached. Entries expire after a TTL, and the least recently used ones are
+    evicted when the cache grows beyond its maximum size, as in `OCRCache`.
+    """
+
+    prefix = "result_cache"
+
+    def __init__(self, client: redis.asyncio.Redis, ttl: int, max_entries: int):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_key = f"{self.prefix}:index"
+
+    @staticmethod
+    def encode(terms: list[dict]) -> bytes:
+        """
+        Serialize matches as a `MatchResponse`, given the dictionaries of complete
+        bounding boxes.
+        """
+        return json.dumps({"matches": terms}, separators=(",", ":")).encode()
+
+    def _key(self, correlation_id: str) -> str:
+        return f"{self.prefix}:{correlation_id}"
+
+    async def get(self, correlation_id: str) -> bytes | None:
+        """Get a cached response and mark it as recently used."""
+        key = self._key(correlation_id)
+        body = await self.client.get(key)
+        if body is not None:
+            async with self.client.pipeline(transaction=False) as pipeline:
+                pipeline.expire(key, self.ttl)
+                pipeline.zadd(self.index_key, {correlation_id: time.time()})
+                await pipeline.execute()
+        return body
+
+    async def get_many(self, correlation_ids: list[str]) -> list[bytes | None]:
+        """Get several cached responses, and mark the ones found as recently used."""
+        if not correlation_ids:
+            return []
+
+        bodies = await self.client.mget([self._key(id_) for id_ in correlation_ids])
+        found = [id_ for id_, body in zip(correlation_ids, bodies) if body is not None]
+        if found:
+            async with self.client.pipeline(transaction=False) as pipeline:
+                for correlation_id in found:
+                    pipeline.expire(self._key(correlation_id), self.ttl)
+                pipeline.zadd(self.index_key, dict.fromkeys(found, time.time()))
+                await pipeline.execute()
+        return bodies
+
+    async def set_many(self, bodies: dict[str, bytes]) -> None:
+        """Cache responses, and evict the least recently used entries."""
+        if not bodies:
+            return
+
+        now = time.time()
+        async with self.client.pipeline(transaction=False) as pipeline:
+            for correlation_id, body in bodies.items():
+                pipeline.set(self._key(correlation_id), body, ex=self.ttl)
+            pipeline.zadd(self.index_key, dict.fromkeys(bodies, now))
+            pipeline.zcard(self.index_key)
+            *_, size = await pipeline.execute()
+
+        if size > self.max_entries:
+            evicted = await self.client.zpopmin(self.index_key, size - self.max_entries)
+            if evicted:
+                await self.client.delete(
+                    *(
+                        self._key(correlation_id.decode())
+                        for correlation_id, _ in evicted
+                    )
+                )
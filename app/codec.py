@@ -0,0 +1,156 @@
+import json
+import struct
+import sys
+from array import array
+from enum import Enum
+
+from app.models.boxes import INT_COLUMNS, BoundingBoxTable
+
+try:
+    import zstandard
+except ImportError:  # compression is optional
+    zstandard = None
+
+# Binary payloads start with a magic number, a version and flags, so that they can be
+# told apart from JSON without any metadata, e.g. when staged in Redis
+MAGIC = b"PIIB"
+VERSION = 1
+HEADER = struct.Struct("<4sBB")
+FLAG_ZSTD = 1
+
+
+class Encoding(str, Enum):
+    JSON = "json"
+    BINARY = "binary"
+
+
+def _to_bytes(values: array) -> bytes:
+    # Arrays are stored little-endian, whatever the byte order of the machine
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode: str, data: memoryview) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode_table(table: BoundingBoxTable, compress: bool = False) -> bytes:
+    """
+    Encode OCR results in the binary format.
+
+    The payload holds the number of boxes, one little-endian 32-bit array per integer
+    column, and a string table of the lengths of the UTF-8 encoded texts followed by the
+    texts themselves. It is compressed with zstd when asked to and available.
+
+    Args:
+        table: The bounding boxes.
+        compress: Whether to compress the payload.
+
+    Returns:
+        The encoded OCR results.
+    """
+    texts = [text.encode() for text in table.text]
+
+    parts = [struct.pack("<I", len(texts))]
+    for name in INT_COLUMNS:
+        parts.append(_to_bytes(getattr(table, name)))
+    parts.append(_to_bytes(array("I", map(len, texts))))
+    parts.append(b"".join(texts))
+    body = b"".join(parts)
+
+    flags = 0
+    if compress and zstandard is not None:
+        body = zstandard.ZstdCompressor().compress(body)
+        flags |= FLAG_ZSTD
+
+    return HEADER.pack(MAGIC, VERSION, flags) + body
+
+
+def decode_table(payload: bytes) -> BoundingBoxTable:
+    """Decode OCR results from the binary format into a table."""
+    magic, version, flags = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported OCR results payload, version {version}.")
+
+    start = HEADER.size
+    body = memoryview(payload)[start:]
+    if flags & FLAG_ZSTD:
+        if zstandard is None:
+            raise ValueError("OCR results are compressed, but zstd is not available.")
+        body = memoryview(zstandard.ZstdDecompressor().decompress(body))
+
+    (count,) = struct.unpack_from("<I", body)
+    offset = 4
+    size = 4 * count
+
+    columns = {}
+    for name in INT_COLUMNS:
+        end = offset + size
+        columns[name] = _from_bytes("i", body[offset:end])
+        offset = end
+
+    end = offset + size
+    lengths = _from_bytes("I", body[offset:end])
+    texts = bytes(body[end:])
+
+    text = []
+    start = 0
+    for length in lengths:
+        end = start + length
+        text.append(texts[start:end].decode())
+        start = end
+
+    return BoundingBoxTable(text, **columns)
+
+
+def encoding_of(payload: bytes) -> Encoding:
+    """Tell the encoding of OCR results from the payload itself."""
+    return Encoding.BINARY if payload.startswith(MAGIC) else Encoding.JSON
+
+
+def is_compressed(payload: bytes) -> bool:
+    """Whether a payload holds OCR results in the binary format, compressed."""
+    if encoding_of(payload) != Encoding.BINARY:
+        return False
+    _, _, flags = HEADER.unpack_from(payload)
+    return bool(flags & FLAG_ZSTD)
+
+
+def encode_results(
+    table: BoundingBoxTable,
+    encoding: Encoding = Encoding.BINARY,
+    compress: bool = False,
+) -> bytes:
+    """
+    Encode OCR results in either format.
+
+    Args:
+        table: The bounding boxes.
+        encoding: The format to encode the results in.
+        compress: Whether to compress binary results.
+
+    Returns:
+        The encoded OCR results.
+    """
+    if encoding == Encoding.BINARY:
+        return encode_table(table, compress=compress)
+
+    return json.dumps(table.to_dicts()).encode()
+
+
+def decode_results(payload: bytes) -> BoundingBoxTable:
+    """
+    Decode OCR results in either format into a table.
+
+    Results published before the binary format was introduced are JSON.
+    """
+    if encoding_of(payload) == Encoding.BINARY:
+        return decode_table(payload)
+
+    return BoundingBoxTable.from_dicts(json.loads(payload))
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,6 +16,8 @@ class MinioConfig(BaseSettings):
     SECURE: bool = True
     BUCKET: str
     PATH: str
+    # Size of the parts objects are streamed to MinIO in, at least 5 MiB
+    PART_SIZE: int = 5 * 1024 * 1024
 
 
 class RedisConfig(BaseSettings):
@@ -39,6 +43,111 @@ class RabbitMQConfig(BaseSettings):
     DEFAULT_PASS: str
 
 
+class WorkerConfig(BaseSettings):
+    """
+    Configuration model for the RabbitMQ consumer loop shared by the workers.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="WORKER_")
+
+    # Messages processed at the same time by a worker process, and taken from the
+    # queue at a time, which defaults to the concurrency
+    CONCURRENCY: int = 100
+    PREFETCH_COUNT: int = 0
+    # Seconds to wait before reconnecting to RabbitMQ, doubled after every failure
+    RECONNECT_DELAY_MIN: float = 1.0
+    RECONNECT_DELAY_MAX: float = 30.0
+    # Seconds to wait for the messages in progress to finish when shutting down
+    DRAIN_TIMEOUT: float = 30.0
+
+
+class OCRConfig(BaseSettings):
+    """
+    Configuration model for the OCR workers.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="OCR_")
+
+    ENGINE: Literal["auto", "tesserocr", "pytesseract"] = "auto"
+    LANG: str = "eng"
+    TESSDATA_PATH: str | None = None
+    # Number of OCR processes per worker, 0 runs OCR in the consumer process itself
+    WORKERS: int = 0
+    # Messages taken from the queue at a time, defaults to the number of processes
+    PREFETCH_COUNT: int = 0
+    THREADS_PER_WORKER: int = 1
+    # Cache of OCR results keyed by the hash of the image contents
+    CACHE_ENABLED: bool = True
+    CACHE_TTL: int = 24 * 60 * 60
+    CACHE_MAX_ENTRIES: int = 10_000
+    # How long an image is reserved for the worker running OCR on it, and how long
+    # other workers wait for its results before running OCR themselves
+    CACHE_LOCK_TIMEOUT: int = 5 * 60
+    CACHE_WAIT_TIMEOUT: int = 5 * 60
+    # Format of the OCR results sent to the filter, "json" for older filter workers
+    RESULT_ENCODING: Literal["binary", "json"] = "binary"
+    RESULT_COMPRESSION: bool = True
+
+
+class TilingConfig(BaseSettings):
+    """
+    Configuration model for splitting large images into tiles.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="TILING_")
+
+    ENABLED: bool = True
+    # Images with more pixels than this are split into tiles
+    MAX_PIXELS: int = 25_000_000
+    TILE_SIZE: int = 4000
+    OVERLAP: int = 200
+    # Images with more pixels than this are rejected, and Pillow opens no larger ones
+    MAX_IMAGE_PIXELS: int = 400_000_000
+
+
+class ResultCacheConfig(BaseSettings):
+    """
+    Configuration model for the cache of the responses with stored matches.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="RESULT_CACHE_")
+
+    ENABLED: bool = True
+    # Seconds a response is kept after its last use, and responses kept before
+    # evicting the least recently used
+    TTL: int = 60 * 60
+    MAX_ENTRIES: int = 100_000
+
+
+class FilterConfig(BaseSettings):
+    """
+    Configuration model for the filter workers.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="FILTER_")
+
+    # Jobs stored per database transaction, and how long to wait for a batch to fill
+    # up
+    BATCH_SIZE: int = 1
+    BATCH_LINGER_MS: int = 50
+    # Term dictionary versions kept compiled by a filter worker
+    DICTIONARY_CACHE_SIZE: int = 32
+    # Keep the OCR results of every image in the database, so that it can be filtered
+    # again with other terms
+    STORE_OCR_RESULTS: bool = True
+    # Index the words recognised in every image, so that the images containing a word
+    # can be searched for
+    INDEX_OCR_TOKENS: bool = True
+    # Seconds a job may wait for its other half before it is removed from Redis and
+    # recorded as timed out, how often timed out jobs are looked for, and how many of
+    # them are kept on record
+    STAGING_TTL: int = 60 * 60
+    STAGING_SWEEP_INTERVAL: float = 30.0
+    STAGING_TIMED_OUT_MAX: int = 10_000
+    # Compress the staged halves of a job that are not compressed yet
+    STAGING_COMPRESSION: bool = True
+
+
 class DatabaseSettings(BaseSettings):
     """
     Configuration model for Postgres.
@@ -57,6 +166,14 @@ class DatabaseSettings(BaseSettings):
     POOL_PRE_PING: bool = False
     POOL_USE_LIFO: bool = False
     ECHO: bool = False
+    # Pool of the asyncio engine of the API read path, separate from the pool of the
+    # synchronous engine
+    ASYNC_POOL_SIZE: int = 10
+    ASYNC_MAX_OVERFLOW: int = 20
+    # Monthly partitions of the matches created ahead of time, and kept before they
+    # are dropped
+    PARTITIONS_AHEAD: int = 2
+    RETENTION_MONTHS: int = 12
 
 
 class APISettings(BaseSettings):
@@ -69,3 +186,19 @@ class APISettings(BaseSettings):
     TITLE: str = "PIIrate Hunter API"
     DESCRIPTION: str = "An API that identifies PII data in an image using OCR"
     VERSION: str = "0.0.1"
+    # Images up to this size travel inside the RabbitMQ messages instead of through
+    # MinIO
+    INLINE_IMAGE_MAX_BYTES: int = 256 * 1024
+    # Publish submissions that are not split into tiles straight to the OCR and filter
+    # queues, through the bindings set up by `scripts/initialise.py`, instead of
+    # through the forward worker
+    DIRECT_ROUTING: bool = False
+    # Longest a request for the matches of a job may wait for them, and the interval
+    # between keep-alive comments on a stream of results
+    RESULT_WAIT_MAX: float = 30.0
+    RESULT_KEEPALIVE: float = 15.0
+    # Most images submitted, and results read, by a single batch request
+    BATCH_MAX_IMAGES: int = 1000
+    BATCH_MAX_RESULTS: int = 1000
+    # Most correlation IDs returned by a page of search results
+    SEARCH_MAX_RESULTS: int = 1000
@@ -0,0 +1,61 @@
+from sqlmodel import Session, func, select
+
+from app.db.factories import get_session_ctx
+from app.models.database import TermDictionary
+
+
+def read_dictionary(
+    session: Session, name: str, version: int | None = None
+) -> TermDictionary | None:
+    """Read a version of a term dictionary, or its latest version."""
+    if version is not None:
+        return session.get(TermDictionary, (name, version))
+
+    statement = (
+        select(TermDictionary)
+        .where(TermDictionary.name == name)
+        .order_by(TermDictionary.version.desc())  # type: ignore
+        .limit(1)
+    )
+    return session.exec(statement).first()
+
+
+def load_dictionary_terms(name: str, version: int) -> list[str]:
+    """Read the terms of a version of a term dictionary, in a session of their own."""
+    with get_session_ctx() as session:
+        dictionary = read_dictionary(session=session, name=name, version=version)
+        if dictionary is None:
+            raise LookupError(f"Dictionary '{name}' version {version} not found.")
+        return dictionary.terms
+
+
+def read_dictionary_version(
+    session: Session, name: str, version: int | None = None
+) -> int | None:
+    """
+    Check that a version of a term dictionary exists, or find its latest version,
+    without reading the terms.
+    """
+    statement = select(func.max(TermDictionary.version)).where(
+        TermDictionary.name == name
+    )
+    if version is not None:
+        statement = statement.where(TermDictionary.version == version)
+    return session.exec(statement).one()
+
+
+def write_dictionary(session: Session, name: str, terms: list[str]) -> TermDictionary:
+    """
+    Register a new version of a term dictionary.
+
+    Two registrations of the same name at once get the same version, and the second
+    one fails on the primary key when it is flushed.
+    """
+    latest = session.exec(
+        select(func.max(TermDictionary.version)).where(TermDictionary.name == name)
+    ).one()
+    dictionary = TermDictionary(name=name, version=(latest or 0) + 1, terms=terms)
+    session.add(dictionary)
+    session.flush()
+
+    return dictionary
@@ -1,19 +1,81 @@
 from uuid import UUID
 
-from sqlmodel import Session
+from sqlalchemy import Uuid, column, exists, values
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.db.locks import lock_jobs
+from app.ids import earliest_created_at
 from app.models.database import Matches
 
 
+def select_matches(correlation_ids: list[UUID]):
+    """
+    Select the matches of several images, only from the partitions that can hold them
+    when their correlation IDs tell when they were submitted.
+    """
+    statement = select(Matches).where(
+        Matches.correlation_id.in_(correlation_ids)  # type: ignore
+    )
+    earliest = earliest_created_at(correlation_ids)
+    if earliest is not None:
+        statement = statement.where(Matches.created_at >= earliest)
+    return statement
+
+
 def read_match(session: Session, correlation_id: UUID) -> Matches | None:
-    return session.get(Matches, correlation_id)
+    statement = select_matches([correlation_id])
+    return session.exec(statement.limit(1)).first()
 
 
-def write_matches(session: Session, correlation_id: UUID, terms: list[dict]) -> Matches:
-    match = Matches(
-        correlation_id=correlation_id,
-        terms=terms,
-    )
-    session.add(match)
+async def read_match_async(
+    session: AsyncSession, correlation_id: UUID
+) -> Matches | None:
+    statement = select_matches([correlation_id])
+    return (await session.exec(statement.limit(1))).first()
+
+
+async def read_many_matches_async(
+    session: AsyncSession, correlation_ids: list[UUID]
+) -> list[Matches]:
+    """Read the matches of several images with a single query, on the event loop."""
+    if not correlation_ids:
+        return []
+
+    return list(await session.exec(select_matches(correlation_ids)))
 
-    return match
+
+def write_many_matches(session: Session, matches: list[dict]) -> list[UUID]:
+    """
+    Insert the matches of several images with a single multi-row insert, and return
+    the correlation IDs of the matches inserted.
+
+    Matches that are already stored, e.g. when a message is redelivered after the
+    transaction was committed, are skipped. The table is partitioned by creation time,
+    which a redelivered message does not share with the first delivery, so the stored
+    IDs are looked up instead of relying on a conflict. The jobs are locked first, so
+    that a delivery storing the same job concurrently waits for this transaction, and
+    then finds its matches.
+    """
+    if not matches:
+        return []
+
+    lock_jobs(session, [match["correlation_id"] for match in matches])
+
+    rows = values(
+        column("correlation_id", Uuid),
+        column("terms", JSONB),
+        name="new_matches",
+    ).data([(match["correlation_id"], match["terms"]) for match in matches])
+
+    stored = exists().where(Matches.correlation_id == rows.c.correlation_id)
+    earliest = earliest_created_at([match["correlation_id"] for match in matches])
+    if earliest is not None:
+        stored = stored.where(Matches.created_at >= earliest)
+    statement = insert(Matches).from_select(
+        ["correlation_id", "terms"],
+        select(rows.c.correlation_id, rows.c.terms).where(~stored),
+    )
+    inserted = session.exec(statement.returning(Matches.correlation_id))  # type: ignore
+    return list(inserted.scalars())
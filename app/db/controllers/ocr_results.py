@@ -0,0 +1,57 @@
+from uuid import UUID
+
+from sqlalchemy import LargeBinary, Uuid, column, exists, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.locks import lock_jobs
+from app.ids import earliest_created_at
+from app.models.database import OCRResult
+
+
+def write_many_ocr_results(session: Session, ocr_results: list[dict]) -> None:
+    """
+    Insert the OCR results of several images with a single multi-row insert.
+
+    Results that are already stored, e.g. when a message is redelivered after the
+    transaction was committed, are skipped. As for the matches, the stored IDs are
+    looked up, since the table is partitioned by creation time, after locking the jobs
+    against concurrent deliveries.
+    """
+    if not ocr_results:
+        return
+
+    lock_jobs(session, [result["correlation_id"] for result in ocr_results])
+
+    rows = values(
+        column("correlation_id", Uuid),
+        column("results", LargeBinary),
+        name="new_ocr_results",
+    ).data([(result["correlation_id"], result["results"]) for result in ocr_results])
+
+    stored = exists().where(OCRResult.correlation_id == rows.c.correlation_id)
+    earliest = earliest_created_at([result["correlation_id"] for result in ocr_results])
+    if earliest is not None:
+        stored = stored.where(OCRResult.created_at >= earliest)
+    statement = insert(OCRResult).from_select(
+        ["correlation_id", "results"],
+        select(rows.c.correlation_id, rows.c.results).where(~stored),
+    )
+    session.exec(statement)  # type: ignore
+
+
+async def read_many_ocr_results_async(
+    session: AsyncSession, correlation_ids: list[UUID]
+) -> list[OCRResult]:
+    """Read the OCR results of several images with a single query, on the event loop."""
+    if not correlation_ids:
+        return []
+
+    statement = select(OCRResult).where(
+        OCRResult.correlation_id.in_(correlation_ids)  # type: ignore
+    )
+    earliest = earliest_created_at(correlation_ids)
+    if earliest is not None:
+        statement = statement.where(OCRResult.created_at >= earliest)
+    return list(await session.exec(statement))
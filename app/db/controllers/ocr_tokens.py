@@ -0,0 +1,83 @@
+from uuid import UUID
+
+from sqlalchemy import exists, insert
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.database import OCRToken
+
+# Postings counted at most when looking for the rarest token of a search
+RAREST_TOKEN_SAMPLE = 10_000
+
+
+def write_many_ocr_tokens(session: Session, ocr_tokens: list[dict]) -> None:
+    """
+    Insert the tokens of several images, batched into multi-row inserts by the driver.
+
+    The tokens of an image are only written along with its matches, which skip the
+    images already stored and lock the images being stored, so they are not looked up
+    again.
+    """
+    if not ocr_tokens:
+        return
+
+    session.execute(insert(OCRToken), ocr_tokens)
+
+
+async def rarest_token(session: AsyncSession, tokens: list[str]) -> str:
+    """
+    The token in the fewest images, counting up to `RAREST_TOKEN_SAMPLE` images each,
+    so that a common token costs no more than a rare one.
+    """
+    counts = {}
+    for token in tokens:
+        postings = (
+            select(OCRToken.correlation_id)
+            .where(OCRToken.token == token)
+            .limit(RAREST_TOKEN_SAMPLE)
+            .subquery()
+        )
+        counts[token] = (
+            await session.exec(select(func.count()).select_from(postings))
+        ).one()
+    return min(tokens, key=counts.__getitem__)
+
+
+async def search_ocr_tokens_async(
+    session: AsyncSession, tokens: list[str], after: UUID | None, limit: int
+) -> list[UUID]:
+    """
+    Read the correlation IDs of the images containing all of the tokens, in order,
+    starting after `after`.
+
+    The postings of the rarest token are read in order, and each of its images is
+    looked up in the postings of the other tokens, so the query stops as soon as the
+    page is full instead of reading every posting of every token. An image is returned
+    once, even if its tokens were stored twice, e.g. by concurrent deliveries before
+    jobs were locked while they are stored.
+    """
+    if not tokens:
+        return []
+
+    rarest = await rarest_token(session, tokens) if len(tokens) > 1 else tokens[0]
+    statement = select(OCRToken.correlation_id).where(OCRToken.token == rarest)
+    if after is not None:
+        statement = statement.where(OCRToken.correlation_id > after)
+
+    for token in tokens:
+        if token == rarest:
+            continue
+        # The tokens of an image are stored together, with the same `created_at`,
+        # which limits the lookup to a single partition
+        other = aliased(OCRToken)
+        statement = statement.where(
+            exists().where(
+                other.token == token,
+                other.correlation_id == OCRToken.correlation_id,
+                other.created_at == OCRToken.created_at,
+            )
+        )
+
+    statement = statement.distinct().order_by(OCRToken.correlation_id).limit(limit)
+    return list(await session.exec(statement))
@@ -1,14 +1,29 @@
-from collections.abc import Generator
-from contextlib import contextmanager
+from collections.abc import AsyncGenerator, Generator
+from contextlib import asynccontextmanager, contextmanager
 
 from sqlalchemy.engine import URL, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.config import DatabaseSettings
 
 config = DatabaseSettings()  # type: ignore
 
 engine = None
+async_engine = None
+async_sessions: async_sessionmaker[AsyncSession] | None = None
+
+
+def database_url(drivername: str) -> URL:
+    return URL.create(
+        drivername,
+        username=config.USER,
+        password=config.PASSWORD,
+        host=config.HOST,
+        database=config.DATABASE,
+        port=config.PORT,
+    )
 
 
 def create_database_engine() -> Engine:
@@ -22,19 +37,10 @@ def create_database_engine() -> Engine:
     Returns:
         A configured `SQLAlchemy` engine for interacting with the PostgreSQL database.
     """
-    connection_string = URL.create(
-        "postgresql",
-        username=config.USER,
-        password=config.PASSWORD,
-        host=config.HOST,
-        database=config.DATABASE,
-        port=config.PORT,
-    )
-
     connect_args = {}
 
     engine = create_engine(
-        connection_string,
+        database_url("postgresql"),
         connect_args=connect_args,
         pool_size=config.POOL_SIZE,
         max_overflow=config.MAX_OVERFLOW,
@@ -46,6 +52,28 @@ def create_database_engine() -> Engine:
     return engine
 
 
+def create_async_database_engine() -> AsyncEngine:
+    """
+    Create an asyncio `SQLAlchemy` engine for PostgreSQL, using `asyncpg`.
+
+    The engine serves the read path of the API, whose queries are awaited on the event
+    loop instead of blocking it or taking a thread of the pool. It has its own pool,
+    sized by `ASYNC_POOL_SIZE` and `ASYNC_MAX_OVERFLOW`.
+
+    Returns:
+        A configured asyncio `SQLAlchemy` engine.
+    """
+    return create_async_engine(
+        database_url("postgresql+asyncpg"),
+        pool_size=config.ASYNC_POOL_SIZE,
+        max_overflow=config.ASYNC_MAX_OVERFLOW,
+        pool_recycle=config.POOL_RECYCLE,
+        pool_pre_ping=config.POOL_PRE_PING,
+        pool_use_lifo=config.POOL_USE_LIFO,
+        echo=config.ECHO,
+    )
+
+
 def get_db_session() -> Generator[Session, None, None]:
     """
     Provide a database session.
@@ -97,3 +125,44 @@ def get_session_ctx() -> Generator[Session, None, None]:
         ```
     """
     yield from get_db_session()
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Provide an asyncio database session.
+
+    Create the asyncio engine if necessary. Yield a new session, which is committed
+    after use and rolled back in case of any exceptions, as with `get_db_session`.
+
+    Yields:
+        A `SQLModel` asyncio session object for interacting with the database.
+    """
+    global async_engine, async_sessions
+    if not async_sessions:
+        async_engine = create_async_database_engine()
+        async_sessions = async_sessionmaker(
+            async_engine, class_=AsyncSession, expire_on_commit=False
+        )
+
+    async with async_sessions() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+@asynccontextmanager
+async def get_async_session_ctx() -> AsyncGenerator[AsyncSession, None]:
+    """Context manager for obtaining an asyncio database session."""
+    async for session in get_async_session():
+        yield session
+
+
+async def dispose_async_engine() -> None:
+    """Close the connections of the asyncio engine, if it was created."""
+    global async_engine, async_sessions
+    if async_engine is not None:
+        await async_engine.dispose()
+    async_engine = async_sessions = None
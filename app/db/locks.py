@@ -0,0 +1,29 @@
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+
+def lock_jobs(session: Session, correlation_ids: list[UUID]) -> None:
+    """
+    Take a transaction-level advisory lock on each of several jobs, so that the rows of
+    a job are not written by two transactions at once.
+
+    A job can be stored by two workers at once, when a redelivered half picks up a job
+    that is still being stored. The tables are partitioned by creation time, which is
+    part of their primary keys, so nothing else stops both transactions from inserting
+    the same job. The locks are taken in the order of their keys, so that transactions
+    storing overlapping batches do not deadlock, and released when the transaction ends.
+    """
+    if not correlation_ids:
+        return
+
+    session.execute(
+        text(
+            "SELECT pg_advisory_xact_lock(key) FROM ("
+            "SELECT DISTINCT hashtext(id) AS key "
+            "FROM unnest(CAST(:ids AS text[])) AS id ORDER BY key"
+            ") AS keys"
+        ),
+        {"ids": [str(correlation_id) for correlation_id in correlation_ids]},
+    )
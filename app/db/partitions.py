@@ -0,0 +1,136 @@
+import logging
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+logger = logging.getLogger(__name__)
+
+# These tables are partitioned by month of creation, with a partition named after
+# its table and month, e.g. `matches_2024_10`. Rows without a partition land in the
+# default partition, e.g. `matches_default`, which is never dropped, so partitions
+# are created ahead of time.
+PARTITIONED_TABLES = ("matches", "ocr_results", "ocr_tokens")
+PARTITION_PATTERN = re.compile(r"^(\w+)_(\d{4})_(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    """The first day of the month `months` after the month of `month`."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(parent: str, month: date) -> str:
+    return f"{parent}_{month.year:04d}_{month.month:02d}"
+
+
+def current_month(session: Session) -> date:
+    """The current month of the database, which sets `created_at`."""
+    return session.execute(text("SELECT date_trunc('month', now())::date")).scalar_one()
+
+
+def list_partitions(session: Session, parent: str) -> list[tuple[str, date]]:
+    """The monthly partitions of a table, with their months, in order."""
+    names = session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :parent"
+        ),
+        {"parent": parent},
+    ).scalars()
+
+    partitions = []
+    for name in names:
+        match = PARTITION_PATTERN.match(name)
+        if match and match.group(1) == parent:
+            year, month = map(int, match.groups()[1:])
+            partitions.append((name, date(year, month, 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(session: Session, parent: str, month: date) -> str:
+    """
+    Create the partition of a month, with the rows of that month that landed in the
+    default partition in the meantime.
+
+    Postgres refuses to create a partition for the rows the default partition holds,
+    so the partition is created on its own, filled and then attached, all in the same
+    transaction.
+    """
+    name = partition_name(parent, month)
+    end = add_months(month, 1)
+
+    session.execute(
+        text(
+            f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING "
+            "CONSTRAINTS)"
+        )
+    )
+    moved = session.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {parent}_default "
+            "WHERE created_at >= :start AND created_at < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"start": month, "end": end},
+    ).rowcount
+    session.execute(
+        text(
+            f"ALTER TABLE {parent} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{month}') TO ('{end}')"
+        )
+    )
+
+    logger.info(f"Created partition '{name}'.")
+    if moved:
+        logger.warning(f"Moved {moved} rows from '{parent}_default' to '{name}'.")
+    return name
+
+
+def create_partitions(session: Session, months_ahead: int) -> list[str]:
+    """
+    Create the partitions of the current month and of the next `months_ahead` months
+    of every partitioned table, if they do not exist yet.
+
+    Returns:
+        The names of the partitions created.
+    """
+    start = current_month(session)
+
+    created = []
+    for parent in PARTITIONED_TABLES:
+        existing = {name for name, _ in list_partitions(session, parent)}
+        for offset in range(months_ahead + 1):
+            month = add_months(start, offset)
+            if partition_name(parent, month) not in existing:
+                created.append(create_partition(session, parent, month))
+    return created
+
+
+def drop_partitions(session: Session, retention_months: int) -> list[str]:
+    """
+    Drop the partitions of every partitioned table of the months before the last
+    `retention_months` months.
+
+    A partition is detached and dropped as a whole, which is quick and leaves no dead
+    rows behind, unlike deleting its rows.
+
+    Returns:
+        The names of the partitions dropped.
+    """
+    cutoff = add_months(current_month(session), -retention_months)
+
+    dropped = []
+    for parent in PARTITIONED_TABLES:
+        for name, month in list_partitions(session, parent):
+            if month >= cutoff:
+                break
+
+            session.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {name}"))
+            session.execute(text(f"DROP TABLE {name}"))
+            logger.info(f"Dropped partition '{name}'.")
+            dropped.append(name)
+    return dropped
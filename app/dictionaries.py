@@ -0,0 +1,46 @@
+import logging
+from collections.abc import Callable
+from functools import lru_cache
+
+from app.matching import MatcherGroup, TermMatcher, compile_terms
+
+logger = logging.getLogger(__name__)
+
+
+class DictionaryMatchers:
+    """
+    Compiled term dictionaries, shared by the jobs that reference them.
+
+    Dictionary versions never change, so each version is loaded with `load_terms` and
+    compiled once, and the matchers of the `cache_size` most recently used versions are
+    kept.
+    """
+
+    def __init__(
+        self, load_terms: Callable[[str, int], list[str]], cache_size: int = 32
+    ):
+        self.load_terms = load_terms
+        self.compiled = lru_cache(maxsize=cache_size)(self.compile)
+
+    def compile(self, name: str, version: int) -> TermMatcher:
+        """Load a version of a term dictionary and compile its terms."""
+        terms = self.load_terms(name, version)
+        logger.info(f"Compiling dictionary '{name}' version {version}.")
+        return TermMatcher(terms)
+
+    def matcher(self, options: dict) -> TermMatcher | MatcherGroup:
+        """
+        The compiled PII terms of a job, from its dictionary and its own terms, given
+        the options published with the job.
+
+        The terms of the job are compiled on their own, and matched along with the
+        compiled dictionary, which is not compiled again for them.
+        """
+        dictionary = options.get("dictionary")
+        if dictionary is None:
+            return compile_terms(options["pii_terms"])
+
+        matcher = self.compiled(dictionary["name"], dictionary["version"])
+        if not options.get("pii_terms"):
+            return matcher
+        return MatcherGroup((matcher, compile_terms(options["pii_terms"])))
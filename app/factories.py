@@ -1,53 +1,66 @@
-from collections.abc import Generator
-from contextlib import contextmanager
-
-import pika
 import redis
+import redis.asyncio
+import requests
 from minio import Minio
-from pika.adapters.blocking_connection import BlockingChannel
 
-from app.config import MinioConfig, RabbitMQConfig, RedisConfig
+from app.cache import ResultCache
+from app.config import MinioConfig, RedisConfig, ResultCacheConfig
 
-rabbitmq_config = RabbitMQConfig()
 redis_config = RedisConfig()
+result_cache_config = ResultCacheConfig()
 minio_config = MinioConfig()  # type:ignore
 
+# Connections shared by all the Redis clients of the process
+redis_pool = redis.ConnectionPool(host=redis_config.HOST, port=redis_config.PORT)
+async_redis_pool = redis.asyncio.ConnectionPool(
+    host=redis_config.HOST, port=redis_config.PORT
+)
+
+# MinIO client shared by the process, which keeps a pool of HTTP connections and is
+# safe to use from several threads
+minio_client = Minio(
+    endpoint=minio_config.ENDPOINT,
+    access_key=minio_config.ROOT_USER,
+    secret_key=minio_config.ROOT_PASSWORD,
+    secure=minio_config.SECURE,
+)
+
+# HTTP session shared by the downloads of the process, which keeps its connections
+# alive between requests
+http_session = requests.Session()
+
 
 def redis_connection() -> redis.Redis:
-    """Provide a Redis connection."""
+    """Provide a Redis connection from the shared pool."""
 
-    return redis.Redis(host=redis_config.HOST, port=redis_config.PORT)
+    return redis.Redis(connection_pool=redis_pool)
 
 
-def minio_connection() -> Minio:
-    """Provide a MinIO connection."""
+def async_redis_connection() -> redis.asyncio.Redis:
+    """Provide an asyncio Redis connection from the shared pool."""
 
-    minio_client = Minio(
-        endpoint=minio_config.ENDPOINT,
-        access_key=minio_config.ROOT_USER,
-        secret_key=minio_config.ROOT_PASSWORD,
-        secure=minio_config.SECURE,
-    )
-    return minio_client
+    return redis.asyncio.Redis(connection_pool=async_redis_pool)
 
 
-def rabbitmq_channel() -> Generator[BlockingChannel, None, None]:
-    """Provide a RabbitMQ channel."""
-    credentials = pika.PlainCredentials(
-        username=rabbitmq_config.DEFAULT_USER,
-        password=rabbitmq_config.DEFAULT_PASS,
-    )
+def result_cache() -> ResultCache | None:
+    """Provide the cache of the responses with stored matches, if it is enabled."""
+    if not result_cache_config.ENABLED:
+        return None
 
-    connection_parameters = pika.ConnectionParameters(
-        host=rabbitmq_config.HOST, credentials=credentials
+    return ResultCache(
+        client=async_redis_connection(),
+        ttl=result_cache_config.TTL,
+        max_entries=result_cache_config.MAX_ENTRIES,
     )
 
-    with pika.BlockingConnection(connection_parameters) as connection:
-        with connection.channel() as channel:
-            yield channel
 
+def minio_connection() -> Minio:
+    """Provide the shared MinIO client."""
+
+    return minio_client
+
+
+def http_connection() -> requests.Session:
+    """Provide the shared HTTP session."""
 
-@contextmanager
-def rabbitmq_channel_ctx() -> Generator[BlockingChannel, None, None]:
-    """Provide a RabbitMQ channel using a context manager."""
-    yield from rabbitmq_channel()
+    return http_session
@@ -0,0 +1,37 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+# Slack for the clocks of the API and the database, which sets `created_at`
+CLOCK_SKEW = timedelta(days=1)
+
+
+def uuid7() -> UUID:
+    """
+    A UUID version 7, which starts with the Unix time in milliseconds, so that the time
+    a job was submitted can be told from its correlation ID.
+    """
+    value = time.time_ns() // 1_000_000 << 80 | int.from_bytes(os.urandom(10))
+    # Version 7 and the RFC 4122 variant
+    value = value & ~(0xF << 76) | 7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return UUID(int=value)
+
+
+def earliest_created_at(correlation_ids: list[UUID]) -> datetime | None:
+    """
+    A lower bound of the `created_at` of the rows of several jobs, from the times in
+    their correlation IDs, or `None` if any of them is not a UUID version 7.
+
+    Rows are stored after their job is submitted, so the bound lets Postgres skip the
+    monthly partitions older than the oldest job. It is the start of a month, so that
+    it does not depend on the exact time of the jobs.
+    """
+    if not correlation_ids or any(id_.version != 7 for id_ in correlation_ids):
+        return None
+
+    milliseconds = min(id_.int >> 80 for id_ in correlation_ids)
+    submitted = datetime.fromtimestamp(milliseconds / 1000, tz=timezone.utc)
+    earliest = (submitted - CLOCK_SKEW).replace(tzinfo=None)
+    return earliest.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
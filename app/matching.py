@@ -0,0 +1,445 @@
+from bisect import bisect_right
+from collections import deque
+from collections.abc import Hashable, Iterable, Iterator, Sequence
+from functools import lru_cache
+
+from app.models.boxes import BoundingBoxTable, as_table
+from app.models.validation import MatchMode, TextBoundingBox
+
+# Number of compiled term sets kept around between messages
+MATCHER_CACHE_SIZE = 128
+
+# Largest edit distance supported by fuzzy matching, the deletion index grows
+# combinatorially with it
+MAX_EDIT_DISTANCE = 2
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over sequences of hashable symbols.
+
+    Patterns can be strings, which are matched character by character, or any other
+    sequence such as a list of words. The automaton is built once and then reports every
+    occurrence of every pattern in a single pass over the scanned sequence.
+    """
+
+    def __init__(self, patterns: Iterable[Sequence[Hashable]]):
+        self.goto: list[dict[Hashable, int]] = [{}]
+        self.fail: list[int] = [0]
+        # pattern indices ending exactly at each node
+        self.output: list[list[int]] = [[]]
+        # nearest node on the failure chain that has an output
+        self.output_link: list[int] = [0]
+        self.lengths: list[int] = []
+
+        for pattern in patterns:
+            self._insert(pattern)
+        self._build()
+
+    def _insert(self, pattern: Sequence[Hashable]) -> None:
+        index = len(self.lengths)
+        self.lengths.append(len(pattern))
+        if not pattern:
+            return
+
+        node = 0
+        for symbol in pattern:
+            next_node = self.goto[node].get(symbol)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][symbol] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.output_link.append(0)
+            node = next_node
+        self.output[node].append(index)
+
+    def _build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for symbol, child in self.goto[node].items():
+                queue.append(child)
+
+                state = self.fail[node]
+                while state and symbol not in self.goto[state]:
+                    state = self.fail[state]
+                fallback = self.goto[state].get(symbol, 0)
+                self.fail[child] = fallback
+
+                self.output_link[child] = (
+                    fallback if self.output[fallback] else self.output_link[fallback]
+                )
+
+    def iter_matches(self, sequence: Iterable[Hashable]) -> Iterator[tuple[int, int]]:
+        """
+        Scan a sequence and yield every pattern occurrence.
+
+        Args:
+            sequence: The sequence of symbols to scan.
+
+        Yields:
+            Tuples of `(end, pattern_index)` where `end` is the exclusive end position
+            of the occurrence in the scanned sequence.
+        """
+        goto, fail = self.goto, self.fail
+        output, output_link = self.output, self.output_link
+
+        state = 0
+        for position, symbol in enumerate(sequence, start=1):
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+
+            node = state
+            while node:
+                for index in output[node]:
+                    yield position, index
+                node = output_link[node]
+
+
+def edit_distance(source: str, target: str, max_distance: int) -> int:
+    """
+    Compute the Levenshtein distance between two strings, up to a bound.
+
+    Only a band of `2 * max_distance + 1` cells around the diagonal is computed, so the
+    cost is linear in the length of the strings.
+
+    Returns:
+        The edit distance, or `max_distance + 1` if it exceeds `max_distance`.
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+    if max_distance <= 1:
+        return _edit_distance_one(source, target)
+
+    too_far = max_distance + 1
+    previous = [i if i <= max_distance else too_far for i in range(len(target) + 1)]
+    for i, source_char in enumerate(source, start=1):
+        low = max(1, i - max_distance)
+        high = min(len(target), i + max_distance)
+        current = [too_far] * (len(target) + 1)
+        if i <= max_distance:
+            current[0] = i
+        for j in range(low, high + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (source_char != target[j - 1]),
+                too_far,
+            )
+        if min(current) > max_distance:
+            return too_far
+        previous = current
+    return previous[-1]
+
+
+def _edit_distance_one(source: str, target: str) -> int:
+    # Linear check for the common case of a single substitution, insertion or deletion
+    if source == target:
+        return 0
+
+    if len(source) > len(target):
+        source, target = target, source
+    prefix = 0
+    while prefix < len(source) and source[prefix] == target[prefix]:
+        prefix += 1
+    skip = prefix + (len(source) == len(target))
+    end = prefix + 1
+    return 1 if source[skip:] == target[end:] else 2
+
+
+def deletions(word: str, max_distance: int) -> set[str]:
+    """Generate every string obtained by deleting up to `max_distance` characters."""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        shorter = set()
+        for variant in frontier:
+            for i in range(len(variant)):
+                end = i + 1
+                shorter.add(variant[:i] + variant[end:])
+        results |= shorter
+        frontier = shorter
+    return results
+
+
+class DeletionIndex:
+    """
+    SymSpell-style index for looking up words within a bounded edit distance.
+
+    Every vocabulary word is indexed under all of its deletion variants. A query word
+    generates its own deletion variants, and any vocabulary word that shares a variant
+    with it is a candidate that is then verified with a bounded edit distance. The cost
+    of a lookup therefore depends on the length of the query word and not on the size of
+    the vocabulary.
+
+    The distance a vocabulary word tolerates is scaled down for short words, otherwise
+    a two letter edit would turn a three letter word into almost any other.
+    """
+
+    def __init__(self, words: Iterable[str], max_distance: int):
+        self.max_distance = max_distance
+        self.tolerances = {word: self.tolerance(word) for word in words}
+        self.variants: dict[str, list[str]] = {}
+        for word, tolerance in self.tolerances.items():
+            for variant in deletions(word, tolerance):
+                self.variants.setdefault(variant, []).append(word)
+
+    def tolerance(self, word: str) -> int:
+        return min(self.max_distance, len(word) // 3)
+
+    def lookup(self, word: str) -> str | None:
+        """
+        Find the closest vocabulary word within its tolerated edit distance.
+
+        Returns:
+            The closest vocabulary word, or `None` if there is none close enough.
+        """
+        if word in self.tolerances:
+            return word
+
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for variant in deletions(word, self.max_distance):
+            for candidate in self.variants.get(variant, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+
+                tolerance = self.tolerances[candidate]
+                distance = edit_distance(word, candidate, tolerance)
+                if distance > tolerance:
+                    continue
+                if distance < best_distance or (
+                    distance == best_distance and candidate < best
+                ):
+                    best, best_distance = candidate, distance
+        return best
+
+
+def iter_lines(table: BoundingBoxTable) -> Iterator[list[int]]:
+    """
+    Group the bounding boxes into the text lines that Tesseract recognised.
+
+    Yields:
+        The indices of the non-empty boxes of each line, in reading order.
+    """
+    line: list[int] = []
+    line_key = None
+    keys = zip(table.block_num, table.par_num, table.line_num)
+    for index, (key, text) in enumerate(zip(keys, table.text)):
+        if key != line_key:
+            if line:
+                yield line
+            line, line_key = [], key
+        if text:
+            line.append(index)
+    if line:
+        yield line
+
+
+def merge_boxes(table: BoundingBoxTable, indices: list[int]) -> tuple:
+    """
+    Merge consecutive word boxes into a single box that covers all of them.
+
+    Returns:
+        The row of the merged box, in the order of the columns of a table.
+    """
+    first = indices[0]
+    return (
+        " ".join(table.text[i] for i in indices),
+        min(table.left[i] for i in indices),
+        max(table.right[i] for i in indices),
+        min(table.top[i] for i in indices),
+        max(table.bottom[i] for i in indices),
+        table.block_num[first],
+        table.par_num[first],
+        table.line_num[first],
+        table.word_num[first],
+    )
+
+
+def spans_to_table(table: BoundingBoxTable, spans: set[tuple]) -> BoundingBoxTable:
+    """The boxes of matched spans, in order, with every span merged into one box."""
+    texts = table.text
+    return BoundingBoxTable.from_rows(
+        merge_boxes(table, [i for i in range(first, last + 1) if texts[i]])
+        for first, last in sorted(spans)
+    )
+
+
+class TermMatcher:
+    """
+    A set of PII terms compiled for matching against OCR bounding boxes.
+
+    Single word terms are resolved with a hash set lookup per box. Terms made of several
+    words are matched across consecutive word boxes of the same line with an
+    Aho-Corasick automaton over words, and substring matches use an automaton over
+    characters. Fuzzy matching first corrects every OCR word to the closest word of the
+    terms using a `DeletionIndex`, and then matches exactly. The automata and indexes
+    are built on first use.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        normalised = (" ".join(term.split()) for term in terms)
+        self.terms = tuple(dict.fromkeys(term for term in normalised if term))
+        self.words = frozenset(term for term in self.terms if " " not in term)
+        self.phrases = tuple(tuple(term.split()) for term in self.terms if " " in term)
+        self._automaton: AhoCorasick | None = None
+        self._phrase_automaton: AhoCorasick | None = None
+        self._deletion_indexes: dict[int, DeletionIndex] = {}
+
+    @property
+    def automaton(self) -> AhoCorasick:
+        if self._automaton is None:
+            self._automaton = AhoCorasick(self.terms)
+        return self._automaton
+
+    @property
+    def phrase_automaton(self) -> AhoCorasick:
+        if self._phrase_automaton is None:
+            self._phrase_automaton = AhoCorasick(self.phrases)
+        return self._phrase_automaton
+
+    def deletion_index(self, max_distance: int) -> DeletionIndex:
+        if max_distance not in self._deletion_indexes:
+            vocabulary = [word for term in self.terms for word in term.split()]
+            self._deletion_indexes[max_distance] = DeletionIndex(
+                vocabulary, max_distance
+            )
+        return self._deletion_indexes[max_distance]
+
+    def filter(
+        self,
+        bounding_boxes: BoundingBoxTable | list[TextBoundingBox],
+        match_mode: MatchMode = MatchMode.EXACT,
+        max_distance: int = 1,
+    ) -> BoundingBoxTable:
+        """
+        Filter to the bounding boxes that match any of the compiled terms.
+
+        Args:
+            bounding_boxes: A table or a list of text bounding boxes to filter.
+            match_mode: How the text of a box is compared against the terms.
+            max_distance: The maximum edit distance between an OCR word and a word of a
+                term in fuzzy mode.
+
+        Returns:
+            The matching bounding boxes, in their original order. A term that spans
+            several consecutive boxes is returned as a single merged box.
+        """
+        table = as_table(bounding_boxes)
+        return spans_to_table(table, self.spans(table, match_mode, max_distance))
+
+    def spans(
+        self, table: BoundingBoxTable, match_mode: MatchMode, max_distance: int
+    ) -> set[tuple]:
+        """The first and last indices of the boxes of every match."""
+        if not self.terms:
+            return set()
+
+        texts = table.text
+        if match_mode == MatchMode.SUBSTRING:
+            return self._substring_spans(table)
+        if match_mode == MatchMode.FUZZY and max_distance > 0:
+            return self._exact_spans(table, self._correct(texts, max_distance))
+        return self._exact_spans(table, texts)
+
+    def _correct(self, texts: list[str], max_distance: int) -> list[str]:
+        # OCR output repeats words a lot, so look each distinct word up only once
+        index = self.deletion_index(min(max_distance, MAX_EDIT_DISTANCE))
+        corrections: dict[str, str] = {}
+        for text in texts:
+            if text not in corrections:
+                corrections[text] = index.lookup(text) or text
+        return [corrections[text] for text in texts]
+
+    def _exact_spans(self, table: BoundingBoxTable, texts: list[str]) -> set[tuple]:
+        # Single words are looked up over the whole text column at once, and only
+        # phrases need the words grouped into lines
+        words = self.words
+        spans = {(index, index) for index, text in enumerate(texts) if text in words}
+
+        if self.phrases:
+            automaton = self.phrase_automaton
+            for line in iter_lines(table):
+                tokens = (texts[index] for index in line)
+                for end, index in automaton.iter_matches(tokens):
+                    start = end - automaton.lengths[index]
+                    spans.add((line[start], line[end - 1]))
+        return spans
+
+    def _substring_spans(self, table: BoundingBoxTable) -> set[tuple]:
+        # Scan all the text in a single pass by joining the words of a line with spaces
+        # and the lines with a separator that never appears in the OCR text
+        texts = table.text
+        lines = list(iter_lines(table))
+        starts: list[int] = []
+        owners: list[int] = []
+        offset = 0
+        for line in lines:
+            for index in line:
+                starts.append(offset)
+                owners.append(index)
+                offset += len(texts[index]) + 1
+        text = "\n".join(" ".join(texts[index] for index in line) for line in lines)
+
+        spans = set()
+        for end, index in self.automaton.iter_matches(text):
+            start = end - self.automaton.lengths[index]
+            first = owners[bisect_right(starts, start) - 1]
+            last = owners[bisect_right(starts, end - 1) - 1]
+            spans.add((first, last))
+        return spans
+
+
+class MatcherGroup:
+    """
+    Several compiled `TermMatcher`s used as one, e.g. a large dictionary and the few
+    terms sent with a job, so that neither is compiled again for the other.
+
+    The matches of every matcher are merged, as if their terms had been compiled
+    together.
+    """
+
+    def __init__(self, matchers: Iterable[TermMatcher]):
+        self.matchers = tuple(matchers)
+
+    @property
+    def terms(self) -> tuple[str, ...]:
+        return tuple(
+            dict.fromkeys(term for matcher in self.matchers for term in matcher.terms)
+        )
+
+    def filter(
+        self,
+        bounding_boxes: BoundingBoxTable | list[TextBoundingBox],
+        match_mode: MatchMode = MatchMode.EXACT,
+        max_distance: int = 1,
+    ) -> BoundingBoxTable:
+        """Filter to the bounding boxes that match the terms of any of the matchers."""
+        table = as_table(bounding_boxes)
+        spans = set().union(
+            *(
+                matcher.spans(table, match_mode, max_distance)
+                for matcher in self.matchers
+            )
+        )
+        return spans_to_table(table, spans)
+
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _compile_terms(terms: tuple[str, ...]) -> TermMatcher:
+    return TermMatcher(terms)
+
+
+def compile_terms(terms: Iterable[str]) -> TermMatcher:
+    """
+    Compile a list of PII terms into a `TermMatcher`.
+
+    Compiled matchers are cached, so repeated calls with the same terms reuse the same
+    matcher instead of rebuilding it.
+    """
+    return _compile_terms(tuple(terms))
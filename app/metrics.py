@@ -0,0 +1,16 @@
+import redis
+
+# Redis hash holding the counters shared by all the services
+METRICS_KEY = "metrics"
+
+
+def increment(client: redis.Redis, name: str, amount: int = 1) -> None:
+    """Increment a counter."""
+    client.hincrby(METRICS_KEY, name, amount)
+
+
+def read_metrics(client: redis.Redis) -> dict[str, int]:
+    """Read all the counters."""
+    return {
+        name.decode(): int(value) for name, value in client.hgetall(METRICS_KEY).items()
+    }
@@ -0,0 +1,119 @@
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from typing import NamedTuple
+
+from app.models.validation import TextBoundingBox
+
+# Integer columns of a table, after the text
+INT_COLUMNS = (
+    "left",
+    "right",
+    "top",
+    "bottom",
+    "block_num",
+    "par_num",
+    "line_num",
+    "word_num",
+)
+COLUMNS = ("text", *INT_COLUMNS)
+
+
+class Box(NamedTuple):
+    """A single row of a `BoundingBoxTable`."""
+
+    text: str
+    left: int
+    right: int
+    top: int
+    bottom: int
+    block_num: int = 0
+    par_num: int = 0
+    line_num: int = 0
+    word_num: int = 0
+
+
+class BoundingBoxTable:
+    """
+    Word bounding boxes stored by column.
+
+    The texts are kept in a list and every coordinate and layout number in an array of
+    32-bit integers, so a page of OCR results is a handful of objects instead of a
+    `TextBoundingBox` per word. OCR, matching and storing the matches all work on
+    tables, and models are only built for the API responses.
+
+    Missing integer columns are filled with zeros.
+    """
+
+    __slots__ = COLUMNS
+
+    def __init__(self, text: Iterable[str] = (), **columns: Iterable[int]):
+        unknown = columns.keys() - set(INT_COLUMNS)
+        if unknown:
+            raise TypeError(f"Unknown columns: {', '.join(sorted(unknown))}.")
+
+        self.text = list(text)
+        for name in INT_COLUMNS:
+            values = columns.get(name)
+            if values is None:
+                column = array("i", bytes(4 * len(self.text)))
+            else:
+                column = array("i", values)
+            if len(column) != len(self.text):
+                raise ValueError(
+                    f"Column '{name}' has {len(column)} values instead of "
+                    f"{len(self.text)}."
+                )
+            setattr(self, name, column)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> "BoundingBoxTable":
+        """Build a table from rows of values, in the order of `COLUMNS`."""
+        columns = list(zip(*rows))
+        if not columns:
+            return cls()
+        return cls(**dict(zip(COLUMNS, columns)))
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[dict]) -> "BoundingBoxTable":
+        """Build a table from the dictionary representations of bounding boxes."""
+        return cls.from_rows(
+            (row["text"], *(row.get(name, 0) for name in INT_COLUMNS)) for row in rows
+        )
+
+    @classmethod
+    def from_boxes(cls, boxes: Iterable[TextBoundingBox | Box]) -> "BoundingBoxTable":
+        """Build a table from bounding box models."""
+        return cls.from_rows(
+            tuple(getattr(box, name) for name in COLUMNS) for box in boxes
+        )
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __iter__(self) -> Iterator[Box]:
+        return map(Box._make, zip(*self.columns().values()))
+
+    def __getitem__(self, index: int) -> Box:
+        return Box(*(column[index] for column in self.columns().values()))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} boxes)"
+
+    def columns(self) -> dict[str, list[str] | array]:
+        """The columns of the table, by name."""
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def to_dicts(self) -> list[dict]:
+        """The dictionary representations of the bounding boxes, e.g. for storage."""
+        return [dict(zip(COLUMNS, row)) for row in zip(*self.columns().values())]
+
+    def to_boxes(self) -> list[TextBoundingBox]:
+        """The bounding boxes as models, for API responses."""
+        return [TextBoundingBox(**row) for row in self.to_dicts()]
+
+
+def as_table(boxes: BoundingBoxTable | Iterable[TextBoundingBox]) -> BoundingBoxTable:
+    """Accept either a table or bounding box models."""
+    if isinstance(boxes, BoundingBoxTable):
+        return boxes
+    return BoundingBoxTable.from_boxes(boxes)
@@ -1,13 +1,86 @@
 from datetime import datetime
 from uuid import UUID
 
-from sqlmodel import JSON, Column, Field, SQLModel, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import JSON, Column, Field, LargeBinary, SQLModel, func
 
 
 class Matches(SQLModel, table=True):
+    """
+    The matches of an image.
+
+    The table is partitioned by month of `created_at`, so that old results are removed
+    by dropping whole partitions (see `app.db.partitions`). Postgres requires the
+    partition key in the primary key, so `correlation_id` alone is not enforced unique
+    and writes skip the IDs that are already stored instead. Reads and writes bound
+    `created_at` by the time in the correlation ID, so that Postgres skips the older
+    partitions.
+    """
+
     __tablename__ = "matches"  # type: ignore
 
     correlation_id: UUID = Field(primary_key=True)
+    terms: list = Field(sa_column=Column(JSONB))
+    created_at: datetime = Field(
+        default=None,
+        primary_key=True,
+        sa_column_kwargs={"server_default": func.now()},
+    )
+
+
+class OCRResult(SQLModel, table=True):
+    """
+    The OCR results of an image, with the tiles of a large image put back together,
+    kept so that the image can be matched against other terms without OCR.
+
+    The results are stored in the binary encoding of `app.codec`. The table is
+    partitioned by month like `Matches`, and its partitions are dropped along with
+    theirs.
+    """
+
+    __tablename__ = "ocr_results"  # type: ignore
+
+    correlation_id: UUID = Field(primary_key=True)
+    results: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    created_at: datetime = Field(
+        default=None,
+        primary_key=True,
+        sa_column_kwargs={"server_default": func.now()},
+    )
+
+
+class OCRToken(SQLModel, table=True):
+    """
+    A token recognised in an image, indexing the images by the words they contain.
+
+    The primary key starts with the token, so the images containing a token are read
+    from the index in order of correlation ID, and pages of them are read from where
+    the previous page ended. The table is partitioned by month like `Matches`, and
+    the tokens of an image are stored in the same transaction as its matches, so they
+    share their `created_at` and are dropped with them.
+    """
+
+    __tablename__ = "ocr_tokens"  # type: ignore
+
+    token: str = Field(primary_key=True)
+    correlation_id: UUID = Field(primary_key=True)
+    created_at: datetime = Field(
+        default=None,
+        primary_key=True,
+        sa_column_kwargs={"server_default": func.now()},
+    )
+
+
+class TermDictionary(SQLModel, table=True):
+    """
+    A named list of PII terms. Every registration of a name creates a new version, and
+    versions never change, so that they can be compiled once and cached.
+    """
+
+    __tablename__ = "term_dictionaries"  # type: ignore
+
+    name: str = Field(primary_key=True)
+    version: int = Field(primary_key=True)
     terms: list = Field(sa_column=Column(JSON))
     created_at: datetime = Field(
         default=None, sa_column_kwargs={"server_default": func.now()}
@@ -1,4 +1,5 @@
 from enum import Enum
+from uuid import UUID
 
 from pydantic import BaseModel
 from sqlmodel import SQLModel
@@ -8,6 +9,7 @@ class TextBoundingBox(BaseModel):
     """
     Pillow-type Bounding Box.
     Coordinates start in (0,0) in the Top Left Corner.
+    The block, paragraph, line and word numbers locate the box in Tesseract's layout.
     """
 
     text: str
@@ -15,6 +17,26 @@ class TextBoundingBox(BaseModel):
     right: int
     top: int
     bottom: int
+    block_num: int = 0
+    par_num: int = 0
+    line_num: int = 0
+    word_num: int = 0
+
+
+class Tile(BaseModel):
+    """
+    A region of a large image that is processed with OCR on its own.
+    The core is the part of the tile that no other tile's core covers.
+    """
+
+    left: int
+    top: int
+    right: int
+    bottom: int
+    core_left: int
+    core_top: int
+    core_right: int
+    core_bottom: int
 
 
 class MatchResponse(SQLModel):
@@ -25,6 +47,41 @@ class SubmitResponse(SQLModel):
     correlation_id: str
 
 
+class BatchSubmitResponse(SQLModel):
+    correlation_ids: list[str]
+
+
+class DictionaryRequest(SQLModel):
+    terms: list[str]
+
+
+class DictionaryResponse(SQLModel):
+    name: str
+    version: int
+    terms: list[str]
+
+
+class ResultsRequest(SQLModel):
+    correlation_ids: list[UUID]
+
+
+class ResultsResponse(SQLModel):
+    # The matches of each job, or `None` for the jobs that are not finished
+    results: dict[str, MatchResponse | None]
+
+
+class SearchResponse(SQLModel):
+    correlation_ids: list[str]
+    # Passed as `after` to read the next page, or `None` on the last page
+    next: str | None
+
+
+class MatchMode(str, Enum):
+    EXACT = "exact"
+    SUBSTRING = "substring"
+    FUZZY = "fuzzy"
+
+
 class Exchange(Enum):
     FORWARD = "forward_exchange"
     OCR = "ocr_exchange"
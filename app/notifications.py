@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+
+import redis.asyncio
+from redis.exceptions import ConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel on which the filter announces the correlation IDs of the
+# matches it stored
+STORED_CHANNEL = "matches:stored"
+
+
+async def notify_stored(
+    client: redis.asyncio.Redis, correlation_ids: Iterable[str]
+) -> None:
+    """Announce that the matches of some jobs are stored, in a single round trip."""
+    async with client.pipeline(transaction=False) as pipeline:
+        for correlation_id in correlation_ids:
+            pipeline.publish(STORED_CHANNEL, correlation_id)
+        await pipeline.execute()
+
+
+class ResultNotifier:
+    """
+    Wake up the requests waiting for the matches of a job once they are stored.
+
+    A single subscription to the channel of the filter is shared by all the requests of
+    the process, instead of a Redis connection per waiting request. Announcements are
+    not stored, so a request has to start waiting before it looks the matches up in the
+    database, in order not to miss an announcement made in between.
+    """
+
+    def __init__(self, client: redis.asyncio.Redis, reconnect_delay: float = 1.0):
+        self.client = client
+        self.reconnect_delay = reconnect_delay
+        self.waiters: defaultdict[str, set[asyncio.Future]] = defaultdict(set)
+        self.listener: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self.listener = asyncio.create_task(self.listen())
+
+    async def close(self) -> None:
+        if self.listener is not None:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
+        await self.client.aclose()
+
+    async def listen(self) -> None:
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(STORED_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.wake(message["data"].decode())
+            except (ConnectionError, OSError):
+                logger.warning(
+                    f"Lost the subscription to '{STORED_CHANNEL}', retrying in "
+                    f"{self.reconnect_delay}s.",
+                    exc_info=True,
+                )
+                # Wake everyone up, since announcements may have been missed
+                for correlation_id in list(self.waiters):
+                    self.wake(correlation_id)
+                await asyncio.sleep(self.reconnect_delay)
+
+    def wake(self, correlation_id: str) -> None:
+        for waiter in self.waiters.pop(correlation_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def subscribe(self, correlation_id: str) -> asyncio.Future:
+        """Start waiting for the matches of a job."""
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[correlation_id].add(waiter)
+        return waiter
+
+    def unsubscribe(self, correlation_id: str, waiter: asyncio.Future) -> None:
+        waiters = self.waiters.get(correlation_id)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                del self.waiters[correlation_id]
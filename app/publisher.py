@@ -0,0 +1,62 @@
+import aio_pika
+from aio_pika.abc import AbstractRobustChannel, AbstractRobustConnection
+
+from app.config import RabbitMQConfig
+
+
+class AsyncPublisher:
+    """
+    Long-lived RabbitMQ publisher of the API and of the workers.
+
+    A single robust connection and channel are opened when the process starts and
+    shared by all the requests to the API, or all the messages processed by a worker.
+    The connection reconnects automatically, and the channel uses publisher confirms,
+    so `publish` only returns once the broker has taken responsibility for the message.
+    """
+
+    def __init__(self, config: RabbitMQConfig):
+        self.config = config
+        self.connection: AbstractRobustConnection | None = None
+        self.channel: AbstractRobustChannel | None = None
+        self.exchanges: dict[str, aio_pika.abc.AbstractExchange] = {}
+
+    async def connect(self) -> None:
+        self.connection = await aio_pika.connect_robust(
+            host=self.config.HOST,
+            login=self.config.DEFAULT_USER,
+            password=self.config.DEFAULT_PASS,
+        )
+        self.channel = await self.connection.channel(publisher_confirms=True)
+
+    async def declare_exchange(self, exchange: str, exchange_type: str) -> None:
+        """Declare an exchange and keep it for publishing."""
+        self.exchanges[exchange] = await self.channel.declare_exchange(
+            exchange, type=exchange_type, durable=True
+        )
+
+    async def publish(
+        self,
+        correlation_id: str | None,
+        body: str | bytes,
+        routing_key: str,
+        exchange: str,
+        headers: dict | None = None,
+    ) -> None:
+        """
+        Publish a persistent message to a declared exchange, and wait for the broker
+        to confirm it.
+        """
+        if isinstance(body, str):
+            body = body.encode()
+
+        message = aio_pika.Message(
+            body=body,
+            correlation_id=correlation_id,
+            headers=headers,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        )
+        await self.exchanges[exchange].publish(message, routing_key=routing_key)
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            await self.connection.close()
@@ -0,0 +1,22 @@
+import string
+from collections.abc import Iterable
+
+# Longer tokens are not indexed, they are rarely words and bloat the index
+MAX_TOKEN_LENGTH = 64
+
+
+def tokenize(texts: Iterable[str]) -> list[str]:
+    """
+    The distinct tokens of recognised texts, as they are indexed and searched for.
+
+    Texts are split on whitespace, and the punctuation around each word is stripped and
+    its case folded, so that "Smith," is found when searching for "smith".
+    """
+    tokens = (
+        word.strip(string.punctuation).casefold()
+        for text in texts
+        for word in text.split()
+    )
+    return sorted(
+        {token for token in tokens if token and len(token) <= MAX_TOKEN_LENGTH}
+    )
@@ -0,0 +1,316 @@
+import time
+
+import redis.asyncio
+
+from app.codec import is_compressed, zstandard
+from app.metrics import METRICS_KEY
+
+# Jobs waiting for their other half, by the time they are due, and the jobs that were
+# not complete in time, by the time they were removed
+DEADLINES_KEY = "staging:deadlines"
+TIMED_OUT_KEY = "staging:timed_out"
+
+# Every zstd frame starts with this magic number, which neither JSON nor the binary
+# OCR results start with, so compressed values need no extra metadata
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# Smaller payloads, such as most PII terms, are not worth compressing
+COMPRESS_MIN_BYTES = 256
+
+# Store one half of a job and, if the job is complete, claim and return both halves.
+# Running as a script makes this atomic, so that only one consumer gets a job. A half
+# that is already stored is kept, but still completes the job.
+#
+# A claimed job is moved aside rather than deleted, as the messages of its other
+# halves are already acknowledged. It is deleted once its matches are stored, and
+# until then a redelivered half picks it up again, e.g. after the consumer that
+# claimed it crashed. Once it is deleted, a marker ignores late duplicates of its
+# halves for a while, which would otherwise stage the job again until it timed out.
+#
+# A job is due `ttl` seconds after its first half arrives, or after it is claimed, and
+# its keys expire on their own some time later, in case no sweeper removes them. The
+# staged jobs and bytes are kept in the shared metrics.
+#
+# KEYS[1]: hash of the OCR results, keyed by tile index
+# KEYS[2]: the PII terms
+# KEYS[3]: the deadlines of the staged jobs
+# KEYS[4]: the metrics
+# KEYS[5]: hash of the OCR results of the claimed job
+# KEYS[6]: the PII terms of the claimed job
+# KEYS[7]: the marker of the completed job
+# ARGV[1]: the half being stored, "ocr" or "pii_terms"
+# ARGV[2]: the payload being stored
+# ARGV[3]: the index of the tile, for OCR results
+# ARGV[4]: the number of tiles of the image
+# ARGV[5]: the correlation ID of the job
+# ARGV[6]: the deadline of the job
+# ARGV[7]: the seconds before the keys expire
+JOIN_SCRIPT = """
+if redis.call("EXISTS", KEYS[7]) == 1 then
+    return false
+end
+
+local tiles = tonumber(ARGV[4])
+local pii_terms = redis.call("GET", KEYS[6])
+if pii_terms then
+    local job = {pii_terms}
+    for tile = 0, tiles - 1 do
+        job[#job + 1] = redis.call("HGET", KEYS[5], tostring(tile))
+    end
+    return job
+end
+
+local stored
+if ARGV[1] == "pii_terms" then
+    stored = redis.call("SETNX", KEYS[2], ARGV[2])
+    redis.call("EXPIRE", KEYS[2], ARGV[7])
+else
+    stored = redis.call("HSETNX", KEYS[1], ARGV[3], ARGV[2])
+    redis.call("EXPIRE", KEYS[1], ARGV[7])
+end
+if stored == 1 then
+    redis.call("HINCRBY", KEYS[4], "staging_bytes", #ARGV[2])
+    if redis.call("ZADD", KEYS[3], "NX", ARGV[6], ARGV[5]) == 1 then
+        redis.call("HINCRBY", KEYS[4], "staging_jobs", 1)
+    end
+end
+
+if redis.call("HLEN", KEYS[1]) < tiles then
+    return false
+end
+pii_terms = redis.call("GET", KEYS[2])
+if not pii_terms then
+    return false
+end
+
+local job = {pii_terms}
+for tile = 0, tiles - 1 do
+    job[#job + 1] = redis.call("HGET", KEYS[1], tostring(tile))
+end
+redis.call("RENAME", KEYS[1], KEYS[5])
+redis.call("RENAME", KEYS[2], KEYS[6])
+redis.call("EXPIRE", KEYS[5], ARGV[7])
+redis.call("EXPIRE", KEYS[6], ARGV[7])
+redis.call("ZADD", KEYS[3], "XX", ARGV[6], ARGV[5])
+return job
+"""
+
+# Put a claimed job back, after failing to store its matches, so that it is claimed
+# again like any other complete job.
+#
+# KEYS: as for the join
+RESTORE_SCRIPT = """
+if redis.call("EXISTS", KEYS[5]) == 1 then
+    redis.call("RENAME", KEYS[5], KEYS[1])
+end
+if redis.call("EXISTS", KEYS[6]) == 1 then
+    redis.call("RENAME", KEYS[6], KEYS[2])
+end
+"""
+
+# Delete claimed jobs once their matches are stored, and mark them as completed.
+#
+# The keys of the jobs are derived from their correlation IDs, as in `Staging.keys`,
+# which ties the script to a single Redis server.
+#
+# KEYS[1]: the deadlines of the staged jobs
+# KEYS[2]: the metrics
+# ARGV[1]: the seconds before the markers expire
+# ARGV[2:]: the correlation IDs of the jobs
+COMPLETE_SCRIPT = """
+local size = 0
+local jobs = 0
+for i = 2, #ARGV do
+    local id = ARGV[i]
+    local ocr_key = id .. ":claimed:ocr"
+    local pii_terms_key = id .. ":claimed:pii_terms"
+    size = size + redis.call("STRLEN", pii_terms_key)
+    for _, ocr_results in ipairs(redis.call("HVALS", ocr_key)) do
+        size = size + #ocr_results
+    end
+    redis.call("DEL", ocr_key, pii_terms_key)
+    redis.call("SET", id .. ":completed", 1, "EX", ARGV[1])
+    jobs = jobs + redis.call("ZREM", KEYS[1], id)
+end
+redis.call("HINCRBY", KEYS[2], "staging_bytes", -size)
+redis.call("HINCRBY", KEYS[2], "staging_jobs", -jobs)
+"""
+
+# Remove the jobs that are due, whether they are staged or claimed, and record them
+# as timed out. Running as a script makes this atomic, so that several sweepers do not
+# count a job twice.
+#
+# The keys of the jobs are derived from their correlation IDs, as in `Staging.keys`,
+# which ties the script to a single Redis server.
+#
+# KEYS[1]: the deadlines of the staged jobs
+# KEYS[2]: the metrics
+# KEYS[3]: the timed out jobs
+# ARGV[1]: the current time
+# ARGV[2]: the most jobs removed at once
+# ARGV[3]: the most timed out jobs kept
+#
+# Returns the correlation ID of every job removed, whether its PII terms were
+# staged, and the number of tiles with OCR results.
+SWEEP_SCRIPT = """
+local ids = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+local jobs = {}
+local size = 0
+for _, id in ipairs(ids) do
+    local keys = {id .. ":ocr", id .. ":pii_terms"}
+    if redis.call("EXISTS", id .. ":claimed:pii_terms") == 1 then
+        keys = {id .. ":claimed:ocr", id .. ":claimed:pii_terms"}
+    end
+    local pii_terms = redis.call("STRLEN", keys[2])
+    local tiles = redis.call("HVALS", keys[1])
+
+    size = size + pii_terms
+    for _, ocr_results in ipairs(tiles) do
+        size = size + #ocr_results
+    end
+    redis.call("DEL", keys[1], keys[2])
+    redis.call("ZREM", KEYS[1], id)
+    redis.call("ZADD", KEYS[3], ARGV[1], id)
+    jobs[#jobs + 1] = {id, pii_terms > 0 and 1 or 0, #tiles}
+end
+
+if #ids > 0 then
+    redis.call("HINCRBY", KEYS[2], "staging_bytes", -size)
+    redis.call("HINCRBY", KEYS[2], "staging_jobs", -#ids)
+    redis.call("HINCRBY", KEYS[2], "staging_timed_out", #ids)
+    redis.call("ZREMRANGEBYRANK", KEYS[3], 0, -tonumber(ARGV[3]) - 1)
+end
+return jobs
+"""
+
+
+class Staging:
+    """
+    Stage the OCR results and the PII terms of a job in Redis until both are available.
+
+    Each half is stored and checked against the other in a single round trip.
+    Duplicate deliveries of a half do not overwrite it. A complete job is claimed by
+    the consumer of its last half, and kept until it is `complete` or `restore`d, so
+    that it is not lost if that consumer stops before storing it. Halves that arrive
+    within `ttl` seconds after their job is completed are ignored.
+
+    A job that is not complete `ttl` seconds after its first half arrived, e.g. because
+    the OCR worker crashed before publishing, is removed by `sweep` and recorded as
+    timed out. Its keys also expire on their own after twice as long, so that staging
+    stays bounded without a sweeper. Payloads are compressed with zstd when `compress`
+    is set and it is available, unless they already are.
+    """
+
+    def __init__(
+        self, client: redis.asyncio.Redis, ttl: int = 60 * 60, compress: bool = False
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.compress = compress and zstandard is not None
+        self._join = client.register_script(JOIN_SCRIPT)
+        self._restore = client.register_script(RESTORE_SCRIPT)
+        self._complete = client.register_script(COMPLETE_SCRIPT)
+        self._sweep = client.register_script(SWEEP_SCRIPT)
+
+    @staticmethod
+    def keys(correlation_id: str) -> list[str]:
+        return [
+            f"{correlation_id}:ocr",
+            f"{correlation_id}:pii_terms",
+            DEADLINES_KEY,
+            METRICS_KEY,
+            f"{correlation_id}:claimed:ocr",
+            f"{correlation_id}:claimed:pii_terms",
+            f"{correlation_id}:completed",
+        ]
+
+    def pack(self, payload: bytes) -> bytes:
+        if (
+            not self.compress
+            or len(payload) < COMPRESS_MIN_BYTES
+            or is_compressed(payload)
+        ):
+            return payload
+        return zstandard.ZstdCompressor().compress(payload)
+
+    @staticmethod
+    def unpack(value: bytes) -> bytes:
+        if not value.startswith(ZSTD_MAGIC):
+            return value
+        if zstandard is None:
+            raise ValueError("Staged payload is compressed, but zstd is not available.")
+        return zstandard.ZstdDecompressor().decompress(value)
+
+    def expiry(self, correlation_id: str) -> list:
+        return [correlation_id, time.time() + self.ttl, 2 * self.ttl]
+
+    async def _stage(
+        self, correlation_id: str, half: str, payload: bytes, tile: int, tiles: int
+    ) -> tuple[bytes, list[bytes]] | None:
+        job = await self._join(
+            keys=self.keys(correlation_id),
+            args=[half, self.pack(payload), tile, tiles, *self.expiry(correlation_id)],
+        )
+        if not job:
+            return None
+
+        pii_terms, *ocr_results = map(self.unpack, job)
+        return pii_terms, ocr_results
+
+    async def stage_ocr_results(
+        self, correlation_id: str, payload: bytes, tile: int = 0, tiles: int = 1
+    ) -> tuple[bytes, list[bytes]] | None:
+        """
+        Stage the OCR results of an image, or of one of its tiles.
+
+        Returns:
+            The PII terms and the OCR results of every tile if the job is complete,
+            otherwise `None`.
+        """
+        return await self._stage(correlation_id, "ocr", payload, tile, tiles)
+
+    async def stage_pii_terms(
+        self, correlation_id: str, payload: bytes, tiles: int = 1
+    ) -> tuple[bytes, list[bytes]] | None:
+        """
+        Stage the PII terms of a job.
+
+        Returns:
+            The PII terms and the OCR results of every tile if the job is complete,
+            otherwise `None`.
+        """
+        return await self._stage(correlation_id, "pii_terms", payload, 0, tiles)
+
+    async def restore(self, correlation_id: str) -> None:
+        """Stage a claimed job again, after failing to process it."""
+        await self._restore(keys=self.keys(correlation_id))
+
+    async def complete(self, correlation_ids: list[str]) -> None:
+        """Delete claimed jobs, once they are processed."""
+        await self._complete(
+            keys=[DEADLINES_KEY, METRICS_KEY], args=[self.ttl, *correlation_ids]
+        )
+
+    async def sweep(
+        self, limit: int = 1000, keep: int = 10_000
+    ) -> list[tuple[str, bool, int]]:
+        """
+        Remove up to `limit` jobs that are past their deadline, and record them as
+        timed out, keeping the last `keep` of them.
+
+        Returns:
+            The correlation ID of every job removed, whether its PII terms were staged
+            and the number of tiles with OCR results.
+        """
+        jobs = await self._sweep(
+            keys=[DEADLINES_KEY, METRICS_KEY, TIMED_OUT_KEY],
+            args=[time.time(), limit, keep],
+        )
+        return [
+            (correlation_id.decode(), bool(pii_terms), tiles)
+            for correlation_id, pii_terms, tiles in jobs
+        ]
+
+
+async def timed_out(client: redis.asyncio.Redis, correlation_id: str) -> bool:
+    """Whether a job was removed from staging before it was complete."""
+    return await client.zscore(TIMED_OUT_KEY, correlation_id) is not None
@@ -0,0 +1,152 @@
+import logging
+
+import pytesseract
+from PIL import Image
+
+from app.config import OCRConfig
+
+try:
+    import tesserocr
+except ImportError:  # the bindings need libtesseract to build
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# Columns of the data returned by the engines, as in `pytesseract.image_to_data`
+DATA_COLUMNS = (
+    "level",
+    "block_num",
+    "par_num",
+    "line_num",
+    "word_num",
+    "left",
+    "top",
+    "width",
+    "height",
+    "conf",
+    "text",
+)
+
+WORD_LEVEL = 5
+
+
+class PytesseractEngine:
+    """
+    Run Tesseract through pytesseract.
+
+    Every call writes the image to a temporary file and spawns a `tesseract` process,
+    which loads the language model again. Used when the in-process bindings are not
+    available.
+    """
+
+    def __init__(self, lang: str = "eng"):
+        self.lang = lang
+
+    def image_to_data(self, image: Image.Image) -> dict[str, list]:
+        return pytesseract.image_to_data(
+            image, lang=self.lang, output_type=pytesseract.Output.DICT
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class TesserocrEngine:
+    """
+    Run Tesseract in-process through the tesserocr bindings.
+
+    The language model is loaded once when the engine is created and reused for every
+    image. Images are handed over as decoded pixel buffers, without touching the disk.
+    """
+
+    def __init__(self, lang: str = "eng", path: str | None = None):
+        kwargs = {"lang": lang}
+        if path:
+            kwargs["path"] = path
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+
+    def image_to_data(self, image: Image.Image) -> dict[str, list]:
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        bytes_per_pixel = len(image.getbands())
+        self.api.SetImageBytes(
+            image.tobytes(),
+            image.width,
+            image.height,
+            bytes_per_pixel,
+            image.width * bytes_per_pixel,
+        )
+        self.api.Recognize()
+
+        data: dict[str, list] = {column: [] for column in DATA_COLUMNS}
+        iterator = self.api.GetIterator()
+        if iterator is None:
+            return data
+
+        level = tesserocr.RIL.WORD
+        block_num = par_num = line_num = word_num = 0
+        for word in tesserocr.iterate_level(iterator, level):
+            # Number the layout the same way as the `tesseract` TSV output
+            if word.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                block_num, par_num = block_num + 1, 0
+            if word.IsAtBeginningOf(tesserocr.RIL.PARA):
+                par_num, line_num = par_num + 1, 0
+            if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                line_num, word_num = line_num + 1, 0
+            word_num += 1
+
+            bounding_box = word.BoundingBox(level)
+            if bounding_box is None:
+                continue
+            left, top, right, bottom = bounding_box
+
+            row = (
+                WORD_LEVEL,
+                block_num,
+                par_num,
+                line_num,
+                word_num,
+                left,
+                top,
+                right - left,
+                bottom - top,
+                word.Confidence(level),
+                word.GetUTF8Text(level) or "",
+            )
+            for column, value in zip(DATA_COLUMNS, row):
+                data[column].append(value)
+
+        return data
+
+    def close(self) -> None:
+        self.api.End()
+
+
+def tesseract_engine(
+    config: OCRConfig | None = None,
+) -> TesserocrEngine | PytesseractEngine:
+    """
+    Provide a Tesseract engine.
+
+    Prefer the in-process tesserocr engine and fall back to pytesseract when the
+    bindings are not installed or fail to load the language model, unless an engine is
+    explicitly selected in the configuration.
+    """
+    config = config or OCRConfig()
+
+    if config.ENGINE == "pytesseract":
+        return PytesseractEngine(lang=config.LANG)
+
+    if tesserocr is None:
+        if config.ENGINE == "tesserocr":
+            raise RuntimeError("The tesserocr engine was selected but is not installed")
+        logger.warning("tesserocr is not installed, falling back to pytesseract")
+        return PytesseractEngine(lang=config.LANG)
+
+    try:
+        return TesserocrEngine(lang=config.LANG, path=config.TESSDATA_PATH)
+    except RuntimeError:
+        if config.ENGINE == "tesserocr":
+            raise
+        logger.exception("Failed to initialise tesserocr, falling back to pytesseract")
+        return PytesseractEngine(lang=config.LANG)
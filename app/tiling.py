@@ -0,0 +1,138 @@
+from collections.abc import Sequence
+
+from PIL import Image
+
+from app.config import TilingConfig
+from app.models.boxes import COLUMNS, BoundingBoxTable, as_table
+from app.models.validation import TextBoundingBox, Tile
+
+
+def _spans(length: int, size: int, overlap: int) -> list[tuple[int, int]]:
+    # Evenly stepped spans, with the last one aligned to the end of the image
+    step = max(size - overlap, 1)
+    starts = list(range(0, max(length - size, 0) + 1, step))
+    if starts[-1] + size < length:
+        starts.append(length - size)
+    return [(start, min(start + size, length)) for start in starts]
+
+
+def _cores(spans: list[tuple[int, int]], length: int) -> list[tuple[int, int]]:
+    # Split every overlap in half between the two spans that share it
+    cuts = [0]
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        cuts.append((start + end) // 2)
+    cuts.append(length)
+    return list(zip(cuts, cuts[1:]))
+
+
+def needs_tiling(image_size: Sequence[int] | None, config: TilingConfig) -> bool:
+    """Whether an image is large enough to be split into tiles for OCR."""
+    if not config.ENABLED or not image_size:
+        return False
+
+    width, height = image_size
+    return width * height > config.MAX_PIXELS
+
+
+def limit_image_pixels(config: TilingConfig) -> None:
+    """
+    Let Pillow open images up to the pixel limit. By default it refuses the images
+    above about 179 million pixels as decompression bombs, which large scans are not.
+    """
+    Image.MAX_IMAGE_PIXELS = config.MAX_IMAGE_PIXELS
+
+
+def exceeds_pixel_limit(image_size: Sequence[int] | None, config: TilingConfig) -> bool:
+    """Whether an image has more pixels than are accepted at all."""
+    if not image_size:
+        return False
+
+    width, height = image_size
+    return width * height > config.MAX_IMAGE_PIXELS
+
+
+def plan_tiles(width: int, height: int, size: int, overlap: int) -> list[Tile]:
+    """
+    Split an image into a grid of overlapping tiles.
+
+    Every tile also has a core region. The cores of all the tiles cover the image
+    without overlapping, and are used to decide which tile a word in an overlap belongs
+    to.
+
+    Args:
+        width: The width of the image.
+        height: The height of the image.
+        size: The maximum width and height of a tile.
+        overlap: How much neighbouring tiles overlap, which should be larger than the
+            words in the image so that every word is whole in at least one tile.
+
+    Returns:
+        The tiles in reading order.
+    """
+    columns = _spans(width, size, overlap)
+    rows = _spans(height, size, overlap)
+
+    return [
+        Tile(
+            left=left,
+            top=top,
+            right=right,
+            bottom=bottom,
+            core_left=core_left,
+            core_top=core_top,
+            core_right=core_right,
+            core_bottom=core_bottom,
+        )
+        for (top, bottom), (core_top, core_bottom) in zip(rows, _cores(rows, height))
+        for (left, right), (core_left, core_right) in zip(
+            columns, _cores(columns, width)
+        )
+    ]
+
+
+def merge_tiles(
+    tiles: list[Tile], results: list[BoundingBoxTable | list[TextBoundingBox]]
+) -> BoundingBoxTable:
+    """
+    Merge the OCR results of the tiles of an image into results for the whole image.
+
+    Coordinates are moved from the frame of each tile into the frame of the image. A
+    word in an overlap is found by both tiles, so it is only kept by the tile whose core
+    contains its centre. Block numbers are offset per tile to keep the lines of
+    different tiles apart.
+
+    Args:
+        tiles: The tiles the image was split into.
+        results: The OCR results of each tile, in the same order as the tiles.
+
+    Returns:
+        The bounding boxes of the whole image.
+    """
+    merged: dict[str, list] = {name: [] for name in COLUMNS}
+    block_offset = 0
+    for tile, boxes in zip(tiles, results):
+        table = as_table(boxes)
+
+        left = [x + tile.left for x in table.left]
+        right = [x + tile.left for x in table.right]
+        top = [y + tile.top for y in table.top]
+        bottom = [y + tile.top for y in table.bottom]
+        block_num = [block + block_offset for block in table.block_num]
+
+        keep = [
+            index
+            for index, (x0, x1, y0, y1) in enumerate(zip(left, right, top, bottom))
+            if tile.core_left <= (x0 + x1) // 2 < tile.core_right
+            and tile.core_top <= (y0 + y1) // 2 < tile.core_bottom
+        ]
+
+        columns = table.columns()
+        columns.update(
+            left=left, right=right, top=top, bottom=bottom, block_num=block_num
+        )
+        for name, column in columns.items():
+            merged[name].extend(column[index] for index in keep)
+
+        block_offset += max(table.block_num, default=0)
+
+    return BoundingBoxTable(**merged)
@@ -1,15 +1,18 @@
+import json
 import os
 import re
 import string
+import struct
 from io import BytesIO
+from typing import BinaryIO
 
-import pika
-import pytesseract
 from minio import Minio
-from pika.adapters.blocking_connection import BlockingChannel
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 
-from app.models.validation import TextBoundingBox
+from app.matching import compile_terms
+from app.models.boxes import BoundingBoxTable
+from app.models.validation import MatchMode, TextBoundingBox
+from app.tesseract import PytesseractEngine, TesserocrEngine
 
 
 def upload_object_to_minio(
@@ -17,83 +20,132 @@ def upload_object_to_minio(
     bucket: str,
     path: str,
     filename: str,
-    obj: BytesIO,
+    obj: BinaryIO,
     content_type: str,
+    part_size: int = 0,
 ) -> str:
-    """Upload an object to MinIO and return the url."""
+    """
+    Upload an object to MinIO and return the url.
+
+    The object is streamed from its current position, in parts of `part_size` bytes
+    (chosen by the client if 0), without reading all of it into memory.
+    """
+    start = obj.tell()
+    length = obj.seek(0, os.SEEK_END) - start
+    obj.seek(start)
+
     client.put_object(
         bucket_name=bucket,
         object_name=os.path.join(path, filename),
         data=obj,
         content_type=content_type,
-        length=len(obj.getvalue()),
+        length=length,
+        part_size=part_size,
     )
 
     base_url = client._base_url._url.geturl()
     return os.path.join(base_url, bucket, path, filename)
 
 
-def publish_to_exchange(
-    channel: BlockingChannel,
-    correlation_id: str | None,
-    body: str | bytes,
-    routing_key: str,
-    exchange: str = "",
-) -> None:
-    """Publish a message to a RabbitMQ queue using an exchange."""
-    properties = pika.BasicProperties(
-        delivery_mode=2,
-        correlation_id=correlation_id,
-    )
+def pack_message(data: dict, payload: bytes) -> bytes:
+    """
+    Pack JSON data and a binary payload, such as an image, into a message body.
 
-    channel.basic_publish(
-        exchange=exchange,
-        routing_key=routing_key,
-        body=body,
-        properties=properties,
-    )
+    The body starts with the length of the JSON data as 4 bytes, followed by the JSON
+    data and the raw payload, so that the payload does not have to be encoded as text.
+    """
+    encoded = json.dumps(data).encode()
+    return struct.pack(">I", len(encoded)) + encoded + payload
+
+
+def unpack_message(body: bytes) -> tuple[dict, bytes]:
+    """Unpack the JSON data and the binary payload of a message body."""
+    (length,) = struct.unpack_from(">I", body)
+    end = 4 + length
+    return json.loads(body[4:end]), body[end:]
+
+
+def read_submission(body: bytes, inline: bool = False) -> tuple[dict, bytes | None]:
+    """
+    Read a submission published by the API: the PII terms, the options for matching
+    them and the image URL, and the image itself if it is inline.
+    """
+    if inline:
+        return unpack_message(body)
+    return json.loads(body), None
+
+
+def read_image_size(image_file: BinaryIO) -> tuple[int, int] | None:
+    """
+    Read the size of an image from its header, without decoding it.
+
+    Raises:
+        DecompressionBombError: If the image has over twice `Image.MAX_IMAGE_PIXELS`.
+    """
+    position = image_file.tell()
+    try:
+        return Image.open(image_file).size
+    except UnidentifiedImageError:
+        return None
+    finally:
+        image_file.seek(position)
 
 
 def filter_to_pii(
-    bounding_boxes: list[TextBoundingBox], pii_terms: list[str]
-) -> list[TextBoundingBox]:
+    bounding_boxes: BoundingBoxTable | list[TextBoundingBox],
+    pii_terms: list[str],
+    match_mode: MatchMode = MatchMode.EXACT,
+    max_distance: int = 1,
+) -> BoundingBoxTable:
     """
     Filter to bounding boxes that contain personally identifiable information (PII).
 
-    Take a list of `TextBoundingBox` objects and filter them based on whether their text
-    matches any term in the provided list of PII terms.
+    Take a table of bounding boxes and filter them based on whether their text matches
+    any term in the provided list of PII terms. The terms are compiled into a
+    `TermMatcher` once and the whole text column is checked against it in a single
+    pass. Terms with several words match consecutive boxes of the same line and are
+    returned as one merged box.
 
     Args:
-        bounding_boxes: A list of text bounding boxes to filter.
+        bounding_boxes: A table or a list of text bounding boxes to filter.
         pii_terms: A list of terms considered to be PII for matching.
+        match_mode: Whether the text of a box has to equal a term, contain one, or be
+            within `max_distance` edits of one.
+        max_distance: The maximum edit distance per word in fuzzy mode.
 
     Returns:
-        A list of bounding boxes whose text matches any of the PII terms.
+        A table of the bounding boxes whose text matches any of the PII terms.
     """
-    # this performs an exact match for now
-    matches = []
-    for box in bounding_boxes:
-        if box.text in pii_terms:
-            matches.append(box)
-    return matches
+    matcher = compile_terms(pii_terms)
+    return matcher.filter(
+        bounding_boxes, match_mode=match_mode, max_distance=max_distance
+    )
 
 
 def find_matches(
-    bounding_boxes: list[TextBoundingBox], pii_terms: list[str]
+    bounding_boxes: BoundingBoxTable | list[TextBoundingBox],
+    pii_terms: list[str],
+    match_mode: MatchMode = MatchMode.EXACT,
+    max_distance: int = 1,
 ) -> list[dict]:
     """
     Find the bounding boxes that match any of the PII terms.
 
     Args:
-        bounding_boxes: A list of text bounding boxes.
+        bounding_boxes: A table or a list of text bounding boxes.
         pii_terms: A list of terms considered to be PII.
+        match_mode: Whether the text of a box has to equal a term, contain one, or be
+            within `max_distance` edits of one.
+        max_distance: The maximum edit distance per word in fuzzy mode.
 
     Returns:
         A list of the dictionary representations of the bounding boxes that match the
         PII terms.
     """
-    matches = filter_to_pii(bounding_boxes, pii_terms)
-    return [m.model_dump() for m in matches]
+    matches = filter_to_pii(
+        bounding_boxes, pii_terms, match_mode=match_mode, max_distance=max_distance
+    )
+    return matches.to_dicts()
 
 
 # Alternative using spacy
@@ -115,33 +167,39 @@ def preprocess_text(text: str) -> str:
     return " ".join(text.split())
 
 
-def detect_text(image_file: BytesIO) -> list[TextBoundingBox]:
+def detect_text(
+    image_file: BytesIO,
+    engine: TesserocrEngine | PytesseractEngine | None = None,
+) -> BoundingBoxTable:
     """
     Extract text from an image.
 
     Args:
         image_file: The target image.
+        engine: The Tesseract engine to use. Long-running workers should pass an engine
+            that is kept for their lifetime, otherwise pytesseract is used.
 
     Returns:
-        A list of bounding boxes with the detected text.
+        A table of word bounding boxes with the detected text, in reading order and
+        tagged with the block, paragraph and line they belong to.
     """
     image = Image.open(image_file)
 
-    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-
-    result = []
-    for i in range(len(data["level"])):
-        if data["conf"][i] == -1:
-            continue
-
-        result.append(
-            TextBoundingBox(
-                text=preprocess_text(data["text"][i]),
-                left=data["left"][i],
-                right=data["left"][i] + data["width"][i],
-                top=data["top"][i],
-                bottom=data["top"][i] + data["height"][i],
-            )
-        )
-
-    return result
+    engine = engine or PytesseractEngine()
+    data = engine.image_to_data(image)
+
+    words = [i for i, conf in enumerate(data["conf"]) if conf != -1]
+    left = [data["left"][i] for i in words]
+    top = [data["top"][i] for i in words]
+
+    return BoundingBoxTable(
+        text=[preprocess_text(data["text"][i]) for i in words],
+        left=left,
+        right=[x + data["width"][i] for x, i in zip(left, words)],
+        top=top,
+        bottom=[y + data["height"][i] for y, i in zip(top, words)],
+        block_num=[data["block_num"][i] for i in words],
+        par_num=[data["par_num"][i] for i in words],
+        line_num=[data["line_num"][i] for i in words],
+        word_num=[data["word_num"][i] for i in words],
+    )
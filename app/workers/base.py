@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import signal
+from abc import ABC, abstractmethod
+
+import aio_pika
+from aio_pika.abc import (
+    AbstractChannel,
+    AbstractConnection,
+    AbstractIncomingMessage,
+    AbstractQueue,
+)
+from aio_pika.exceptions import AMQPError
+
+from app.config import RabbitMQConfig, WorkerConfig
+from app.publisher import AsyncPublisher
+
+logger = logging.getLogger(__name__)
+
+
+class Worker(ABC):
+    """
+    Base of the workers, which consume a RabbitMQ queue with asyncio.
+
+    Every message is processed in its own task, with up to `concurrency` messages in
+    progress and `prefetch_count` taken from the queue at a time. A message is
+    acknowledged once it is processed, and requeued once if processing fails. Results
+    are published on a separate connection with publisher confirms.
+
+    The connection is reopened with exponential backoff when it is lost or cannot be
+    established. On SIGINT or SIGTERM the worker stops consuming, waits for the messages
+    in progress to finish and closes its connections, so the messages it had not
+    started on are delivered to other workers.
+
+    Subclasses declare their exchanges and queue in `setup` and handle a message in
+    `process_message`.
+    """
+
+    # Whether the worker publishes messages, and needs a connection to do so
+    publishes = True
+
+    def __init__(
+        self,
+        concurrency: int | None = None,
+        prefetch_count: int | None = None,
+        config: WorkerConfig | None = None,
+        rabbitmq_config: RabbitMQConfig | None = None,
+    ):
+        self.config = config or WorkerConfig()
+        self.rabbitmq_config = rabbitmq_config or RabbitMQConfig()
+        self.concurrency = concurrency or self.config.CONCURRENCY
+        self.prefetch_count = (
+            prefetch_count or self.config.PREFETCH_COUNT or self.concurrency
+        )
+        self.publisher = AsyncPublisher(self.rabbitmq_config)
+        self.in_progress: set[asyncio.Task] = set()
+        self.stopping = asyncio.Event()
+
+    @abstractmethod
+    async def setup(self, channel: AbstractChannel) -> AbstractQueue:
+        """
+        Declare the exchanges and queues of the worker.
+
+        Returns:
+            The queue to consume.
+        """
+
+    @abstractmethod
+    async def process_message(self, message: AbstractIncomingMessage) -> None:
+        """
+        Process a message. Raising an exception requeues the message once.
+        """
+
+    async def start(self) -> None:
+        """Open the resources of the worker, before consuming."""
+
+    async def stop(self) -> None:
+        """Release the resources of the worker, after the messages are drained."""
+
+    async def handle_message(
+        self, message: AbstractIncomingMessage, slots: asyncio.Semaphore
+    ) -> None:
+        async with slots:
+            try:
+                await self.process_message(message)
+            except Exception:
+                logger.exception(
+                    f"Failed to process message '{message.correlation_id}'."
+                )
+                # Retry once, in case another worker is luckier
+                settle = message.nack(requeue=not message.redelivered)
+            else:
+                settle = message.ack()
+
+            try:
+                await settle
+            except AMQPError:
+                # The broker delivers the message again once the channel is closed
+                logger.warning(
+                    f"Could not settle message '{message.correlation_id}'.",
+                    exc_info=True,
+                )
+
+    async def connect(self) -> AbstractConnection:
+        return await aio_pika.connect(
+            host=self.rabbitmq_config.HOST,
+            login=self.rabbitmq_config.DEFAULT_USER,
+            password=self.rabbitmq_config.DEFAULT_PASS,
+        )
+
+    async def consume(self) -> None:
+        """
+        Consume the queue until the worker is stopped or the connection is lost, and
+        then wait for the messages in progress.
+        """
+        if self.publishes and self.publisher.connection is None:
+            await self.publisher.connect()
+
+        connection = await self.connect()
+        lost = asyncio.Event()
+        connection.close_callbacks.add(lambda *_: lost.set())
+
+        async with connection:
+            channel = await connection.channel()
+            await channel.set_qos(prefetch_count=self.prefetch_count)
+            queue = await self.setup(channel)
+
+            slots = asyncio.Semaphore(self.concurrency)
+
+            async def on_message(message: AbstractIncomingMessage) -> None:
+                task = asyncio.create_task(self.handle_message(message, slots))
+                self.in_progress.add(task)
+                task.add_done_callback(self.in_progress.discard)
+
+            consumer_tag = await queue.consume(on_message)
+            logger.info(
+                f"Consuming '{queue.name}' with {self.concurrency} messages at a time."
+            )
+
+            stopped = asyncio.create_task(self.stopping.wait())
+            closed = asyncio.create_task(lost.wait())
+            await asyncio.wait({stopped, closed}, return_when=asyncio.FIRST_COMPLETED)
+            stopped.cancel()
+            closed.cancel()
+
+            if not lost.is_set():
+                await queue.cancel(consumer_tag)
+            await self.drain()
+
+    async def drain(self) -> None:
+        if not self.in_progress:
+            return
+
+        logger.info(f"Waiting for {len(self.in_progress)} messages in progress.")
+        _, pending = await asyncio.wait(
+            self.in_progress, timeout=self.config.DRAIN_TIMEOUT
+        )
+        for task in pending:
+            task.cancel()
+
+    async def run(self) -> None:
+        """
+        Run the worker until it receives SIGINT or SIGTERM.
+        """
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stopping.set)
+
+        await self.start()
+        delay = self.config.RECONNECT_DELAY_MIN
+        try:
+            while not self.stopping.is_set():
+                try:
+                    await self.consume()
+                    delay = self.config.RECONNECT_DELAY_MIN
+                except (AMQPError, ConnectionError, OSError):
+                    logger.warning(
+                        f"Lost the connection to RabbitMQ, retrying in {delay}s.",
+                        exc_info=True,
+                    )
+                    try:
+                        await asyncio.wait_for(self.stopping.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    delay = min(delay * 2, self.config.RECONNECT_DELAY_MAX)
+        finally:
+            await self.stop()
+            await self.publisher.close()
@@ -1,146 +1,348 @@
+import asyncio
 import json
 import logging
 from uuid import UUID
 
-import pika
-from pika.adapters.blocking_connection import BlockingChannel
-from pika.spec import Basic
+import redis.asyncio
+from aio_pika.abc import AbstractChannel, AbstractIncomingMessage, AbstractQueue
+from redis.exceptions import RedisError
 
-from app.db.controllers.matches import write_matches
+from app.cache import ResultCache
+from app.codec import Encoding, decode_results, encode_results, encoding_of
+from app.config import FilterConfig
+from app.db.controllers.dictionaries import load_dictionary_terms
+from app.db.controllers.matches import write_many_matches
+from app.db.controllers.ocr_results import write_many_ocr_results
+from app.db.controllers.ocr_tokens import write_many_ocr_tokens
 from app.db.factories import get_session_ctx
-from app.factories import rabbitmq_channel_ctx, redis_connection
-from app.models.validation import Exchange, Queue, TextBoundingBox
-from app.utils import find_matches
+from app.dictionaries import DictionaryMatchers
+from app.factories import async_redis_connection, result_cache
+from app.models.validation import Exchange, MatchMode, Queue, Tile
+from app.notifications import notify_stored
+from app.search import tokenize
+from app.staging import Staging
+from app.tiling import merge_tiles
+from app.utils import read_submission
+from app.workers.base import Worker
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
 
-class Filter:
-    def __init__(self, channel: BlockingChannel):
-        self.channel = channel
+class Filter(Worker):
+    # Matches are stored in the database, nothing is published
+    publishes = False
 
-    def process_results_and_store_matches(
-        self, correlation_id: str, ocr_result: bytes, pii_terms: bytes
+    def __init__(
+        self,
+        redis_client: redis.asyncio.Redis,
+        batch_size: int = 1,
+        batch_linger: float = 0.0,
+        cache: ResultCache | None = None,
+        dictionary_cache_size: int = 32,
+        store_ocr_results: bool = False,
+        index_ocr_tokens: bool = False,
+        staging_ttl: int = 60 * 60,
+        staging_compression: bool = False,
+        sweep_interval: float = 30.0,
+        timed_out_max: int = 10_000,
+        **kwargs,
     ):
+        super().__init__(**kwargs)
+        self.staging = Staging(
+            redis_client, ttl=staging_ttl, compress=staging_compression
+        )
+        # Jobs whose other half never arrives are removed in the background
+        self.sweep_interval = sweep_interval
+        self.timed_out_max = timed_out_max
+        self.sweeper: asyncio.Task | None = None
+        self.cache = cache
+        self.matchers = DictionaryMatchers(load_dictionary_terms, dictionary_cache_size)
+        self.store_ocr_results = store_ocr_results
+        self.index_ocr_tokens = index_ocr_tokens
+        # The matches of completed jobs are stored in batches of up to `batch_size`
+        # jobs, or every `batch_linger` seconds, and the messages that completed them
+        # are acknowledged once their batch is stored. Each message is acknowledged on
+        # its own: the messages in progress are settled in any order, so acknowledging
+        # with `multiple` would also settle messages that are not processed yet
+        self.batch_size = batch_size
+        self.batch_linger = batch_linger
+        self.batch: list[tuple[tuple[str, bytes, list[bytes]], asyncio.Future]] = []
+        self.flush_timer: asyncio.TimerHandle | None = None
+
+    def process_results(
+        self, correlation_id: str, ocr_results: list[bytes], pii_terms: bytes
+    ) -> tuple[list[dict], bytes | None, list[str]]:
         """
-        Process the OCR results and PII terms, find matches, and store them
-        in the database.
+        Process the OCR results and PII terms, and find matches.
+
+        Returns:
+            The matches, the OCR results of the whole image in the binary encoding if
+            they are stored, and the tokens of the image if they are indexed.
         """
         # Deserialize the OCR results and PII terms
-        bounding_boxes = [
-            TextBoundingBox.model_validate(box) for box in json.loads(ocr_result)
-        ]
-        pii_terms_dict = json.loads(pii_terms)
+        terms_data = json.loads(pii_terms)
+        if isinstance(terms_data, list):
+            # Messages published before match modes were introduced
+            terms_data = {"pii_terms": terms_data}
+
+        results = [decode_results(ocr_result) for ocr_result in ocr_results]
+        if terms_data.get("tiles"):
+            # Put the results of the tiles of a large image back together
+            tiles = [Tile.model_validate(tile) for tile in terms_data["tiles"]]
+            bounding_boxes = merge_tiles(tiles, results)
+        else:
+            bounding_boxes = results[0]
 
         # Find matches between bounding boxes and PII terms
-        matched_terms = find_matches(
-            bounding_boxes=bounding_boxes,
-            pii_terms=pii_terms_dict,
+        matched_terms = (
+            self.matchers.matcher(terms_data)
+            .filter(
+                bounding_boxes,
+                match_mode=MatchMode(terms_data.get("match_mode", MatchMode.EXACT)),
+                max_distance=terms_data.get("max_distance", 1),
+            )
+            .to_dicts()
         )
+        logger.info(f"Processed item {correlation_id}. Matches: {len(matched_terms)}")
+
+        tokens = tokenize(bounding_boxes.text) if self.index_ocr_tokens else []
+
+        if not self.store_ocr_results:
+            return matched_terms, None, tokens
+        if (
+            not terms_data.get("tiles")
+            and encoding_of(ocr_results[0]) == Encoding.BINARY
+        ):
+            # The results of a whole image are stored as published by the OCR worker
+            return matched_terms, ocr_results[0], tokens
+        return matched_terms, encode_results(bounding_boxes, compress=True), tokens
+
+    def store_matches(
+        self, jobs: list[tuple[str, bytes, list[bytes]]]
+    ) -> dict[str, bytes]:
+        """
+        Find the matches of the completed jobs and store them in the database, along
+        with their OCR results and tokens, in a single transaction.
+
+        Returns:
+            The responses of the API with the matches, by correlation ID.
+        """
+        rows = []
+        ocr_rows = []
+        token_rows = []
+        for correlation_id, pii_terms, ocr_results in jobs:
+            terms, stored_results, tokens = self.process_results(
+                correlation_id, ocr_results, pii_terms
+            )
+            rows.append({"correlation_id": UUID(correlation_id), "terms": terms})
+            if stored_results is not None:
+                ocr_rows.append(
+                    {"correlation_id": UUID(correlation_id), "results": stored_results}
+                )
+            token_rows.extend(
+                {"token": token, "correlation_id": UUID(correlation_id)}
+                for token in tokens
+            )
 
-        # Store matches in the database
         with get_session_ctx() as session:
-            result = write_matches(
+            inserted = set(write_many_matches(session=session, matches=rows))
+            write_many_ocr_results(session=session, ocr_results=ocr_rows)
+            # The tokens of the matches stored by an earlier delivery are stored already
+            write_many_ocr_tokens(
                 session=session,
-                correlation_id=UUID(correlation_id),
-                terms=matched_terms,
-            )
-            logger.info(
-                f"Processed item {result.correlation_id}. Matches: {len(matched_terms)}"
+                ocr_tokens=[
+                    row for row in token_rows if row["correlation_id"] in inserted
+                ],
             )
 
-    def process_message(self, body: bytes, method: Basic.Deliver, correlation_id: str):
+        return {
+            str(row["correlation_id"]): ResultCache.encode(row["terms"]) for row in rows
+        }
+
+    async def store_job(
+        self, correlation_id: str, pii_terms: bytes, ocr_results: list[bytes]
+    ) -> None:
         """
-        Process the message by storing it in Redis and retrieving data to find matches.
+        Add a completed job to the current batch, and wait for the batch to be stored.
         """
-        with redis_connection() as redis_conn:
-            # Generate keys based on the correlation ID
-            ocr_key = f"{correlation_id}:ocr"
-            pii_terms_key = f"{correlation_id}:pii_terms"
+        loop = asyncio.get_running_loop()
+        stored = loop.create_future()
+        self.batch.append(((correlation_id, pii_terms, ocr_results), stored))
 
-            this_key = None
-            if method.routing_key == "filter.pii":
-                this_key = pii_terms_key
-            elif method.routing_key == "filter.ocr":
-                this_key = ocr_key
+        if len(self.batch) >= self.batch_size:
+            await self.flush()
+        elif self.flush_timer is None:
+            self.flush_timer = loop.call_later(self.batch_linger, self.flush_later)
 
-            # Store the message in Redis only if the key doesn't exist
-            if not redis_conn.exists(this_key):
-                redis_conn.set(this_key, body)
-                logger.info(f"Stored data for key: {this_key}")
+        await stored
 
-            # Retrieve OCR result and PII terms from Redis
-            ocr_result = redis_conn.get(ocr_key)
-            pii_terms = redis_conn.get(pii_terms_key)
+    def flush_later(self) -> None:
+        # Tracked with the messages in progress, so that shutting down waits for it
+        task = asyncio.create_task(self.flush())
+        self.in_progress.add(task)
+        task.add_done_callback(self.in_progress.discard)
 
-            if ocr_result and pii_terms:
-                # Process the results and store matches in the database
-                self.process_results_and_store_matches(
-                    correlation_id, ocr_result, pii_terms
-                )
+    async def flush(self) -> None:
+        """
+        Store the matches of the jobs of the current batch in a single transaction.
+        """
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
 
-                # Clean up Redis keys after processing
-                redis_conn.delete(pii_terms_key)
-                redis_conn.delete(ocr_key)
+        batch, self.batch = self.batch, []
+        if batch:
+            await self.store_batch(batch)
 
-    def on_message_received(
-        self,
-        channel: BlockingChannel,
-        method: Basic.Deliver,
-        properties: pika.BasicProperties,
-        body: bytes,
+    async def store_batch(
+        self, batch: list[tuple[tuple[str, bytes, list[bytes]], asyncio.Future]]
     ) -> None:
         """
-        Callback function triggered when a message is received.
+        Store the matches of a batch of jobs, and resolve the futures of the jobs.
+
+        If the batch fails, its jobs are stored again one by one, so that a job whose
+        terms or OCR results cannot be processed fails on its own.
         """
-        correlation_id = properties.correlation_id
+        jobs = [job for job, _ in batch]
+        try:
+            # Matching and the database session block, so they run in a thread
+            responses = await asyncio.to_thread(self.store_matches, jobs)
+        except Exception as error:
+            if len(batch) > 1:
+                logger.warning("Could not store a batch, storing its jobs one by one.")
+                for job in batch:
+                    await self.store_batch([job])
+                return
 
-        self.process_message(body, method, correlation_id)
+            for _, stored in batch:
+                stored.set_exception(error)
+            # Put the jobs back so that the redelivered messages complete them
+            for correlation_id, _, _ in jobs:
+                await self.staging.restore(correlation_id)
+        else:
+            try:
+                await self.staging.complete([job[0] for job in jobs])
+            except RedisError:
+                # The matches are stored, and the claimed jobs expire on their own
+                logger.warning("Could not delete the claimed jobs.", exc_info=True)
+            for _, stored in batch:
+                stored.set_result(None)
+            await self.announce_stored(responses)
 
-        channel.basic_ack(method.delivery_tag)
+    async def announce_stored(self, responses: dict[str, bytes]) -> None:
+        """
+        Cache the responses with the stored matches, and then wake up the API requests
+        waiting for them.
+        """
+        try:
+            if self.cache is not None:
+                await self.cache.set_many(responses)
+            await notify_stored(self.staging.client, responses)
+        except RedisError:
+            # The matches are stored, and the requests find them once they time out
+            logger.warning("Could not announce the stored matches.", exc_info=True)
 
-    def setup_queues_and_exchanges(self):
+    async def process_message(self, message: AbstractIncomingMessage) -> None:
         """
-        Declare necessary RabbitMQ exchanges and queues.
+        Stage the message in Redis, and store the matches of the job it completes.
+
+        The OCR results of a large image arrive as one message per tile, and are
+        collected until all of them are available. Both halves carry the number of
+        tiles in their headers. Only the consumer whose message completes the job
+        gets it, so several filter workers can run side by side.
         """
-        self.channel.exchange_declare(
-            exchange=Exchange.FILTER.value, exchange_type="topic", durable=True
-        )
+        correlation_id = message.correlation_id
+        headers = message.headers or {}
+        tile = int(headers.get("tile", 0))
+        tiles = int(headers.get("tiles", 1))
 
-        self.channel.queue_declare(queue=Queue.FILTER.value, durable=True)
+        # Store the message in Redis and get the whole job if it is complete
+        if message.routing_key == "direct":
+            # Submissions routed straight from the API, whose image is not needed. The
+            # API only routes images uploaded to MinIO directly, but inline images are
+            # still read, e.g. from messages published by an older version
+            data, _ = read_submission(message.body, inline=headers.get("inline", False))
+            job = await self.staging.stage_pii_terms(
+                correlation_id, json.dumps(data).encode(), tiles
+            )
+        elif message.routing_key == "filter.pii":
+            job = await self.staging.stage_pii_terms(
+                correlation_id, message.body, tiles
+            )
+        else:
+            job = await self.staging.stage_ocr_results(
+                correlation_id, message.body, tile, tiles
+            )
 
-        self.channel.queue_bind(
-            exchange=Exchange.FILTER.value,
-            queue=Queue.FILTER.value,
-            routing_key="filter.pii",
-        )
+        if not job:
+            logger.info(f"Stored {message.routing_key} data for {correlation_id}.")
+            return
+
+        pii_terms, ocr_results = job
+        await self.store_job(correlation_id, pii_terms, ocr_results)
 
-        self.channel.queue_bind(
-            exchange=Exchange.FILTER.value,
-            queue=Queue.FILTER.value,
-            routing_key="filter.ocr",
+    async def setup(self, channel: AbstractChannel) -> AbstractQueue:
+        """
+        Declare necessary RabbitMQ exchanges and queues.
+        """
+        exchange = await channel.declare_exchange(
+            Exchange.FILTER.value, type="topic", durable=True
         )
 
-    def start(self):
+        queue = await channel.declare_queue(Queue.FILTER.value, durable=True)
+        await queue.bind(exchange, routing_key="filter.pii")
+        await queue.bind(exchange, routing_key="filter.ocr")
+
+        return queue
+
+    async def sweep_staging(self) -> None:
         """
-        Start consuming messages from RabbitMQ.
+        Remove the staged jobs that timed out every `sweep_interval` seconds, and log
+        which half they were missing.
         """
-        self.setup_queues_and_exchanges()
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                expired = await self.staging.sweep(keep=self.timed_out_max)
+            except RedisError:
+                logger.warning("Could not sweep the staged jobs.", exc_info=True)
+                continue
 
-        self.channel.basic_consume(
-            queue=Queue.FILTER.value,
-            on_message_callback=self.on_message_received,
-            auto_ack=False,
-        )
-        self.channel.start_consuming()
+            for correlation_id, pii_terms, tiles in expired:
+                logger.warning(
+                    f"Job {correlation_id} timed out with "
+                    f"{'' if pii_terms else 'no '}PII terms and the OCR results of "
+                    f"{tiles} tiles."
+                )
+
+    async def start(self) -> None:
+        self.sweeper = asyncio.create_task(self.sweep_staging())
+
+    async def stop(self) -> None:
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            await asyncio.gather(self.sweeper, return_exceptions=True)
+        await self.staging.client.aclose()
 
 
 def main():
-    # Start the filtering with the RabbitMQ channel
-    with rabbitmq_channel_ctx() as channel:
-        processor = Filter(channel)
-        processor.start()
+    config = FilterConfig()
+
+    processor = Filter(
+        async_redis_connection(),
+        batch_size=config.BATCH_SIZE,
+        batch_linger=config.BATCH_LINGER_MS / 1000,
+        cache=result_cache(),
+        dictionary_cache_size=config.DICTIONARY_CACHE_SIZE,
+        store_ocr_results=config.STORE_OCR_RESULTS,
+        index_ocr_tokens=config.INDEX_OCR_TOKENS,
+        staging_ttl=config.STAGING_TTL,
+        staging_compression=config.STAGING_COMPRESSION,
+        sweep_interval=config.STAGING_SWEEP_INTERVAL,
+        timed_out_max=config.STAGING_TIMED_OUT_MAX,
+    )
+    asyncio.run(processor.run())
 
 
 if __name__ == "__main__":
@@ -1,130 +1,199 @@
+import asyncio
 import json
 import logging
+from io import BytesIO
 
-import pika
-from pika.adapters.blocking_connection import BlockingChannel
-from pika.spec import Basic
+import requests
+from aio_pika.abc import AbstractChannel, AbstractIncomingMessage, AbstractQueue
+from minio import Minio
+from PIL import Image
 
-from app.factories import rabbitmq_channel_ctx
-from app.models.validation import Exchange, Queue
-from app.utils import publish_to_exchange
+from app.config import MinioConfig, TilingConfig
+from app.factories import http_connection, minio_connection
+from app.models.validation import Exchange, Queue, Tile
+from app.tiling import limit_image_pixels, needs_tiling, plan_tiles
+from app.utils import read_submission, upload_object_to_minio
+from app.workers.base import Worker
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
 
-class Forward:
-    def __init__(self, channel: BlockingChannel):
-        self.channel = channel
+minio_config = MinioConfig()  # type:ignore
 
-    def process_message(
+
+class Forward(Worker):
+    def __init__(
         self,
-        channel: BlockingChannel,
-        properties: pika.BasicProperties,
-        image_url: str,
-        pii_terms: list,
+        minio_client: Minio,
+        tiling_config: TilingConfig | None = None,
+        http_session: requests.Session | None = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.minio_client = minio_client
+        self.tiling_config = tiling_config or TilingConfig()
+        # Images are split into tiles however large they are, up to the pixel limit
+        limit_image_pixels(self.tiling_config)
+        self.http_session = http_session or requests.Session()
+
+    def plan_tiles(self, image_size: list[int] | None) -> list[Tile]:
+        """
+        Plan the tiles of a large image, or return no tiles if the image is processed
+        whole.
+        """
+        config = self.tiling_config
+        if not needs_tiling(image_size, config):
+            return []
+
+        width, height = image_size
+        return plan_tiles(width, height, size=config.TILE_SIZE, overlap=config.OVERLAP)
+
+    def download_image(self, image_url: str) -> bytes:
+        """
+        Download an image from MinIO.
+        """
+        response = self.http_session.get(image_url)
+        response.raise_for_status()
+        return response.content
+
+    def upload_tiles(
+        self, correlation_id: str, image_content: bytes, tiles: list[Tile]
+    ) -> list[str]:
+        """
+        Split the image into tiles and upload each tile to MinIO.
+        """
+        image = Image.open(BytesIO(image_content))
+
+        tile_urls = []
+        for index, tile in enumerate(tiles):
+            tile_file = BytesIO()
+            image.crop((tile.left, tile.top, tile.right, tile.bottom)).save(
+                tile_file, format="PNG"
+            )
+            tile_file.seek(0)
+
+            tile_urls.append(
+                upload_object_to_minio(
+                    client=self.minio_client,
+                    bucket=minio_config.BUCKET,
+                    path=minio_config.PATH,
+                    filename=f"{correlation_id}_tile_{index}.png",
+                    obj=tile_file,
+                    content_type="image/png",
+                )
+            )
+
+        return tile_urls
+
+    async def forward(
+        self,
+        correlation_id: str,
+        image_url: str | None,
+        pii_terms: dict,
+        image_size: list[int] | None = None,
+        image_content: bytes | None = None,
     ):
         """
         Publish the received message to the OCR and PII filter exchanges.
+
+        Small images arrive inside the message and are passed on to the OCR exchange
+        the same way, while other images are passed on by URL. Large images are split
+        into tiles that are published to the OCR exchange as separate messages, and the
+        tiles are passed on with the PII terms so that the filter can put their results
+        back together.
         """
-        # Publish image URL to the OCR exchange
-        publish_to_exchange(
-            channel=channel,
-            correlation_id=properties.correlation_id,
-            body=image_url,
-            routing_key="image.ocr",
-            exchange=Exchange.OCR.value,
-        )
+        tiles = self.plan_tiles(image_size)
+        if tiles:
+            # Splitting the image blocks, so it runs in a thread
+            if image_content is None:
+                image_content = await asyncio.to_thread(self.download_image, image_url)
+            images = await asyncio.to_thread(
+                self.upload_tiles, correlation_id, image_content, tiles
+            )
+            pii_terms["tiles"] = [tile.model_dump() for tile in tiles]
+        elif image_content is not None:
+            images = [image_content]
+        else:
+            images = [image_url]
+
+        # Publish the images, or their URLs, to the OCR exchange
+        publications = []
+        for index, image in enumerate(images):
+            headers = {"tile": index, "tiles": len(images)}
+            if isinstance(image, bytes):
+                headers["inline"] = True
+
+            publications.append(
+                self.publisher.publish(
+                    correlation_id=correlation_id,
+                    body=image,
+                    routing_key="image.ocr",
+                    exchange=Exchange.OCR.value,
+                    headers=headers,
+                )
+            )
 
         # Publish PII terms to the PII filter exchange
-        publish_to_exchange(
-            channel=channel,
-            correlation_id=properties.correlation_id,
-            body=json.dumps(pii_terms),
-            routing_key="filter.pii",
-            exchange=Exchange.FILTER.value,
+        publications.append(
+            self.publisher.publish(
+                correlation_id=correlation_id,
+                body=json.dumps(pii_terms),
+                routing_key="filter.pii",
+                exchange=Exchange.FILTER.value,
+                headers={"tiles": len(images)},
+            )
         )
+        await asyncio.gather(*publications)
 
         logger.info(
-            f"""Published data for correlation id '{properties.correlation_id}'
-            to filtering and OCR exchanges."""
+            f"""Published data for correlation id '{correlation_id}'
+            to filtering and OCR exchanges ({len(images)} image(s))."""
         )
 
-    def on_message_received(
-        self,
-        channel: BlockingChannel,
-        method: Basic.Deliver,
-        properties: pika.BasicProperties,
-        body: bytes,
-    ) -> None:
+    async def process_message(self, message: AbstractIncomingMessage) -> None:
         """
-        Callback function triggered when a message is received.
+        Forward a submitted image and its PII terms.
         """
-        data = json.loads(body)
-        image_url = data["image_url"]
-        pii_terms = data["pii_terms"]
+        data, image_content = read_submission(
+            message.body, inline=(message.headers or {}).get("inline", False)
+        )
 
-        # Process and publish the message
-        self.process_message(channel, properties, image_url, pii_terms)
+        image_url = data.pop("image_url", None)
+        image_size = data.pop("image_size", None)
+        # The PII terms and the options for matching them
+        pii_terms = data
 
-        # Acknowledge the message
-        channel.basic_ack(delivery_tag=method.delivery_tag)
+        await self.forward(
+            message.correlation_id, image_url, pii_terms, image_size, image_content
+        )
 
-    def setup_exchanges_and_queues(self):
+    async def setup(self, channel: AbstractChannel) -> AbstractQueue:
         """
         Declare necessary RabbitMQ exchanges and queues.
         """
         # Declare the forward exchange where combined image and PII terms are published
-        self.channel.exchange_declare(
-            exchange=Exchange.FORWARD.value,
-            exchange_type="topic",
-            durable=True,
+        exchange = await channel.declare_exchange(
+            Exchange.FORWARD.value, type="topic", durable=True
         )
 
         # Declare a new queue for the new subscriber to consume messages
-        self.channel.queue_declare(
-            queue=Queue.FORWARD.value,
-            durable=True,
-        )
-
-        self.channel.queue_bind(
-            exchange=Exchange.FORWARD.value,
-            queue=Queue.FORWARD.value,
-            routing_key="input",
-        )
+        queue = await channel.declare_queue(Queue.FORWARD.value, durable=True)
+        await queue.bind(exchange, routing_key="input")
 
         # Declare OCR and Filter exchanges
-        self.channel.exchange_declare(
-            exchange=Exchange.OCR.value,
-            exchange_type="topic",
-            durable=True,
-        )
-        self.channel.exchange_declare(
-            exchange=Exchange.FILTER.value,
-            exchange_type="topic",
-            durable=True,
+        await self.publisher.declare_exchange(Exchange.OCR.value, exchange_type="topic")
+        await self.publisher.declare_exchange(
+            Exchange.FILTER.value, exchange_type="topic"
         )
 
-    def start(self):
-        """
-        Start consuming messages from the forward queue.
-        """
-        self.setup_exchanges_and_queues()
-
-        self.channel.basic_consume(
-            queue=Queue.FORWARD.value,
-            on_message_callback=self.on_message_received,
-            auto_ack=False,
-        )
-        self.channel.start_consuming()
+        return queue
 
 
 def main():
-    # Start the forwarding with the RabbitMQ channel
-    with rabbitmq_channel_ctx() as channel:
-        processor = Forward(channel)
-        processor.start()
+    processor = Forward(minio_connection(), http_session=http_connection())
+    asyncio.run(processor.run())
 
 
 if __name__ == "__main__":
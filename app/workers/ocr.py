@@ -1,125 +1,231 @@
-import json
+import asyncio
 import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from io import BytesIO
 
-import pika
-import requests
-from pika.adapters.blocking_connection import BlockingChannel
-from pika.spec import Basic
+from aio_pika.abc import AbstractChannel, AbstractIncomingMessage, AbstractQueue
 
-from app.factories import rabbitmq_channel_ctx
+from app.cache import OCRCache
+from app.codec import Encoding, encode_results, encoding_of
+from app.config import OCRConfig
+from app.factories import http_connection, redis_connection
 from app.models.validation import Exchange, Queue
-from app.utils import detect_text, publish_to_exchange
+from app.tesseract import PytesseractEngine, TesserocrEngine, tesseract_engine
+from app.utils import detect_text, read_submission
+from app.workers.base import Worker
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
 
-class OCR:
-    def __init__(self, channel: BlockingChannel):
-        self.channel = channel
-
-    def process_message(
+# Tesseract engine and results cache of a pool process, created once by
+# `init_pool_process`
+pool_engine: TesserocrEngine | PytesseractEngine | None = None
+pool_cache: OCRCache | None = None
+
+
+def ocr_cache(config: OCRConfig) -> OCRCache | None:
+    """Provide the cache of OCR results, if enabled."""
+    if not config.CACHE_ENABLED:
+        return None
+
+    return OCRCache(
+        client=redis_connection(),
+        ttl=config.CACHE_TTL,
+        max_entries=config.CACHE_MAX_ENTRIES,
+        lock_timeout=config.CACHE_LOCK_TIMEOUT,
+        wait_timeout=config.CACHE_WAIT_TIMEOUT,
+    )
+
+
+def init_pool_process(config: OCRConfig) -> None:
+    """Load the Tesseract engine and connect the cache of a pool process."""
+    global pool_engine, pool_cache
+    pool_engine = tesseract_engine(config)
+    pool_cache = ocr_cache(config)
+
+
+def run_ocr(
+    image: bytes | str,
+    engine: TesserocrEngine | PytesseractEngine | None = None,
+    cache: OCRCache | None = None,
+    encoding: Encoding = Encoding.BINARY,
+    compress: bool = False,
+) -> bytes:
+    """
+    Process an image using OCR, and serialize the results. Results are looked up in the
+    cache first, if there is one.
+
+    Args:
+        image: The contents of the image, or its URL to download it from.
+        engine: The Tesseract engine, otherwise the engine of the pool process.
+        cache: The cache of OCR results, otherwise the cache of the pool process.
+        encoding: The format to serialize the results in.
+        compress: Whether to compress the serialized results.
+
+    Returns:
+        The serialized OCR results.
+    """
+    engine = engine or pool_engine
+    cache = cache or pool_cache
+
+    if isinstance(image, str):
+        # Download the image from the URL, over a connection kept alive between images
+        response = http_connection().get(image)
+        response.raise_for_status()
+        image = response.content
+
+    def compute() -> bytes:
+        # Process the image with OCR, and serialize the table of results
+        results = detect_text(BytesIO(image), engine=engine)
+        return encode_results(results, encoding=encoding, compress=compress)
+
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(image, compute)
+
+
+class OCR(Worker):
+    def __init__(
         self,
-        channel: BlockingChannel,
-        correlation_id: str,
-        image_url: str,
+        executor: Executor,
+        engine: TesserocrEngine | PytesseractEngine | None = None,
+        cache: OCRCache | None = None,
+        encoding: Encoding = Encoding.BINARY,
+        compress: bool = False,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        # OCR is CPU bound, so it runs in a pool of processes when using several cores,
+        # or in a single thread with an engine kept for the lifetime of the worker
+        self.executor = executor
+        self.engine = engine
+        self.cache = cache
+        self.encoding = encoding
+        self.compress = compress
+
+    async def publish_results(
+        self, correlation_id: str, results: bytes, headers: dict | None = None
     ):
         """
-        Download the image from the provided URL, process it using OCR, and publish the
-        results.
+        Publish OCR results to the filter exchange. The headers identifying the tile of
+        a large image are passed on, along with the encoding of the results, which may
+        come from the cache in another encoding than the worker's.
         """
-        # Download the image from the URL
-        response = requests.get(image_url)
-        image_file = BytesIO(response.content)
-
-        # Process the image with OCR
-        results = detect_text(image_file)
-
-        # Convert the OCR results into a list of dictionaries
-        results = [b.model_dump() for b in results]
-
-        # Publish OCR results to the filter exchange
-        publish_to_exchange(
-            channel=channel,
+        headers = {
+            key: value for key, value in (headers or {}).items() if key != "inline"
+        }
+        headers["encoding"] = encoding_of(results).value
+        await self.publisher.publish(
             correlation_id=correlation_id,
-            body=json.dumps(results),
+            body=results,
             routing_key="filter.ocr",
             exchange=Exchange.FILTER.value,
+            headers=headers,
         )
 
-    def on_message_received(
-        self,
-        channel: BlockingChannel,
-        method: Basic.Deliver,
-        properties: pika.BasicProperties,
-        body: bytes,
-    ) -> None:
+    async def process_message(self, message: AbstractIncomingMessage) -> None:
         """
-        Callback function triggered when a message is received.
+        Process the image using OCR, and publish the results.
         """
-        image_url = body.decode()  # Decode the message to get the image URL
-
-        # Process and publish the message
-        self.process_message(channel, properties.correlation_id, image_url)
-
-        # Acknowledge the message
-        channel.basic_ack(delivery_tag=method.delivery_tag)
+        inline = (message.headers or {}).get("inline", False)
+        if message.routing_key == "direct":
+            # Submissions routed straight from the API, with the PII terms
+            data, image_content = read_submission(message.body, inline=inline)
+            image = image_content if inline else data["image_url"]
+        elif inline:
+            # Small images arrive in the message, other images by URL
+            image = message.body
+        else:
+            image = message.body.decode()
+
+        results = await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            partial(
+                run_ocr,
+                image,
+                engine=self.engine,
+                cache=self.cache,
+                encoding=self.encoding,
+                compress=self.compress,
+            ),
+        )
+        await self.publish_results(message.correlation_id, results, message.headers)
 
         logger.info(
-            f"""Published OCR results for correlation id '{properties.correlation_id}'
+            f"""Published OCR results for correlation id '{message.correlation_id}'
             to filtering exchange."""
         )
 
-    def setup_exchanges_and_queues(self):
+    async def setup(self, channel: AbstractChannel) -> AbstractQueue:
         """
         Declare necessary RabbitMQ exchanges and queues.
         """
         # Declare Incoming Exchanges & Queues
-        self.channel.exchange_declare(
-            exchange=Exchange.OCR.value,
-            exchange_type="topic",
-            durable=True,
-        )
-
-        self.channel.queue_declare(
-            queue=Queue.OCR.value,
-            durable=True,
-        )
-
-        self.channel.queue_bind(
-            exchange=Exchange.OCR.value,
-            queue=Queue.OCR.value,
-            routing_key="image.ocr",
+        exchange = await channel.declare_exchange(
+            Exchange.OCR.value, type="topic", durable=True
         )
+        queue = await channel.declare_queue(Queue.OCR.value, durable=True)
+        await queue.bind(exchange, routing_key="image.ocr")
 
         # Declare Outgoing Exchanges
-        self.channel.exchange_declare(
-            exchange=Exchange.FILTER.value,
-            exchange_type="topic",
-            durable=True,
+        await self.publisher.declare_exchange(
+            Exchange.FILTER.value, exchange_type="topic"
         )
 
-    def start(self):
-        """
-        Start consuming messages from the OCR queue.
-        """
-        self.setup_exchanges_and_queues()
-
-        self.channel.basic_consume(
-            queue=Queue.OCR.value,
-            on_message_callback=self.on_message_received,
-            auto_ack=False,
-        )
-        self.channel.start_consuming()
+        return queue
 
 
 def main():
-    # Start the OCR processor with the RabbitMQ channel
-    with rabbitmq_channel_ctx() as channel:
-        processor = OCR(channel)
-        processor.start()
+    config = OCRConfig()
+    options = {
+        "encoding": Encoding(config.RESULT_ENCODING),
+        "compress": config.RESULT_COMPRESSION,
+    }
+
+    if not config.WORKERS:
+        # Run OCR in a single thread of this process, one image at a time
+        engine = tesseract_engine(config)
+        logger.info(f"Using Tesseract engine '{type(engine).__name__}'.")
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                processor = OCR(
+                    executor,
+                    engine=engine,
+                    cache=ocr_cache(config),
+                    concurrency=1,
+                    prefetch_count=config.PREFETCH_COUNT or 1,
+                    **options,
+                )
+                asyncio.run(processor.run())
+        finally:
+            engine.close()
+        return
+
+    # Cap the OpenMP threads of Tesseract so that the pool processes do not
+    # oversubscribe the cores. OpenMP reads this when it is loaded, so the pool
+    # processes are spawned rather than forked from this one.
+    os.environ["OMP_THREAD_LIMIT"] = str(config.THREADS_PER_WORKER)
+    context = multiprocessing.get_context("spawn")
+
+    logger.info(f"Starting a pool of {config.WORKERS} OCR processes.")
+    with ProcessPoolExecutor(
+        config.WORKERS,
+        mp_context=context,
+        initializer=init_pool_process,
+        initargs=(config,),
+    ) as executor:
+        processor = OCR(
+            executor,
+            concurrency=config.WORKERS,
+            prefetch_count=config.PREFETCH_COUNT or config.WORKERS,
+            **options,
+        )
+        asyncio.run(processor.run())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+"""Add term dictionaries
+
+Revision ID: 3c1d9e7f2a40
+Revises: fbe2a5753a96
+Create Date: 2026-10-17 09:12:45.118305+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1d9e7f2a40'
+down_revision: Union[str, None] = 'fbe2a5753a96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'term_dictionaries',
+        sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('terms', sa.JSON(), nullable=True),
+        sa.Column(
+            'created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False
+        ),
+        sa.PrimaryKeyConstraint('name', 'version'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('term_dictionaries')
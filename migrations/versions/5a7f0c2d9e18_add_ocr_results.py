@@ -0,0 +1,64 @@
+"""Add OCR results
+
+Revision ID: 5a7f0c2d9e18
+Revises: 8e4b2f6a1c93
+Create Date: 2026-10-17 11:47:52.260934+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7f0c2d9e18'
+down_revision: Union[str, None] = '8e4b2f6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Partitioned by month like the matches, and dropped with them
+    op.execute(
+        '''
+        CREATE TABLE ocr_results (
+            correlation_id uuid NOT NULL,
+            results bytea NOT NULL,
+            created_at timestamp NOT NULL DEFAULT now(),
+            PRIMARY KEY (correlation_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        '''
+    )
+    op.execute('CREATE TABLE ocr_results_default PARTITION OF ocr_results DEFAULT')
+
+    # The same monthly partitions as the matches, named as in `app.db.partitions`
+    op.execute(
+        '''
+        DO $$
+        DECLARE
+            partition text;
+            month date;
+        BEGIN
+            FOR partition IN
+                SELECT child.relname FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = 'matches'
+                AND child.relname ~ '^matches_[0-9]{4}_[0-9]{2}$'
+            LOOP
+                month := to_date(substring(partition FROM 9), 'YYYY_MM');
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF ocr_results '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'ocr_results_' || to_char(month, 'YYYY_MM'),
+                    month,
+                    month + interval '1 month'
+                );
+            END LOOP;
+        END $$
+        '''
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ocr_results')
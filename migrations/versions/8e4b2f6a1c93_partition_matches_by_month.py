@@ -0,0 +1,100 @@
+"""Partition matches by month and store terms as JSONB
+
+Revision ID: 8e4b2f6a1c93
+Revises: 3c1d9e7f2a40
+Create Date: 2026-10-17 10:31:08.502117+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4b2f6a1c93'
+down_revision: Union[str, None] = '3c1d9e7f2a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('ALTER TABLE matches RENAME TO matches_legacy')
+    op.execute(
+        'ALTER TABLE matches_legacy RENAME CONSTRAINT matches_pkey TO matches_legacy_pkey'
+    )
+
+    # The partition key has to be part of the primary key
+    op.execute(
+        '''
+        CREATE TABLE matches (
+            correlation_id uuid NOT NULL,
+            terms jsonb,
+            created_at timestamp NOT NULL DEFAULT now(),
+            PRIMARY KEY (correlation_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        '''
+    )
+    op.execute('CREATE TABLE matches_default PARTITION OF matches DEFAULT')
+
+    # Monthly partitions from the oldest stored match to two months ahead, named as in
+    # `app.db.partitions`
+    op.execute(
+        '''
+        DO $$
+        DECLARE
+            month date;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc(
+                        'month',
+                        coalesce((SELECT min(created_at) FROM matches_legacy), now())
+                    ),
+                    date_trunc('month', now()) + interval '2 months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF matches FOR VALUES FROM (%L) TO (%L)',
+                    'matches_' || to_char(month, 'YYYY_MM'),
+                    month,
+                    month + interval '1 month'
+                );
+            END LOOP;
+        END $$
+        '''
+    )
+
+    op.execute(
+        '''
+        INSERT INTO matches (correlation_id, terms, created_at)
+        SELECT correlation_id, terms::jsonb, created_at FROM matches_legacy
+        '''
+    )
+    op.execute('DROP TABLE matches_legacy')
+
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE matches RENAME TO matches_partitioned')
+    op.execute(
+        'ALTER TABLE matches_partitioned RENAME CONSTRAINT matches_pkey '
+        'TO matches_partitioned_pkey'
+    )
+    op.execute(
+        '''
+        CREATE TABLE matches (
+            correlation_id uuid NOT NULL PRIMARY KEY,
+            terms json,
+            created_at timestamp NOT NULL DEFAULT now()
+        )
+        '''
+    )
+    op.execute(
+        '''
+        INSERT INTO matches (correlation_id, terms, created_at)
+        SELECT DISTINCT ON (correlation_id) correlation_id, terms::json, created_at
+        FROM matches_partitioned
+        ORDER BY correlation_id, created_at
+        '''
+    )
+    op.execute('DROP TABLE matches_partitioned')
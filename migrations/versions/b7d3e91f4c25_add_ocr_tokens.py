@@ -0,0 +1,64 @@
+"""Add OCR tokens
+
+Revision ID: b7d3e91f4c25
+Revises: 5a7f0c2d9e18
+Create Date: 2026-10-17 13:02:18.417265+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e91f4c25'
+down_revision: Union[str, None] = '5a7f0c2d9e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Partitioned by month like the matches, and dropped with them
+    op.execute(
+        '''
+        CREATE TABLE ocr_tokens (
+            token varchar NOT NULL,
+            correlation_id uuid NOT NULL,
+            created_at timestamp NOT NULL DEFAULT now(),
+            PRIMARY KEY (token, correlation_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        '''
+    )
+    op.execute('CREATE TABLE ocr_tokens_default PARTITION OF ocr_tokens DEFAULT')
+
+    # The same monthly partitions as the matches, named as in `app.db.partitions`
+    op.execute(
+        '''
+        DO $$
+        DECLARE
+            partition text;
+            month date;
+        BEGIN
+            FOR partition IN
+                SELECT child.relname FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = 'matches'
+                AND child.relname ~ '^matches_[0-9]{4}_[0-9]{2}$'
+            LOOP
+                month := to_date(substring(partition FROM 9), 'YYYY_MM');
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF ocr_tokens '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'ocr_tokens_' || to_char(month, 'YYYY_MM'),
+                    month,
+                    month + interval '1 month'
+                );
+            END LOOP;
+        END $$
+        '''
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ocr_tokens')
@@ -0,0 +1,84 @@
+import argparse
+import json
+import random
+import string
+from time import perf_counter
+
+from app.codec import Encoding, decode_results, encode_results
+from app.models.boxes import BoundingBoxTable
+from app.models.validation import TextBoundingBox
+
+
+def make_table(rng: random.Random, count: int) -> BoundingBoxTable:
+    """Generate the OCR results of a dense page."""
+    boxes = []
+    for i in range(count):
+        line, word = divmod(i, 12)
+        left, top = 20 + word * 90, 20 + line * 30
+        boxes.append(
+            TextBoundingBox(
+                text="".join(rng.choices(string.ascii_letters, k=rng.randint(3, 10))),
+                left=left,
+                right=left + 80,
+                top=top,
+                bottom=top + 20,
+                block_num=1 + line // 40,
+                par_num=1,
+                line_num=1 + line % 40,
+                word_num=1 + word,
+            )
+        )
+    return BoundingBoxTable.from_boxes(boxes)
+
+
+def encode_models(table: BoundingBoxTable) -> bytes:
+    """The previous serialization, with a model per word."""
+    boxes = [TextBoundingBox(**row) for row in table.to_dicts()]
+    return json.dumps([box.model_dump() for box in boxes]).encode()
+
+
+def decode_models(payload: bytes) -> list[TextBoundingBox]:
+    """The previous deserialization, validating a model per word."""
+    return [TextBoundingBox.model_validate(box) for box in json.loads(payload)]
+
+
+def timed(func, *args, repeat: int, **kwargs) -> tuple[float, object]:
+    start = perf_counter()
+    for _ in range(repeat):
+        result = func(*args, **kwargs)
+    return (perf_counter() - start) / repeat, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the encodings of OCR results."
+    )
+    parser.add_argument("--boxes", type=int, nargs="+", default=[500, 5_000, 50_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    formats = {
+        "json (models)": (encode_models, decode_models),
+        "json": (lambda c: encode_results(c, encoding=Encoding.JSON), decode_results),
+        "binary": (lambda c: encode_results(c), decode_results),
+        "binary+zstd": (lambda c: encode_results(c, compress=True), decode_results),
+    }
+
+    rng = random.Random(42)
+    print(
+        f"{'boxes':>8} {'format':>14} {'bytes':>12} {'encode ms':>10} "
+        f"{'decode ms':>10}"
+    )
+    for count in args.boxes:
+        table = make_table(rng, count)
+        for name, (encode, decode) in formats.items():
+            encode_time, payload = timed(encode, table, repeat=args.repeat)
+            decode_time, _ = timed(decode, payload, repeat=args.repeat)
+            print(
+                f"{count:>8} {name:>14} {len(payload):>12,} "
+                f"{encode_time * 1000:>10.1f} {decode_time * 1000:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
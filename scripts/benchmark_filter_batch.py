@@ -0,0 +1,52 @@
+import argparse
+import uuid
+from time import perf_counter
+
+from sqlmodel import delete
+
+from app.db.controllers.matches import write_many_matches
+from app.db.factories import get_session_ctx
+from app.models.database import Matches
+
+
+def make_rows(count: int) -> list[dict]:
+    """Generate rows with a few matches each, as stored by the filter worker."""
+    terms = [
+        {"text": "Alice", "left": 10, "right": 60, "top": 10, "bottom": 30},
+        {"text": "Snowdrop", "left": 70, "right": 150, "top": 10, "bottom": 30},
+    ]
+    return [{"correlation_id": uuid.uuid4(), "terms": terms} for _ in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark storing matches in batches, as the filter worker does."
+    )
+    parser.add_argument("--rows", type=int, default=5_000)
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 10, 50, 100, 500]
+    )
+    args = parser.parse_args()
+
+    print(f"{'batch size':>10} {'rows/s':>10}")
+    for batch_size in args.batch_sizes:
+        rows = make_rows(args.rows)
+        bounds = range(0, len(rows) + batch_size, batch_size)
+        batches = [rows[start:end] for start, end in zip(bounds, bounds[1:])]
+
+        start = perf_counter()
+        for batch in batches:
+            # One transaction per batch, as in `Filter.flush`
+            with get_session_ctx() as session:
+                write_many_matches(session=session, matches=batch)
+        elapsed = perf_counter() - start
+
+        print(f"{batch_size:>10} {args.rows / elapsed:>10,.0f}")
+
+        with get_session_ctx() as session:
+            ids = [row["correlation_id"] for row in rows]
+            session.exec(delete(Matches).where(Matches.correlation_id.in_(ids)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import random
+import string
+from time import perf_counter
+
+from app.matching import TermMatcher
+from app.models.boxes import BoundingBoxTable
+from app.models.validation import MatchMode, TextBoundingBox
+
+
+def random_word(rng: random.Random) -> str:
+    """Generate a random word of a plausible length."""
+    return "".join(rng.choices(string.ascii_letters, k=rng.randint(3, 10)))
+
+
+def make_boxes(rng: random.Random, count: int) -> list[TextBoundingBox]:
+    """Generate bounding boxes with random words, as found on a dense page."""
+    return [
+        TextBoundingBox(
+            text=random_word(rng), left=0, right=1, top=0, bottom=1, line_num=i // 12
+        )
+        for i in range(count)
+    ]
+
+
+def linear_scan(bounding_boxes: list[TextBoundingBox], pii_terms: list[str]) -> list:
+    """The previous implementation of `filter_to_pii`, used as a baseline."""
+    return [box for box in bounding_boxes if box.text in pii_terms]
+
+
+def timed(func, *args, **kwargs) -> float:
+    start = perf_counter()
+    func(*args, **kwargs)
+    return perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark PII term matching.")
+    parser.add_argument("--boxes", type=int, default=5_000)
+    parser.add_argument("--terms", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--max-distance", type=int, default=1)
+    parser.add_argument(
+        "--baseline-limit",
+        type=int,
+        default=1_000,
+        help="Skip the linear scan baseline above this number of terms.",
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    bounding_boxes = make_boxes(rng, args.boxes)
+    table = BoundingBoxTable.from_boxes(bounding_boxes)
+
+    print(
+        f"{'terms':>8} {'compile s':>10} {'exact box/s':>14} "
+        f"{'substring box/s':>16} {'fuzzy box/s':>14} {'fuzzy/exact':>12} "
+        f"{'linear box/s':>14}"
+    )
+    for term_count in args.terms:
+        # Make sure some of the terms actually occur on the page, and that some of
+        # them are phrases spanning several words
+        pii_terms = [random_word(rng) for _ in range(term_count)]
+        for i, box in enumerate(bounding_boxes[: term_count // 10]):
+            pii_terms[i] = box.text
+        for i in range(term_count // 10):
+            pii_terms[-1 - i] = f"{random_word(rng)} {random_word(rng)}"
+
+        start = perf_counter()
+        matcher = TermMatcher(pii_terms)
+        matcher.automaton
+        matcher.phrase_automaton
+        matcher.deletion_index(args.max_distance)
+        compile_time = perf_counter() - start
+
+        exact = timed(matcher.filter, table, MatchMode.EXACT)
+        substring = timed(matcher.filter, table, MatchMode.SUBSTRING)
+        fuzzy = timed(matcher.filter, table, MatchMode.FUZZY, args.max_distance)
+        linear = (
+            f"{args.boxes / timed(linear_scan, bounding_boxes, pii_terms):>14,.0f}"
+            if term_count <= args.baseline_limit
+            else f"{'-':>14}"
+        )
+
+        print(
+            f"{term_count:>8,} {compile_time:>10.3f} {args.boxes / exact:>14,.0f} "
+            f"{args.boxes / substring:>16,.0f} {args.boxes / fuzzy:>14,.0f} "
+            f"{fuzzy / exact:>12.1f} {linear}"
+        )
+
+
+if __name__ == "__main__":
+    main()
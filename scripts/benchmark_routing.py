@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import uuid
+from time import perf_counter
+
+from PIL import Image
+
+from app.config import MinioConfig, RabbitMQConfig
+from app.db.controllers.matches import read_match
+from app.db.factories import get_session_ctx
+from app.factories import minio_connection
+from app.models.validation import Exchange
+from app.publisher import AsyncPublisher
+from app.utils import upload_object_to_minio
+
+
+def has_result(correlation_id: str) -> bool:
+    with get_session_ctx() as session:
+        match = read_match(session=session, correlation_id=uuid.UUID(correlation_id))
+        return match is not None
+
+
+async def submit(
+    publisher: AsyncPublisher, body: bytes, routing_key: str, poll_interval: float
+) -> float:
+    """Publish a submission as the API does, and wait for its matches to be stored."""
+    correlation_id = str(uuid.uuid4())
+
+    start = perf_counter()
+    await publisher.publish(
+        correlation_id=correlation_id,
+        body=body,
+        routing_key=routing_key,
+        exchange=Exchange.FORWARD.value,
+    )
+    while not await asyncio.to_thread(has_result, correlation_id):
+        await asyncio.sleep(poll_interval)
+    return perf_counter() - start
+
+
+async def run(args: argparse.Namespace) -> None:
+    with Image.open(args.image) as image:
+        image_size = image.size
+        content_type = Image.MIME[image.format]
+    # Only images uploaded to MinIO are routed directly, so the image is uploaded once
+    # and every submission refers to it
+    minio_config = MinioConfig()  # type: ignore
+    with open(args.image, "rb") as image_file:
+        image_url = upload_object_to_minio(
+            client=minio_connection(),
+            bucket=minio_config.BUCKET,
+            path=minio_config.PATH,
+            filename=f"benchmark_routing_{os.path.basename(args.image)}",
+            obj=image_file,
+            content_type=content_type,
+        )
+    body = json.dumps(
+        {
+            "pii_terms": ["Alice", "Snowdrop"],
+            "match_mode": "exact",
+            "max_distance": 1,
+            "image_size": image_size,
+            "image_url": image_url,
+        }
+    ).encode()
+
+    publisher = AsyncPublisher(RabbitMQConfig())  # type: ignore
+    await publisher.connect()
+    await publisher.declare_exchange(Exchange.FORWARD.value, exchange_type="topic")
+
+    # The first submission fills the OCR cache, so that the latencies measured after it
+    # are dominated by the messaging
+    await submit(publisher, body, "input", args.poll_interval)
+
+    # The routes alternate so that both see the same load on the stack
+    latencies: dict[str, list[float]] = {"input": [], "direct": []}
+    try:
+        for _ in range(args.submissions):
+            for routing_key, times in latencies.items():
+                times.append(
+                    await submit(publisher, body, routing_key, args.poll_interval)
+                )
+    finally:
+        await publisher.close()
+
+    print(f"{'route':>8} {'median ms':>10} {'p95 ms':>10}")
+    for routing_key, times in latencies.items():
+        p95 = statistics.quantiles(times, n=20)[-1]
+        print(
+            f"{routing_key:>8} {statistics.median(times) * 1000:>10.1f} "
+            f"{p95 * 1000:>10.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Benchmark the end-to-end latency of submissions routed through the "
+            "forward worker and routed directly to the OCR and filter queues."
+        )
+    )
+    parser.add_argument("--image", default="images/image.png")
+    parser.add_argument("--submissions", type=int, default=100)
+    parser.add_argument("--poll-interval", type=float, default=0.005)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,3 @@
-from time import sleep
-
 import requests
 from PIL import Image, ImageDraw
 
@@ -36,15 +34,19 @@ def main() -> None:
     response.raise_for_status()
     correlation_id = response.json()["correlation_id"]
 
-    matches = []
-
     while True:
-        response = requests.get(url=f"{api_url}/pii/{correlation_id}")
-        if response.status_code == 200:
-            print("Results are ready:\n", response.json())
-            matches = response.json()["matches"]
-            break
-        sleep(0.5)
+        # The request returns as soon as the results are stored, or after 30 seconds
+        response = requests.get(
+            url=f"{api_url}/pii/{correlation_id}", params={"wait": 30}
+        )
+        if response.status_code == 404:
+            # Not stored yet, wait again
+            continue
+        # Any other error, such as a job that timed out, does not go away by polling
+        response.raise_for_status()
+        print("Results are ready:\n", response.json())
+        matches = response.json()["matches"]
+        break
 
     draw_bounding_boxes(image_path=image_path, bounding_boxes=matches)
 
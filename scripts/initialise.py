@@ -1,11 +1,15 @@
 import logging
 
 import alembic.config
+import pika
 from minio import Minio
 from minio.error import S3Error
 
-from app.config import MinioConfig
+from app.config import DatabaseSettings, MinioConfig, RabbitMQConfig
+from app.db.factories import get_session_ctx
+from app.db.partitions import create_partitions
 from app.factories import minio_connection
+from app.models.validation import Exchange, Queue
 
 
 def create_bucket(client: Minio, bucket_name: str) -> None:
@@ -51,6 +55,37 @@ def setup_minio() -> None:
     set_public_read_access(client=client, bucket_name=minio_config.BUCKET)
 
 
+def setup_rabbitmq() -> None:
+    """
+    Bind the OCR and filter queues to the forward exchange, so that a submission
+    published with the `direct` routing key is delivered to both of them by the broker,
+    without going through the forward worker. The API only uses these bindings when
+    `API_DIRECT_ROUTING` is set, and the workers declare everything else themselves.
+    """
+    rabbitmq_config = RabbitMQConfig()  # type: ignore
+    credentials = pika.PlainCredentials(
+        username=rabbitmq_config.DEFAULT_USER,
+        password=rabbitmq_config.DEFAULT_PASS,
+    )
+    connection_parameters = pika.ConnectionParameters(
+        host=rabbitmq_config.HOST, credentials=credentials
+    )
+
+    with pika.BlockingConnection(connection_parameters) as connection:
+        channel = connection.channel()
+        channel.exchange_declare(
+            exchange=Exchange.FORWARD.value, exchange_type="topic", durable=True
+        )
+        for queue in (Queue.OCR, Queue.FILTER):
+            channel.queue_declare(queue=queue.value, durable=True)
+            channel.queue_bind(
+                queue=queue.value,
+                exchange=Exchange.FORWARD.value,
+                routing_key="direct",
+            )
+            logger.info(f"Queue '{queue.value}' bound for direct routing.")
+
+
 def setup_postgres() -> None:
     alembic.config.main(
         [
@@ -60,6 +95,13 @@ def setup_postgres() -> None:
         ]
     )
 
+    # The partitions of the coming months, which `scripts.manage_partitions` keeps
+    # creating ahead of time
+    with get_session_ctx() as session:
+        create_partitions(
+            session, months_ahead=DatabaseSettings().PARTITIONS_AHEAD  # type: ignore
+        )
+
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -69,4 +111,5 @@ if __name__ == "__main__":
     logger = logging.getLogger(__name__)
 
     setup_minio()
+    setup_rabbitmq()
     setup_postgres()
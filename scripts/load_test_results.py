@@ -0,0 +1,78 @@
+import argparse
+import statistics
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import requests
+
+
+def run_client(api_url: str, correlation_ids: list[str], count: int) -> list[float]:
+    """Send `count` result requests one after the other, over one connection."""
+    latencies = []
+    with requests.Session() as session:
+        for index in range(count):
+            correlation_id = correlation_ids[index % len(correlation_ids)]
+            start = perf_counter()
+            response = session.get(f"{api_url}/pii/{correlation_id}")
+            latencies.append(perf_counter() - start)
+            if response.status_code not in (200, 404):
+                response.raise_for_status()
+    return latencies
+
+
+def run_level(
+    api_url: str, correlation_ids: list[str], concurrency: int, requests_per_client: int
+) -> tuple[list[float], float]:
+    barrier = threading.Barrier(concurrency)
+
+    def client(_) -> list[float]:
+        # Start all the clients at once, so that the requests really overlap
+        barrier.wait()
+        return run_client(api_url, correlation_ids, requests_per_client)
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, range(concurrency)))
+    elapsed = perf_counter() - start
+
+    return [latency for latencies in results for latency in latencies], elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Load test the result lookups of the API, and report the latency of "
+            "`GET /pii/{correlation_id}` as the number of concurrent clients rises."
+        )
+    )
+    parser.add_argument("--api-url", default="http://api:8000")
+    parser.add_argument(
+        "--correlation-ids",
+        nargs="+",
+        help="IDs of stored results. Unknown IDs are used by default, which miss the "
+        "result cache and always query the database.",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 8, 32, 64, 128]
+    )
+    parser.add_argument("--requests-per-client", type=int, default=50)
+    args = parser.parse_args()
+
+    correlation_ids = args.correlation_ids or [str(uuid.uuid4()) for _ in range(1000)]
+
+    print(f"{'clients':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for concurrency in args.concurrency:
+        latencies, elapsed = run_level(
+            args.api_url, correlation_ids, concurrency, args.requests_per_client
+        )
+        percentiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"{concurrency:>8} {len(latencies) / elapsed:>10,.0f} "
+            f"{percentiles[49] * 1000:>10.1f} {percentiles[98] * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import logging
+import time
+
+from app.config import DatabaseSettings
+from app.db.factories import get_session_ctx
+from app.db.partitions import create_partitions, drop_partitions
+
+
+def main() -> None:
+    config = DatabaseSettings()  # type: ignore
+
+    parser = argparse.ArgumentParser(
+        description=(
+            "Create the upcoming monthly partitions of the partitioned tables, and "
+            "drop the partitions older than the retention period. Meant to run daily, "
+            "or to keep running with `--interval`."
+        )
+    )
+    parser.add_argument("--months-ahead", type=int, default=config.PARTITIONS_AHEAD)
+    parser.add_argument("--retention-months", type=int, default=config.RETENTION_MONTHS)
+    parser.add_argument(
+        "--no-drop", action="store_true", help="Only create the upcoming partitions."
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        help="Run again every this many hours, instead of once.",
+    )
+    args = parser.parse_args()
+
+    while True:
+        with get_session_ctx() as session:
+            create_partitions(session, months_ahead=args.months_ahead)
+            if not args.no_drop:
+                drop_partitions(session, retention_months=args.retention_months)
+
+        if args.interval is None:
+            return
+        time.sleep(args.interval * 60 * 60)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    main()
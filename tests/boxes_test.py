@@ -0,0 +1,32 @@
+import pytest
+
+from app.models.boxes import BoundingBoxTable, Box
+from app.models.validation import TextBoundingBox
+
+
+def test_table_from_boxes():
+    boxes = [
+        TextBoundingBox(text="Alice", left=0, right=5, top=0, bottom=2, line_num=1),
+        TextBoundingBox(text="Smith", left=6, right=11, top=0, bottom=2, line_num=1),
+    ]
+
+    table = BoundingBoxTable.from_boxes(boxes)
+
+    assert len(table) == 2
+    assert table.text == ["Alice", "Smith"]
+    assert list(table.right) == [5, 11]
+    assert table[1] == Box(text="Smith", left=6, right=11, top=0, bottom=2, line_num=1)
+    assert table.to_dicts() == [box.model_dump() for box in boxes]
+    assert table.to_boxes() == boxes
+
+
+def test_table_fills_missing_columns():
+    table = BoundingBoxTable(text=["Alice"], left=[0], right=[5], top=[0], bottom=[2])
+
+    assert list(table.block_num) == [0]
+    assert [box.word_num for box in table] == [0]
+
+
+def test_table_rejects_uneven_columns():
+    with pytest.raises(ValueError):
+        BoundingBoxTable(text=["Alice", "Smith"], left=[0])
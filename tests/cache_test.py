@@ -0,0 +1,90 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, Mock
+
+from app.cache import OCRCache, ResultCache
+from app.metrics import METRICS_KEY
+
+
+def make_cache(client: MagicMock) -> OCRCache:
+    return OCRCache(
+        client=client, ttl=60, max_entries=10, lock_timeout=30, wait_timeout=30
+    )
+
+
+def test_get_or_compute_hit():
+    client = MagicMock()
+    client.get.return_value = b"[]"
+    compute = Mock()
+
+    result = make_cache(client).get_or_compute(b"image", compute)
+
+    assert result == b"[]"
+    compute.assert_not_called()
+    client.hincrby.assert_called_once_with(METRICS_KEY, "ocr_cache_hits", 1)
+
+
+def test_get_or_compute_miss():
+    client = MagicMock()
+    client.get.return_value = None
+    client.set.return_value = True
+    client.pipeline.return_value.__enter__.return_value.execute.return_value = [
+        True,
+        1,
+        1,
+    ]
+    compute = Mock(return_value=b"[]")
+    cache = make_cache(client)
+
+    result = cache.get_or_compute(b"image", compute)
+
+    digest = OCRCache.digest(b"image")
+    assert result == b"[]"
+    compute.assert_called_once()
+    client.hincrby.assert_called_once_with(METRICS_KEY, "ocr_cache_misses", 1)
+    client.publish.assert_called_once_with(f"ocr_cache:done:{digest}", 1)
+    client.delete.assert_called_once_with(f"ocr_cache:lock:{digest}")
+
+
+def make_result_cache(size: int) -> tuple[ResultCache, MagicMock, MagicMock]:
+    client = MagicMock()
+    client.get = AsyncMock(return_value=None)
+    client.zpopmin = AsyncMock(return_value=[(b"old", 1.0)])
+    client.delete = AsyncMock()
+    pipeline = MagicMock()
+    client.pipeline.return_value.__aenter__.return_value = pipeline
+    pipeline.execute = AsyncMock(return_value=[True, 1, size])
+    return ResultCache(client=client, ttl=60, max_entries=1), client, pipeline
+
+
+def test_result_cache_encode():
+    terms = [{"text": "Alice", "left": 1, "right": 2, "top": 3, "bottom": 4}]
+
+    assert json.loads(ResultCache.encode(terms)) == {"matches": terms}
+
+
+def test_result_cache_set_many_evicts():
+    cache, client, pipeline = make_result_cache(size=2)
+
+    asyncio.run(cache.set_many({"new": b"{}"}))
+
+    pipeline.set.assert_called_once_with("result_cache:new", b"{}", ex=60)
+    client.zpopmin.assert_awaited_once_with("result_cache:index", 1)
+    client.delete.assert_awaited_once_with("result_cache:old")
+
+
+def test_result_cache_miss():
+    cache, client, pipeline = make_result_cache(size=1)
+
+    assert asyncio.run(cache.get("id")) is None
+    client.get.assert_awaited_once_with("result_cache:id")
+    pipeline.execute.assert_not_called()
+
+
+def test_result_cache_get_many():
+    cache, client, pipeline = make_result_cache(size=1)
+    client.mget = AsyncMock(return_value=[b"{}", None])
+
+    assert asyncio.run(cache.get_many(["hit", "miss"])) == [b"{}", None]
+    client.mget.assert_awaited_once_with(["result_cache:hit", "result_cache:miss"])
+    pipeline.expire.assert_called_once_with("result_cache:hit", 60)
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from app.codec import MAGIC, Encoding, decode_results, encode_results, encoding_of
+from app.models.boxes import BoundingBoxTable
+from app.models.validation import TextBoundingBox
+
+BOXES = [
+    TextBoundingBox(
+        text="Alice", left=10, right=60, top=5, bottom=20, block_num=1, line_num=1
+    ),
+    TextBoundingBox(
+        text="Zoë", left=70, right=100, top=5, bottom=20, block_num=1, word_num=2
+    ),
+    TextBoundingBox(text="", left=0, right=0, top=0, bottom=0),
+]
+TABLE = BoundingBoxTable.from_boxes(BOXES)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_binary_round_trip(compress):
+    payload = encode_results(TABLE, compress=compress)
+
+    assert payload.startswith(MAGIC)
+    assert encoding_of(payload) == Encoding.BINARY
+    assert decode_results(payload).to_boxes() == BOXES
+
+
+def test_json_round_trip():
+    payload = encode_results(TABLE, encoding=Encoding.JSON)
+
+    assert json.loads(payload) == [box.model_dump() for box in BOXES]
+    assert encoding_of(payload) == Encoding.JSON
+    assert decode_results(payload).to_boxes() == BOXES
+
+
+def test_empty_results():
+    payload = encode_results(BoundingBoxTable())
+
+    assert len(decode_results(payload)) == 0
+
+
+def test_decode_legacy_json():
+    # Results published before the layout numbers were added
+    payload = json.dumps(
+        [{"text": "Alice", "left": 10, "right": 60, "top": 5, "bottom": 20}]
+    ).encode()
+
+    assert decode_results(payload).to_boxes() == [
+        TextBoundingBox(text="Alice", left=10, right=60, top=5, bottom=20)
+    ]
+
+
+def test_decode_unsupported_version():
+    payload = bytearray(encode_results(TABLE))
+    payload[4] = 99
+
+    with pytest.raises(ValueError):
+        decode_results(bytes(payload))
@@ -0,0 +1,38 @@
+from unittest.mock import Mock
+
+from app.dictionaries import DictionaryMatchers
+
+
+def test_matcher_compiles_dictionary_once():
+    dictionary = {"name": "names", "version": 2}
+
+    load_terms = Mock(return_value=["Alice"])
+    matchers = DictionaryMatchers(load_terms)
+
+    first = matchers.matcher({"pii_terms": [], "dictionary": dictionary})
+    second = matchers.matcher({"pii_terms": [], "dictionary": dictionary})
+
+    assert first is second
+    assert first.terms == ("Alice",)
+    load_terms.assert_called_once_with("names", 2)
+
+
+def test_matcher_adds_terms_to_dictionary():
+    load_terms = Mock(return_value=["Alice"])
+    matchers = DictionaryMatchers(load_terms)
+    dictionary = matchers.compiled("names", 1)
+
+    matcher = matchers.matcher(
+        {"pii_terms": ["Bob"], "dictionary": {"name": "names", "version": 1}}
+    )
+
+    assert matcher.terms == ("Alice", "Bob")
+    # The dictionary is not compiled again with the terms of the job
+    assert dictionary in matcher.matchers
+    load_terms.assert_called_once_with("names", 1)
+
+
+def test_matcher_without_dictionary():
+    matcher = DictionaryMatchers(Mock()).matcher({"pii_terms": ["Alice", "Bob"]})
+
+    assert matcher.terms == ("Alice", "Bob")
@@ -0,0 +1,98 @@
+import asyncio
+import importlib
+from unittest.mock import AsyncMock, Mock
+
+import fakeredis
+import pytest
+
+SETTINGS = {
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_DATABASE": "test",
+    "MINIO_ROOT_USER": "test",
+    "MINIO_ROOT_PASSWORD": "test",
+    "MINIO_BUCKET": "test",
+    "MINIO_PATH": "test",
+}
+
+
+@pytest.fixture
+def make_filter(monkeypatch):
+    # The settings of the database and MinIO are read when the worker is imported
+    for name, value in SETTINGS.items():
+        monkeypatch.setenv(name, value)
+    filter_module = importlib.import_module("app.workers.filter")
+
+    def make(error: Exception | None = None, **kwargs):
+        worker = filter_module.Filter(
+            fakeredis.FakeAsyncRedis(), rabbitmq_config=Mock(), **kwargs
+        )
+        worker.store_matches = Mock(
+            side_effect=error,
+            return_value={"first": b"[]", "second": b"[]"},
+        )
+        worker.staging.complete = AsyncMock()
+        worker.staging.restore = AsyncMock()
+        return worker
+
+    return make
+
+
+def store_jobs(worker, *correlation_ids: str) -> list:
+    async def scenario():
+        return await asyncio.gather(
+            *(worker.store_job(id_, b"terms", [b"ocr"]) for id_ in correlation_ids),
+            return_exceptions=True,
+        )
+
+    return asyncio.run(scenario())
+
+
+def test_batch_is_stored_together(make_filter):
+    worker = make_filter(batch_size=2)
+
+    assert store_jobs(worker, "first", "second") == [None, None]
+
+    worker.store_matches.assert_called_once_with(
+        [("first", b"terms", [b"ocr"]), ("second", b"terms", [b"ocr"])]
+    )
+    worker.staging.complete.assert_awaited_once_with(["first", "second"])
+    worker.staging.restore.assert_not_called()
+
+
+def test_partial_batch_is_flushed_after_linger(make_filter):
+    worker = make_filter(batch_size=10, batch_linger=0.01)
+
+    assert store_jobs(worker, "first") == [None]
+
+    worker.store_matches.assert_called_once()
+    worker.staging.complete.assert_awaited_once_with(["first"])
+
+
+def test_failed_batch_is_restored(make_filter):
+    error = RuntimeError("database is down")
+    worker = make_filter(error=error, batch_size=2)
+
+    assert store_jobs(worker, "first", "second") == [error, error]
+
+    worker.staging.complete.assert_not_called()
+    assert worker.staging.restore.await_args_list == [(("first",),), (("second",),)]
+
+
+def test_bad_job_fails_on_its_own(make_filter):
+    error = ValueError("invalid OCR results")
+    worker = make_filter(batch_size=2)
+
+    def store_matches(jobs):
+        if any(correlation_id == "bad" for correlation_id, _, _ in jobs):
+            raise error
+        return {correlation_id: b"[]" for correlation_id, _, _ in jobs}
+
+    worker.store_matches.side_effect = store_matches
+
+    assert store_jobs(worker, "bad", "good") == [error, None]
+
+    worker.staging.complete.assert_awaited_once_with(["good"])
+    worker.staging.restore.assert_awaited_once_with("bad")
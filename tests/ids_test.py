@@ -0,0 +1,22 @@
+import uuid
+from datetime import datetime
+
+from app.ids import earliest_created_at, uuid7
+
+
+def test_uuid7_is_time_ordered():
+    first = uuid7()
+    second = uuid7()
+
+    assert first.version == second.version == 7
+    assert first.variant == uuid.RFC_4122
+    assert first.int >> 80 <= second.int >> 80
+
+
+def test_earliest_created_at():
+    # Submitted on 2024-11-01 00:30 UTC, the bound allows for skewed clocks
+    correlation_id = uuid.UUID(int=1730421000000 << 80 | 7 << 76 | 2 << 62)
+
+    assert earliest_created_at([correlation_id]) == datetime(2024, 10, 1)
+    assert earliest_created_at([correlation_id, uuid.uuid4()]) is None
+    assert earliest_created_at([]) is None
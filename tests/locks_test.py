@@ -0,0 +1,23 @@
+from unittest.mock import MagicMock
+from uuid import UUID
+
+from app.db.locks import lock_jobs
+
+
+def test_lock_jobs():
+    session = MagicMock()
+    ids = [UUID(int=2), UUID(int=1)]
+
+    lock_jobs(session, ids)
+
+    statement, params = session.execute.call_args.args
+    assert "pg_advisory_xact_lock" in str(statement)
+    assert params == {"ids": [str(UUID(int=2)), str(UUID(int=1))]}
+
+
+def test_lock_no_jobs():
+    session = MagicMock()
+
+    lock_jobs(session, [])
+
+    session.execute.assert_not_called()
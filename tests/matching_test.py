@@ -0,0 +1,115 @@
+from app.matching import (
+    AhoCorasick,
+    DeletionIndex,
+    MatcherGroup,
+    TermMatcher,
+    compile_terms,
+    edit_distance,
+)
+from app.models.validation import MatchMode, TextBoundingBox
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+
+    matches = sorted(automaton.iter_matches("ushers"))
+
+    # "she" and "he" end at position 4, "hers" at position 6
+    assert matches == [(4, 0), (4, 1), (6, 3)]
+
+
+def test_aho_corasick_matches_word_sequences():
+    automaton = AhoCorasick([("john", "smith"), ("smith",)])
+
+    matches = list(automaton.iter_matches(["mr", "john", "smith"]))
+
+    assert sorted(matches) == [(3, 0), (3, 1)]
+
+
+def test_term_matcher_substring():
+    bounding_boxes = [
+        TextBoundingBox(text="Alice", left=0, right=1, top=0, bottom=1),
+        TextBoundingBox(text="Snowdrops", left=1, right=2, top=1, bottom=2),
+        TextBoundingBox(text="garden", left=2, right=3, top=2, bottom=3),
+    ]
+    matcher = TermMatcher(["Snowdrop", "lic"])
+
+    exact = matcher.filter(bounding_boxes, MatchMode.EXACT)
+    substring = matcher.filter(bounding_boxes, MatchMode.SUBSTRING)
+
+    assert not exact
+    assert [m.text for m in substring] == ["Alice", "Snowdrops"]
+
+
+def test_compile_terms_is_cached():
+    assert compile_terms(["one", "two"]) is compile_terms(["one", "two"])
+
+
+def test_term_matcher_phrase_across_boxes():
+    bounding_boxes = [
+        TextBoundingBox(text="Mr", left=0, right=2, top=0, bottom=2, line_num=1),
+        TextBoundingBox(text="John", left=3, right=7, top=0, bottom=3, line_num=1),
+        TextBoundingBox(text="Smith", left=8, right=13, top=1, bottom=2, line_num=1),
+        TextBoundingBox(text="John", left=0, right=4, top=5, bottom=7, line_num=2),
+        TextBoundingBox(text="Smith", left=0, right=5, top=8, bottom=10, line_num=3),
+    ]
+    matcher = TermMatcher(["John  Smith"])
+
+    matches = matcher.filter(bounding_boxes)
+
+    # the phrase split over two lines is not a match
+    assert matches.to_boxes() == [
+        TextBoundingBox(
+            text="John Smith", left=3, right=13, top=0, bottom=3, line_num=1
+        )
+    ]
+
+
+def test_matcher_group_matches_like_combined_terms():
+    bounding_boxes = [
+        TextBoundingBox(text="Mr", left=0, right=2, top=0, bottom=2, line_num=1),
+        TextBoundingBox(text="John", left=3, right=7, top=0, bottom=3, line_num=1),
+        TextBoundingBox(text="Smith", left=8, right=13, top=1, bottom=2, line_num=1),
+        TextBoundingBox(text="Alice", left=0, right=5, top=5, bottom=7, line_num=2),
+    ]
+    group = MatcherGroup([TermMatcher(["John Smith", "Alice"]), TermMatcher(["Mr"])])
+    combined = TermMatcher(["John Smith", "Alice", "Mr"])
+
+    assert group.terms == combined.terms
+    for match_mode in MatchMode:
+        assert (
+            group.filter(bounding_boxes, match_mode=match_mode).to_boxes()
+            == combined.filter(bounding_boxes, match_mode=match_mode).to_boxes()
+        )
+
+
+def test_edit_distance():
+    assert edit_distance("Alice", "Alice", 2) == 0
+    assert edit_distance("Alice", "Allce", 2) == 1
+    assert edit_distance("Alice", "Alce", 2) == 1
+    assert edit_distance("Alice", "Bob", 2) == 3
+    assert edit_distance("Alice", "Alce", 1) == 1
+    assert edit_distance("Alice", "Bllce", 1) == 2
+
+
+def test_deletion_index_lookup():
+    index = DeletionIndex(["Alice", "Alan", "Snowdrop"], max_distance=1)
+
+    assert index.lookup("A1ice") == "Alice"
+    assert index.lookup("Snowdrp") == "Snowdrop"
+    assert index.lookup("Bob") is None
+
+
+def test_term_matcher_fuzzy():
+    bounding_boxes = [
+        TextBoundingBox(text="A1ice", left=0, right=5, top=0, bottom=1),
+        TextBoundingBox(text="Smlth", left=6, right=12, top=0, bottom=1),
+        TextBoundingBox(text="Allce", left=0, right=5, top=2, bottom=3, line_num=1),
+    ]
+    matcher = TermMatcher(["Alice Smith"])
+
+    exact = matcher.filter(bounding_boxes, MatchMode.EXACT)
+    fuzzy = matcher.filter(bounding_boxes, MatchMode.FUZZY, max_distance=2)
+
+    assert not exact
+    assert [m.text for m in fuzzy] == ["A1ice Smlth"]
@@ -0,0 +1,34 @@
+import asyncio
+from unittest.mock import Mock
+
+from app.notifications import ResultNotifier
+
+
+def test_wake_waiters():
+    async def scenario():
+        notifier = ResultNotifier(client=Mock())
+        first = notifier.subscribe("id")
+        second = notifier.subscribe("id")
+        other = notifier.subscribe("other")
+
+        notifier.wake("id")
+
+        assert first.done() and second.done()
+        assert not other.done()
+        assert list(notifier.waiters) == ["other"]
+
+    asyncio.run(scenario())
+
+
+def test_unsubscribe():
+    async def scenario():
+        notifier = ResultNotifier(client=Mock())
+        waiter = notifier.subscribe("id")
+
+        notifier.unsubscribe("id", waiter)
+        notifier.wake("id")
+
+        assert not waiter.done()
+        assert not notifier.waiters
+
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+from datetime import date
+from unittest.mock import MagicMock
+
+from app.db.partitions import (
+    add_months,
+    create_partitions,
+    drop_partitions,
+    partition_name,
+)
+
+
+def make_session(current: date, partitions: list[str]) -> MagicMock:
+    session = MagicMock()
+    session.execute.return_value.scalar_one.return_value = current
+    session.execute.return_value.scalars.return_value = partitions
+    return session
+
+
+def executed(session: MagicMock) -> list[str]:
+    return [str(call.args[0]) for call in session.execute.call_args_list]
+
+
+def test_add_months():
+    assert add_months(date(2024, 11, 1), 2) == date(2025, 1, 1)
+    assert add_months(date(2024, 1, 15), -1) == date(2023, 12, 1)
+    assert partition_name("matches", date(2024, 3, 1)) == "matches_2024_03"
+
+
+def test_create_partitions_skips_existing():
+    session = make_session(
+        date(2024, 12, 1),
+        [
+            "matches_2024_12",
+            "matches_default",
+            "ocr_results_2024_12",
+            "ocr_tokens_2024_12",
+        ],
+    )
+
+    created = create_partitions(session, months_ahead=1)
+
+    assert created == ["matches_2025_01", "ocr_results_2025_01", "ocr_tokens_2025_01"]
+    statements = executed(session)
+    start = statements.index(
+        "CREATE TABLE matches_2025_01 (LIKE matches INCLUDING DEFAULTS INCLUDING "
+        "CONSTRAINTS)"
+    )
+    # The rows of the month that landed in the default partition are moved
+    assert "DELETE FROM matches_default" in statements[start + 1]
+    assert statements[start + 2] == (
+        "ALTER TABLE matches ATTACH PARTITION matches_2025_01 "
+        "FOR VALUES FROM ('2025-01-01') TO ('2025-02-01')"
+    )
+
+
+def test_drop_partitions_before_retention():
+    session = make_session(
+        date(2024, 12, 1),
+        [
+            "matches_2024_11",
+            "matches_default",
+            "matches_2024_09",
+            "matches_2024_10",
+            "ocr_results_2024_09",
+            "ocr_results_2024_10",
+            "ocr_tokens_2024_09",
+        ],
+    )
+
+    dropped = drop_partitions(session, retention_months=2)
+
+    assert dropped == ["matches_2024_09", "ocr_results_2024_09", "ocr_tokens_2024_09"]
+    assert "DROP TABLE matches_2024_09" in executed(session)
+    assert "DROP TABLE matches_default" not in executed(session)
@@ -0,0 +1,27 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import aio_pika
+
+from app.publisher import AsyncPublisher
+
+
+def test_publish():
+    publisher = AsyncPublisher(config=Mock())
+    exchange = AsyncMock()
+    publisher.exchanges["forward"] = exchange
+
+    asyncio.run(
+        publisher.publish(
+            correlation_id="id",
+            body='{"image_url": "url"}',
+            routing_key="input",
+            exchange="forward",
+        )
+    )
+
+    message = exchange.publish.await_args.args[0]
+    assert exchange.publish.await_args.kwargs == {"routing_key": "input"}
+    assert message.body == b'{"image_url": "url"}'
+    assert message.correlation_id == "id"
+    assert message.delivery_mode == aio_pika.DeliveryMode.PERSISTENT
@@ -0,0 +1,12 @@
+from app.search import MAX_TOKEN_LENGTH, tokenize
+
+
+def test_tokenize():
+    texts = ["Alice", "Smith,", "(alice)", "- ", "alice@example.com.", "x" * 65]
+
+    assert tokenize(texts) == ["alice", "alice@example.com", "smith"]
+    assert tokenize(["x" * MAX_TOKEN_LENGTH]) == ["x" * MAX_TOKEN_LENGTH]
+
+
+def test_tokenize_splits_texts():
+    assert tokenize(["John  Smith", "SMITH"]) == ["john", "smith"]
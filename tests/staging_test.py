@@ -0,0 +1,165 @@
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, Mock
+
+import fakeredis
+
+from app.codec import encode_results
+from app.metrics import METRICS_KEY
+from app.models.boxes import BoundingBoxTable
+from app.staging import ZSTD_MAGIC, Staging, timed_out
+
+
+def make_staging(script: AsyncMock | None = None) -> Staging:
+    client = Mock()
+    client.register_script.return_value = script or AsyncMock()
+    return Staging(client, compress=True)
+
+
+def test_pack_round_trip():
+    staging = make_staging()
+    payload = json.dumps({"pii_terms": ["Alice"] * 100}).encode()
+
+    packed = staging.pack(payload)
+
+    assert packed.startswith(ZSTD_MAGIC)
+    assert len(packed) < len(payload)
+    assert staging.unpack(packed) == payload
+
+
+def test_pack_skips_small_and_compressed_payloads():
+    staging = make_staging()
+    small = b'{"pii_terms": ["Alice"]}'
+    table = BoundingBoxTable(["Alice"] * 100, left=range(100))
+    compressed = encode_results(table, compress=True)
+
+    assert staging.pack(small) == small
+    assert staging.pack(compressed) == compressed
+    assert staging.unpack(compressed) == compressed
+
+
+def test_stage_unpacks_complete_job():
+    staging = make_staging()
+    pii_terms = json.dumps({"pii_terms": ["Alice"] * 100}).encode()
+    staging._join.return_value = [staging.pack(pii_terms), b"ocr"]
+
+    job = asyncio.run(staging.stage_ocr_results("id", b"ocr"))
+
+    assert job == (pii_terms, [b"ocr"])
+    keys = staging._join.call_args.kwargs["keys"]
+    assert keys[:2] == ["id:ocr", "id:pii_terms"]
+
+
+def test_sweep():
+    staging = make_staging()
+    staging._sweep.return_value = [[b"first", 1, 0], [b"second", 0, 2]]
+
+    expired = asyncio.run(staging.sweep(limit=10, keep=5))
+
+    assert expired == [("first", True, 0), ("second", False, 2)]
+    _, limit, keep = staging._sweep.call_args.kwargs["args"]
+    assert (limit, keep) == (10, 5)
+
+
+def test_claimed_job_is_picked_up_again():
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis()
+        staging = Staging(client)
+        await staging.stage_pii_terms("id", b"terms", tiles=2)
+        await staging.stage_ocr_results("id", b"first", 0, 2)
+
+        job = await staging.stage_ocr_results("id", b"second", 1, 2)
+        assert job == (b"terms", [b"first", b"second"])
+        assert await client.exists("id:ocr", "id:pii_terms") == 0
+
+        # The consumer that claimed the job stopped, and its message is redelivered
+        assert await staging.stage_ocr_results("id", b"second", 1, 2) == job
+
+        await staging.complete(["id"])
+        assert await client.keys("id:*") == [b"id:completed"]
+        assert await client.zcard("staging:deadlines") == 0
+
+    asyncio.run(scenario())
+
+
+def test_restored_job_is_claimed_again():
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis()
+        staging = Staging(client)
+        await staging.stage_pii_terms("id", b"terms")
+        await staging.stage_ocr_results("id", b"ocr")
+
+        await staging.restore("id")
+
+        assert await client.exists("id:ocr", "id:pii_terms") == 2
+        job = await staging.stage_pii_terms("id", b"terms")
+        assert job == (b"terms", [b"ocr"])
+
+    asyncio.run(scenario())
+
+
+def test_staged_jobs_are_counted():
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis()
+        staging = Staging(client)
+        await staging.stage_pii_terms("id", b"terms")
+        # A duplicate half is not counted twice
+        await staging.stage_pii_terms("id", b"terms")
+
+        metrics = await client.hgetall(METRICS_KEY)
+        assert metrics == {b"staging_bytes": b"5", b"staging_jobs": b"1"}
+
+        await staging.stage_ocr_results("id", b"ocr")
+        await staging.complete(["id"])
+
+        metrics = await client.hgetall(METRICS_KEY)
+        assert metrics == {b"staging_bytes": b"0", b"staging_jobs": b"0"}
+
+    asyncio.run(scenario())
+
+
+def test_halves_of_completed_job_are_ignored():
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis()
+        staging = Staging(client)
+        await staging.stage_pii_terms("id", b"terms")
+        await staging.stage_ocr_results("id", b"ocr")
+        await staging.complete(["id"])
+
+        assert await staging.stage_ocr_results("id", b"ocr") is None
+        assert await client.exists("id:ocr", "id:pii_terms") == 0
+        assert await client.zcard("staging:deadlines") == 0
+        assert await client.hget(METRICS_KEY, "staging_jobs") == b"0"
+
+    asyncio.run(scenario())
+
+
+def test_sweep_removes_due_jobs(monkeypatch):
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis()
+        staging = Staging(client, ttl=60)
+        await staging.stage_pii_terms("staged", b"terms", tiles=2)
+        await staging.stage_ocr_results("staged", b"ocr", 0, 2)
+        await staging.stage_pii_terms("claimed", b"terms")
+        await staging.stage_ocr_results("claimed", b"ocr")
+
+        now = time.time()
+        assert await staging.sweep() == []
+
+        monkeypatch.setattr(time, "time", lambda: now + 90)
+        expired = await staging.sweep()
+
+        assert sorted(expired) == [("claimed", True, 1), ("staged", True, 1)]
+        # Only the metrics and the record of the timed out jobs are left
+        assert sorted(await client.keys()) == [b"metrics", b"staging:timed_out"]
+        assert await timed_out(client, "staged")
+        assert await timed_out(client, "claimed")
+        metrics = await client.hgetall(METRICS_KEY)
+        assert metrics == {
+            b"staging_bytes": b"0",
+            b"staging_jobs": b"0",
+            b"staging_timed_out": b"2",
+        }
+
+    asyncio.run(scenario())
@@ -0,0 +1,35 @@
+from unittest.mock import Mock
+
+from PIL import Image
+
+from app import tesseract
+from app.config import OCRConfig
+from app.tesseract import PytesseractEngine, tesseract_engine
+
+
+def test_tesseract_engine_selected_in_config():
+    engine = tesseract_engine(OCRConfig(ENGINE="pytesseract", LANG="deu"))
+
+    assert isinstance(engine, PytesseractEngine)
+    assert engine.lang == "deu"
+
+
+def test_tesseract_engine_falls_back_to_pytesseract(monkeypatch):
+    monkeypatch.setattr(tesseract, "tesserocr", None)
+
+    engine = tesseract_engine(OCRConfig(ENGINE="auto"))
+
+    assert isinstance(engine, PytesseractEngine)
+
+
+def test_pytesseract_engine_image_to_data(monkeypatch):
+    image_to_data = Mock(return_value={"text": []})
+    monkeypatch.setattr(tesseract.pytesseract, "image_to_data", image_to_data)
+    image = Image.new("RGB", (10, 10))
+
+    data = PytesseractEngine(lang="eng").image_to_data(image)
+
+    assert data == {"text": []}
+    image_to_data.assert_called_once_with(
+        image, lang="eng", output_type=tesseract.pytesseract.Output.DICT
+    )
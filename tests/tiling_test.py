@@ -0,0 +1,80 @@
+from app.config import TilingConfig
+from app.models.validation import TextBoundingBox
+from app.tiling import exceeds_pixel_limit, merge_tiles, needs_tiling, plan_tiles
+
+
+def test_plan_tiles_small_image():
+    tiles = plan_tiles(width=100, height=50, size=200, overlap=20)
+
+    assert len(tiles) == 1
+    assert (tiles[0].left, tiles[0].top, tiles[0].right, tiles[0].bottom) == (
+        0,
+        0,
+        100,
+        50,
+    )
+
+
+def test_plan_tiles_cores_cover_image():
+    tiles = plan_tiles(width=1000, height=500, size=400, overlap=50)
+
+    columns = sorted({(t.core_left, t.core_right) for t in tiles})
+    rows = sorted({(t.core_top, t.core_bottom) for t in tiles})
+
+    assert columns[0][0] == 0 and columns[-1][1] == 1000
+    assert rows[0][0] == 0 and rows[-1][1] == 500
+    assert all(a[1] == b[0] for a, b in zip(columns, columns[1:]))
+    assert all(a[1] == b[0] for a, b in zip(rows, rows[1:]))
+    assert all(t.right - t.left <= 400 and t.bottom - t.top <= 400 for t in tiles)
+
+
+def test_merge_tiles_deduplicates_overlap():
+    tiles = plan_tiles(width=200, height=100, size=120, overlap=40)
+    assert len(tiles) == 2
+
+    # A word at x=90..110 of the image is whole in both tiles
+    results = [
+        [
+            TextBoundingBox(
+                text="left", left=0, right=20, top=0, bottom=10, block_num=1
+            ),
+            TextBoundingBox(
+                text="both", left=90, right=110, top=0, bottom=10, block_num=1
+            ),
+        ],
+        [
+            TextBoundingBox(
+                text="both", left=10, right=30, top=0, bottom=10, block_num=1
+            ),
+            TextBoundingBox(
+                text="right", left=90, right=110, top=0, bottom=10, block_num=1
+            ),
+        ],
+    ]
+
+    merged = merge_tiles(tiles, results)
+
+    assert [(b.text, b.left, b.right) for b in merged] == [
+        ("left", 0, 20),
+        ("both", 90, 110),
+        ("right", 170, 190),
+    ]
+    # the lines of the two tiles are kept apart
+    assert merged[0].block_num != merged[2].block_num
+
+
+def test_needs_tiling():
+    config = TilingConfig(MAX_PIXELS=100)
+
+    assert needs_tiling((20, 10), config)
+    assert not needs_tiling((10, 10), config)
+    assert not needs_tiling(None, config)
+    assert not needs_tiling((20, 10), TilingConfig(ENABLED=False, MAX_PIXELS=100))
+
+
+def test_exceeds_pixel_limit():
+    config = TilingConfig(MAX_IMAGE_PIXELS=100)
+
+    assert exceeds_pixel_limit((20, 10), config)
+    assert not exceeds_pixel_limit((10, 10), config)
+    assert not exceeds_pixel_limit(None, config)
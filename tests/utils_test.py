@@ -1,16 +1,22 @@
+import json
 import os
 from io import BytesIO
-from unittest.mock import MagicMock, Mock
+from tempfile import SpooledTemporaryFile
+from unittest.mock import MagicMock
 
+import pytest
 from minio import Minio
-from pika import BasicProperties
+from PIL import Image
 
 from app.models.validation import TextBoundingBox
 from app.utils import (
     detect_text,
     filter_to_pii,
+    pack_message,
     preprocess_text,
-    publish_to_exchange,
+    read_image_size,
+    read_submission,
+    unpack_message,
     upload_object_to_minio,
 )
 
@@ -57,26 +63,6 @@ def test_preprocess_text():
     assert text == "Sample text With punctuation"
 
 
-def test_publish_to_exchange():
-    channel = Mock()
-
-    publish_to_exchange(
-        channel=channel,
-        correlation_id="123",
-        body="test_message",
-        routing_key="test_key",
-    )
-
-    properties = BasicProperties(correlation_id="123", delivery_mode=2)
-
-    channel.basic_publish.assert_called_once_with(
-        exchange="",
-        routing_key="test_key",
-        body="test_message",
-        properties=properties,
-    )
-
-
 def test_upload_object_to_minio():
     mock_client = MagicMock(spec=Minio)
 
@@ -101,9 +87,62 @@ def test_upload_object_to_minio():
         data=obj,
         content_type=content_type,
         length=len(obj_data),
+        part_size=0,
     )
 
     expected_url = os.path.join(
         mock_client._base_url._url.geturl(), bucket_name, path, filename
     )
     assert result == expected_url
+
+
+def test_upload_object_to_minio_streams_spooled_file():
+    mock_client = MagicMock(spec=Minio)
+    mock_client._base_url = MagicMock()
+    mock_client._base_url._url.geturl.return_value = "http://localhost:9000"
+
+    obj = SpooledTemporaryFile(max_size=4)
+    obj.write(b"This is the content of the file.")
+    obj.seek(8)
+
+    upload_object_to_minio(
+        mock_client, "test-bucket", "test/path", "test_file.txt", obj, "text/plain", 16
+    )
+
+    kwargs = mock_client.put_object.call_args.kwargs
+    assert kwargs["data"] is obj
+    assert kwargs["length"] == 24
+    assert kwargs["part_size"] == 16
+    assert obj.tell() == 8
+
+
+def test_pack_message():
+    data = {"pii_terms": ["Alice"], "image_size": [10, 20]}
+    image = b"\x89PNG\r\n\x1a\n\x00\xff"
+
+    body = pack_message(data, image)
+
+    assert unpack_message(body) == (data, image)
+
+
+def test_read_submission():
+    data = {"pii_terms": ["Alice"], "image_url": "url"}
+    image = b"\x89PNG\r\n\x1a\n"
+
+    assert read_submission(pack_message(data, image), inline=True) == (data, image)
+    assert read_submission(json.dumps(data).encode()) == (data, None)
+
+
+def test_read_image_size(monkeypatch):
+    image_file = BytesIO()
+    Image.new("RGB", (20, 10)).save(image_file, format="PNG")
+    image_file.seek(0)
+
+    assert read_image_size(image_file) == (20, 10)
+    assert image_file.tell() == 0
+    assert read_image_size(BytesIO(b"not an image")) is None
+
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 50)
+    with pytest.raises(Image.DecompressionBombError):
+        read_image_size(image_file)
+    assert image_file.tell() == 0
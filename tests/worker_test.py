@@ -0,0 +1,55 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from app.workers.base import Worker
+
+
+class Recorder(Worker):
+    def __init__(self, error: Exception | None = None):
+        super().__init__(concurrency=2, rabbitmq_config=Mock())
+        self.error = error
+
+    async def setup(self, channel):
+        return await channel.declare_queue("recorder")
+
+    async def process_message(self, message):
+        if self.error:
+            raise self.error
+
+
+def handle(worker: Worker, redelivered: bool = False) -> AsyncMock:
+    message = AsyncMock(correlation_id="id", redelivered=redelivered)
+    asyncio.run(worker.handle_message(message, asyncio.Semaphore(1)))
+    return message
+
+
+def test_handle_message_acks():
+    message = handle(Recorder())
+
+    message.ack.assert_awaited_once()
+    message.nack.assert_not_called()
+
+
+def test_handle_message_requeues_once():
+    message = handle(Recorder(ValueError("boom")))
+    message.nack.assert_awaited_once_with(requeue=True)
+
+    message = handle(Recorder(ValueError("boom")), redelivered=True)
+    message.nack.assert_awaited_once_with(requeue=False)
+
+
+def test_prefetch_defaults_to_concurrency():
+    worker = Recorder()
+
+    assert worker.prefetch_count == 2
+
+
+def test_worker_without_process_message_cannot_be_created():
+    class Incomplete(Worker):
+        async def setup(self, channel):
+            return await channel.declare_queue("incomplete")
+
+    with pytest.raises(TypeError):
+        Incomplete(rabbitmq_config=Mock())